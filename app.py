@@ -81,6 +81,7 @@ def create_app():
     from routes.usuarios_routes import usuarios_bp
     from routes.notificacion_routes import notificacion_bp
     from routes.planteles_api import planteles_api
+    from routes.trabajos_routes import trabajos_bp
 
 
     app.register_blueprint(auth_bp)
@@ -91,6 +92,11 @@ def create_app():
     app.register_blueprint(usuarios_bp)
     app.register_blueprint(notificacion_bp)
     app.register_blueprint(planteles_api)
+    app.register_blueprint(trabajos_bp)
+
+    # CLI: flask --app wsgi:app trabajos worker
+    from trabajos import trabajos_cli
+    app.cli.add_command(trabajos_cli)
 
 
 
@@ -0,0 +1,161 @@
+# benchmarks/__main__.py
+"""python -m benchmarks --help"""
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import click
+
+RAIZ = Path(__file__).resolve().parent.parent
+DIR_DATOS = RAIZ / "instance" / "benchmarks"
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+ADMIN_CORREO = "bench@sgi.local"
+ADMIN_PASSWORD = "bench"
+
+TODOS = ["api_listar_personal", "api_listar_personal_completa", "api_listar_personal_columnar",
+         "api_listar_personal_ultima_pagina", "api_listar_personal_cursor_profundo",
+         "api_guardar_personal_bulk",
+         "subir_excel_personal", "reporte_general_zip", "reporte_personal_pdf",
+         "reporte_delegaciones_excel", "reporte_ccts_excel", "reporte_personal_excel",
+         "exportar_personal_excel"]
+
+
+def _escala(valor):
+    try:
+        n_del, n_pl, n_per = (int(x) for x in valor.lower().split("x"))
+    except ValueError:
+        raise click.BadParameter("usa DELEGACIONESxPLANTELESxPERSONAL, p. ej. 5x40x25")
+    return n_del, n_pl, n_per
+
+
+def _preparar_entorno(db_url, db_usuarios, procesos_fichas):
+    """Config se lee al importar: el entorno va antes de tocar `app` (y lo heredan los hijos)."""
+    os.environ["DATABASE_URI"] = db_url
+    os.environ["USUARIOS_DATABASE_URI"] = db_usuarios
+    os.environ.setdefault("SECRET_KEY", "benchmarks")
+    os.environ["DEFAULT_ADMIN_CORREO"] = ADMIN_CORREO
+    os.environ["DEFAULT_ADMIN_PASSWORD"] = ADMIN_PASSWORD
+    os.environ["REPORTES_CACHE"] = "0"
+    if procesos_fichas:
+        os.environ["FICHAS_PROCESOS"] = str(procesos_fichas)
+
+
+def _commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _imprimir_comparacion(filas, tolerancia):
+    click.echo(f"\nComparación contra la referencia (tolerancia {tolerancia:.0%}):")
+    for nombre, metrica, vb, va, cambio, regresion in filas:
+        marca = "✗" if regresion else ("✓" if cambio < -tolerancia else " ")
+        click.echo(f"  {marca} {nombre:36} {metrica:12} {vb:>12} → {va:<12} {cambio:+.1%}")
+
+
+@click.command()
+@click.option("--db", "db_url", default=None, help="URL de la BD principal (SQLite en instance/benchmarks por omisión).")
+@click.option("--db-usuarios", default=None, help="URL de la BD de usuarios (por omisión la misma --db en PostgreSQL).")
+@click.option("--escala", default="3x20x25", show_default=True, help="delegaciones x planteles x personal por plantel.")
+@click.option("--casos", default=",".join(TODOS), show_default=True, help="Casos separados por coma.")
+@click.option("-r", "--repeticiones", default=3, show_default=True)
+@click.option("--calentamiento", default=1, show_default=True, help="Corridas previas que no se registran.")
+@click.option("--filas-bulk", default=200, show_default=True, help="Filas por guardado masivo.")
+@click.option("--filas-import", default=500, show_default=True, help="Filas del Excel de importación.")
+@click.option("--procesos-fichas", default=0, help="FICHAS_PROCESOS para el ZIP general (0 = config).")
+@click.option("--resembrar", is_flag=True, help="Vuelve a sembrar aunque la BD ya tenga esa escala.")
+@click.option("--salida", type=click.Path(dir_okay=False), default=None, help="JSON de resultados.")
+@click.option("--baseline", type=click.Path(dir_okay=False), default=str(BASELINE), show_default=True)
+@click.option("--guardar-baseline", is_flag=True, help="Guarda esta corrida como referencia.")
+@click.option("--tolerancia", default=0.20, show_default=True, help="Empeoramiento tolerado en tiempo y RSS.")
+def main(db_url, db_usuarios, escala, casos, repeticiones, calentamiento, filas_bulk, filas_import,
+         procesos_fichas, resembrar, salida, baseline, guardar_baseline, tolerancia):
+    """Mide las rutas pesadas contra una BD sembrada y compara con la referencia."""
+    n_del, n_pl, n_per = _escala(escala)
+    casos = [c.strip() for c in casos.split(",") if c.strip()]
+    desconocidos = [c for c in casos if c not in TODOS]
+    if desconocidos:
+        raise click.BadParameter(f"casos desconocidos: {', '.join(desconocidos)}", param_hint="--casos")
+
+    DIR_DATOS.mkdir(parents=True, exist_ok=True)
+    if not db_url:
+        db_url = f"sqlite:///{DIR_DATOS / 'bench.db'}"
+        db_usuarios = db_usuarios or f"sqlite:///{DIR_DATOS / 'bench_usuarios.db'}"
+    db_usuarios = db_usuarios or db_url
+    _preparar_entorno(db_url, db_usuarios, procesos_fichas)
+
+    sys.path.insert(0, str(RAIZ))
+    from app import create_app
+    from benchmarks.sembrar import asegurar_bd
+    from benchmarks.medicion import correr_caso, comparar
+
+    click.echo(f"▶ BD {db_url.split('@')[-1]}  escala {n_del}x{n_pl}x{n_per}")
+    asegurar_bd(create_app(), n_del, n_pl, n_per, resembrar=resembrar, log=click.echo)
+
+    opciones = {
+        "repeticiones": repeticiones,
+        "calentamiento": calentamiento,
+        "filas_bulk": filas_bulk,
+        "filas_import": filas_import,
+        "admin_correo": ADMIN_CORREO,
+        "admin_password": ADMIN_PASSWORD,
+    }
+    resultados = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "motor": db_url.split(":", 1)[0],
+        "escala": {"delegaciones": n_del, "planteles_por_delegacion": n_pl, "personal_por_plantel": n_per},
+        "opciones": {k: v for k, v in opciones.items() if not k.startswith("admin_")},
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "casos": {},
+    }
+
+    # Un proceso nuevo por caso: el pico de RSS es sólo de ese caso
+    ctx_mp = multiprocessing.get_context("spawn")
+    for nombre in casos:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx_mp) as pool:
+            res = pool.submit(correr_caso, nombre, opciones).result()
+        resultados["casos"][nombre] = res
+        if "error" in res:
+            click.echo(f"  ✗ {nombre:36} {res['error']}")
+        else:
+            click.echo(f"  • {nombre:36} mediana {res['mediana_s']:8.3f}s  min {res['min_s']:8.3f}s  "
+                       f"consultas {res['consultas']:6}  RSS {res['rss_pico_mb']} MB")
+
+    salida = Path(salida) if salida else DIR_DATOS / f"resultados_{datetime.now():%Y%m%d_%H%M%S}.json"
+    salida.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
+    click.echo(f"\nResultados: {salida}")
+
+    baseline = Path(baseline)
+    if guardar_baseline:
+        baseline.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
+        click.echo(f"Referencia guardada: {baseline}")
+        return
+
+    if not baseline.exists():
+        click.echo("Sin referencia para comparar (usa --guardar-baseline).")
+        return
+    base = json.loads(baseline.read_text(encoding="utf-8"))
+    if base.get("escala") != resultados["escala"] or base.get("motor") != resultados["motor"]:
+        click.echo("⚠ La referencia es de otra escala o motor de BD; la comparación es orientativa.")
+    filas = comparar(resultados, base, tolerancia)
+    _imprimir_comparacion(filas, tolerancia)
+    regresiones = [f for f in filas if f[5]]
+    if regresiones:
+        click.echo(f"\n✗ {len(regresiones)} regresión(es)")
+        sys.exit(1)
+    click.echo("\n✓ Sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
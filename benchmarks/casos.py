@@ -0,0 +1,186 @@
+# benchmarks/casos.py
+"""
+Casos de benchmark. Cada caso recibe un `Contexto` y cronometra SÓLO la
+parte caliente con `with ctx.medir():`; la preparación (leer filas, armar
+el Excel a subir, limpiar cachés) queda fuera.
+"""
+import shutil
+from io import BytesIO
+
+from openpyxl import Workbook
+from sqlalchemy import func
+
+from models import db, Personal, Plantel, Trabajo
+from trabajos import tomar_siguiente, ejecutar
+
+# nombre -> función(ctx)
+CASOS = {}
+
+
+def caso(nombre):
+    def deco(fn):
+        CASOS[nombre] = fn
+        return fn
+    return deco
+
+
+def _ok(r, *esperados):
+    esperados = esperados or (200,)
+    if r.status_code not in esperados:
+        raise AssertionError(f"HTTP {r.status_code}: {r.get_data(as_text=True)[:300]}")
+    return r
+
+
+# ---- APIs de la tabla de personal -------------------------------------------
+@caso("api_listar_personal")
+def _listar_personal(ctx):
+    url = (f"/api/delegaciones/{ctx.delegacion_id}/personal"
+           "?page=1&size=100&sorter[0][field]=apellido_paterno&sorter[0][dir]=asc")
+    with ctx.medir():
+        _ok(ctx.cliente.get(url)).get_data()
+
+
+@caso("api_listar_personal_completa")
+def _listar_personal_completa(ctx):
+    """Toda la delegación en una respuesta, filas como objetos."""
+    with ctx.medir():
+        _ok(ctx.cliente.get(f"/api/delegaciones/{ctx.delegacion_id}/personal")).get_data()
+
+
+@caso("api_listar_personal_columnar")
+def _listar_personal_columnar(ctx):
+    """Lo que pide tabla_personal.html: toda la delegación en formato columnar."""
+    url = f"/api/delegaciones/{ctx.delegacion_id}/personal?format=columnar"
+    with ctx.medir():
+        _ok(ctx.cliente.get(url)).get_data()
+
+
+@caso("api_listar_personal_ultima_pagina")
+def _listar_personal_ultima(ctx):
+    base = f"/api/delegaciones/{ctx.delegacion_id}/personal"
+    ultima = _ok(ctx.cliente.get(f"{base}?page=1&size=100")).get_json()["last_page"]
+    url = f"{base}?page={ultima}&size=100&sorter[0][field]=apellido_paterno&sorter[0][dir]=asc"
+    with ctx.medir():
+        _ok(ctx.cliente.get(url)).get_data()
+
+
+@caso("api_listar_personal_cursor_profundo")
+def _listar_personal_cursor(ctx):
+    """La misma última página que el caso anterior, pero llegando por cursor."""
+    base = f"/api/delegaciones/{ctx.delegacion_id}/personal?size=100&sorter[0][field]=apellido_paterno&sorter[0][dir]=asc"
+    cursor = anterior = ""
+    while cursor is not None:  # recorre hasta la última página (fuera de la medición)
+        anterior = cursor
+        cursor = _ok(ctx.cliente.get(f"{base}&cursor={cursor}")).get_json()["next_cursor"]
+    with ctx.medir():
+        _ok(ctx.cliente.get(f"{base}&cursor={anterior}")).get_data()
+
+
+@caso("api_guardar_personal_bulk")
+def _guardar_bulk(ctx):
+    url = f"/api/delegaciones/{ctx.delegacion_id}/personal"
+    filas = _ok(ctx.cliente.get(f"{url}?page=1&size={ctx.filas_bulk}")).get_json()["data"]
+    for f in filas:
+        f["tel2"] = f"771{ctx.rnd.randrange(10**7):07d}"
+    with ctx.medir():
+        r = _ok(ctx.cliente.post(f"{url}/bulk-update", json={"rows": filas}))
+    datos = r.get_json()
+    if datos["actualizados"] != len(filas):
+        raise AssertionError(f"Se actualizaron {datos['actualizados']} de {len(filas)}")
+
+
+# ---- Importación ---------------------------------------------------------------
+ENCABEZADOS_IMPORT = ["PATERNO", "MATERNO", "NOMBRE", "GENERO", "RFC", "CURP", "CLAVE_PRESUPUESTAL",
+                      "FUNCION", "FECHA_INGRESO", "STATUS_MEMB", "DP_CALLE", "DP_MUN_NOM", "DP_TEL1", "CCT"]
+
+
+def _excel_import(ctx, cct):
+    """Personal actual del CCT (ruta de actualización) + altas nuevas hasta `filas_import`."""
+    actuales = (db.session.query(Personal.apellido_paterno, Personal.apellido_materno, Personal.nombre,
+                                 Personal.genero, Personal.rfc, Personal.curp, Personal.clave_presupuestal)
+                .filter(Personal.cct == cct).all())
+    wb = Workbook()
+    ws = wb.active
+    ws.append(ENCABEZADOS_IMPORT)
+    for p in actuales[:ctx.filas_import]:
+        ws.append([*p, "DOCENTE", "2001-09-01", "ACTIVO", "CALLE 1", "PACHUCA", "7710000000", cct])
+    for k in range(max(0, ctx.filas_import - len(actuales))):
+        ws.append([f"BENCH{k:06d}", "IMPORT", "ALTA", "HM"[k % 2], f"BIM{k:010d}",
+                   f"BENCHIMP{k:010d}", f"BENCH-CLAVE-{k}",
+                   "DOCENTE", "2015-01-16", "ACTIVO", "CALLE 2", "TULA", "7730000000", cct])
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+@caso("subir_excel_personal")
+def _subir_excel(ctx):
+    cct = ctx.cct
+    # Quita las altas de la repetición anterior: cada corrida inserta lo mismo
+    Personal.query.filter(Personal.curp.like("BENCHIMP%")).delete(synchronize_session=False)
+    db.session.commit()
+    contenido = _excel_import(ctx, cct)
+    db.session.remove()
+    # La carga se encola: se mide el POST más la corrida del trabajo en el worker
+    with ctx.medir():
+        _ok(ctx.cliente.post(f"/subir_excel_personal/{cct}",
+                             data={"archivo_excel": (BytesIO(contenido), "personal.xlsx")},
+                             content_type="multipart/form-data"), 200, 302)
+        trabajo = tomar_siguiente()
+        if trabajo is None:
+            raise AssertionError("La carga no encoló ningún trabajo")
+        tid = trabajo.id
+        ejecutar(trabajo)
+    db.session.remove()
+    trabajo = db.session.get(Trabajo, tid)
+    if trabajo.estado != "terminado":
+        raise AssertionError(f"Trabajo {tid}: {trabajo.estado} ({trabajo.mensaje})")
+
+
+# ---- Reportes / exportaciones -----------------------------------------------
+@caso("reporte_general_zip")
+def _reporte_general(ctx):
+    # Caché de fichas vacío en cada repetición: se mide el render completo
+    shutil.rmtree(ctx.app.config["FICHAS_CACHE_DIR"], ignore_errors=True)
+    db.session.remove()
+    # El ZIP se arma en un trabajo: se mide encolarlo, correrlo y descargarlo
+    with ctx.medir():
+        tid = _ok(ctx.cliente.get("/dashboard/reporte_general.zip"), 202).get_json()["id"]
+        trabajo = tomar_siguiente()
+        if trabajo is None or trabajo.id != tid:
+            raise AssertionError(f"El reporte no encoló el trabajo {tid}")
+        ejecutar(trabajo)
+        r = _ok(ctx.cliente.get(f"/trabajos/{tid}/descargar"))
+        ctx.bytes = len(r.get_data())
+
+
+def _descarga(url):
+    def correr(ctx):
+        with ctx.medir():
+            r = _ok(ctx.cliente.get(url(ctx) if callable(url) else url))
+            ctx.bytes = len(r.get_data())
+    return correr
+
+
+caso("reporte_personal_pdf")(_descarga("/personal/reporte/pdf"))
+caso("reporte_delegaciones_excel")(_descarga("/delegaciones/reporte/excel"))
+caso("reporte_ccts_excel")(_descarga("/planteles/reporte/excel"))
+caso("reporte_personal_excel")(_descarga("/personal/reporte/excel"))
+caso("exportar_personal_excel")(_descarga(
+    lambda ctx: f"/api/delegaciones/{ctx.delegacion_id}/personal/export-excel"))
+
+
+def elegir_objetivos():
+    """Delegación con más personal y su CCT más poblado (los casos por delegación usan ésos)."""
+    delegacion_id, _ = (db.session.query(Plantel.delegacion_id, func.count(Personal.id))
+                        .join(Personal, Personal.cct == Plantel.cct)
+                        .group_by(Plantel.delegacion_id)
+                        .order_by(func.count(Personal.id).desc(), Plantel.delegacion_id)
+                        .first())
+    cct, _ = (db.session.query(Plantel.cct, func.count(Personal.id))
+              .join(Personal, Personal.cct == Plantel.cct)
+              .filter(Plantel.delegacion_id == delegacion_id)
+              .group_by(Plantel.cct)
+              .order_by(func.count(Personal.id).desc(), Plantel.cct)
+              .first())
+    return delegacion_id, cct
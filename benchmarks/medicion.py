@@ -0,0 +1,128 @@
+# benchmarks/medicion.py
+"""Ejecución de un caso en su propio proceso y comparación contra la referencia."""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+def rss_pico_mb():
+    """Pico de memoria residente del proceso actual (None si no hay cómo medirlo)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 2**20, 1)
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (2**20 if sys.platform == "darwin" else 2**10), 1)  # bytes en macOS, KiB en Linux
+
+
+class Contexto:
+    """Lo que recibe cada caso: app, cliente con sesión de admin y el cronómetro."""
+
+    def __init__(self, app, cliente, delegacion_id, cct, opciones):
+        self.app = app
+        self.cliente = cliente
+        self.delegacion_id = delegacion_id
+        self.cct = cct
+        self.filas_bulk = opciones["filas_bulk"]
+        self.filas_import = opciones["filas_import"]
+        self.rnd = random.Random(7)
+        self.bytes = None
+        self.tiempo = None
+        self.consultas = 0
+        self._contando = False
+
+    def contar(self, *_):
+        if self._contando:
+            self.consultas += 1
+
+    @contextmanager
+    def medir(self):
+        self.consultas = 0
+        self._contando = True
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tiempo = time.perf_counter() - t0
+            self._contando = False
+
+
+def correr_caso(nombre, opciones):
+    """
+    Punto de entrada del proceso hijo: crea la app, inicia sesión y corre
+    `calentamiento` + `repeticiones` veces el caso. Devuelve un dict.
+    """
+    # Caché de fichas propio y vacío para este proceso
+    os.environ["FICHAS_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_fichas_")
+    os.environ["TRABAJOS_DIR"] = tempfile.mkdtemp(prefix="bench_trabajos_")
+
+    from app import create_app
+    from models import db
+    from benchmarks.casos import CASOS, elegir_objetivos
+
+    app = create_app()
+    with app.app_context():
+        delegacion_id, cct = elegir_objetivos()
+        ctx = Contexto(app, None, delegacion_id, cct, opciones)
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", ctx.contar)
+
+    cliente = app.test_client()
+    r = cliente.post("/", data={"correo": opciones["admin_correo"], "contraseña": opciones["admin_password"]})
+    if r.status_code != 302:
+        return {"error": f"No se pudo iniciar sesión (HTTP {r.status_code})"}
+    ctx.cliente = cliente
+
+    fn = CASOS[nombre]
+    tiempos, consultas = [], []
+    try:
+        for i in range(opciones["calentamiento"] + opciones["repeticiones"]):
+            with app.app_context():
+                fn(ctx)
+            if i >= opciones["calentamiento"]:
+                tiempos.append(ctx.tiempo)
+                consultas.append(ctx.consultas)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+    return {
+        "repeticiones": len(tiempos),
+        "tiempos_s": [round(t, 4) for t in tiempos],
+        "min_s": round(min(tiempos), 4),
+        "mediana_s": round(statistics.median(tiempos), 4),
+        "consultas": max(consultas),
+        "rss_pico_mb": rss_pico_mb(),
+        "bytes": ctx.bytes,
+    }
+
+
+# ---- Comparación ---------------------------------------------------------------
+def comparar(actual, base, tolerancia):
+    """
+    Lista de (caso, métrica, base, actual, cambio, regresion) para los casos
+    presentes en ambas corridas. Tiempo (mediana) y RSS toleran `tolerancia`
+    (fracción); consultas no toleran aumento.
+    """
+    filas = []
+    for nombre, a in actual["casos"].items():
+        b = base.get("casos", {}).get(nombre)
+        if not b or "error" in a or "error" in b:
+            continue
+        for metrica, tol in (("mediana_s", tolerancia), ("rss_pico_mb", tolerancia), ("consultas", 0)):
+            va, vb = a.get(metrica), b.get(metrica)
+            if va is None or vb is None:
+                continue
+            cambio = (va - vb) / vb if vb else (0.0 if va == vb else float("inf"))
+            filas.append((nombre, metrica, vb, va, cambio, cambio > tol))
+    return filas
@@ -0,0 +1,144 @@
+# benchmarks/sembrar.py
+"""Siembra determinista de la BD de benchmarks (inserts masivos de Core)."""
+import random
+from datetime import date
+
+from sqlalchemy import inspect
+
+from models import db, Delegacion, Plantel, Personal, VersionTabla
+
+LOTE = 5000
+
+NIVELES = ["PRIMARIA GENERAL", "PREESCOLAR GENERAL", "SECUNDARIA GENERAL", "SECUNDARIA TECNICA"]
+TURNOS = ["MATUTINO", "VESPERTINO", "DISCONTINUO"]
+FUNC_COORD = ["DOCENTE", "DOCENTE", "DOCENTE", "DIRECTOR (A)", "ADMINISTRATIVO (A)",
+              "PREFECTO (A)", "INTENDENCIA", None]
+ESTATUS = ["ACTIVO"] * 18 + ["BAJA EN PROCESO", "JUBILADO"]
+MUNICIPIOS = ["PACHUCA", "TULANCINGO", "TULA", "HUEJUTLA", "IXMIQUILPAN", "ACTOPAN"]
+
+
+def marca_escala(n_del, n_pl, n_per):
+    """Fila de versiones_tabla que identifica una BD sembrada por benchmarks."""
+    return f"benchmarks:{n_del}x{n_pl}x{n_per}"
+
+
+def _marcas():
+    if not inspect(db.engine).has_table(VersionTabla.__tablename__):
+        return set()
+    return {t for (t,) in db.session.query(VersionTabla.tabla)
+            .filter(VersionTabla.tabla.like("benchmarks:%"))}
+
+
+def _tiene_datos():
+    if not inspect(db.engine).has_table(Personal.__tablename__):
+        return False
+    return db.session.query(Personal.id).limit(1).first() is not None
+
+
+def asegurar_bd(app, n_del, n_pl, n_per, resembrar=False, log=print):
+    """Deja la BD sembrada a la escala pedida (reutiliza si ya lo está)."""
+    marca = marca_escala(n_del, n_pl, n_per)
+    with app.app_context():
+        marcas = _marcas()
+        if marca in marcas and not resembrar:
+            log(f"BD ya sembrada ({marca}), se reutiliza")
+            return False
+        if not marcas and _tiene_datos():
+            raise RuntimeError("La BD tiene datos que no sembró benchmarks; usa una BD dedicada.")
+
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        from app import ensure_admin
+        ensure_admin(app)
+
+        sembrar(n_del, n_pl, n_per, log=log)
+        db.session.add(VersionTabla(tabla=marca, version=1))
+        db.session.commit()
+    return True
+
+
+def _persona(rnd, k, cct, plantel):
+    paterno = f"AP{k:07d}"
+    return {
+        "apellido_paterno": paterno,
+        "apellido_materno": rnd.choice(["HERNANDEZ", "LOPEZ", "MARTINEZ", "GARCIA", "PEREZ"]),
+        "nombre": rnd.choice(["MARIA", "JUAN", "JOSE", "GUADALUPE", "ANA", "LUIS"]) + f" {k}",
+        "genero": rnd.choice("HM"),
+        "rfc": f"RFC{k:010d}",
+        "curp": f"CURP{k:014d}",
+        "clave_presupuestal": f"0712E0281{k:08d}",
+        "funcion": "DOCENTE FRENTE A GRUPO",
+        "funcion_coordinacion": rnd.choice(FUNC_COORD),
+        "grado_estudios": rnd.choice(["LICENCIATURA", "MAESTRIA", "NORMAL BASICA"]),
+        "titulado": rnd.choice(["SI", "NO"]),
+        "fecha_ingreso": date(1990 + rnd.randrange(34), rnd.randrange(1, 13), rnd.randrange(1, 28)),
+        "estatus_membresia": rnd.choice(ESTATUS),
+        "nombramiento": rnd.choice(["BASE", "INTERINO"]),
+        "domicilio": f"CALLE {rnd.randrange(1, 300)}",
+        "numero": str(rnd.randrange(1, 999)),
+        "localidad": plantel["localidad"],
+        "colonia": f"COLONIA {rnd.randrange(1, 50)}",
+        "municipio": plantel["municipio"],
+        "cp": plantel["cp"],
+        "tel1": f"771{rnd.randrange(10**7):07d}",
+        "correo_electronico": f"{paterno.lower()}@correo.mx",
+        "escuela_nombre": plantel["nombre"],
+        "turno": plantel["turno"],
+        "nivel": plantel["nivel"],
+        "subs_modalidad": plantel["modalidad"],
+        "zona_escolar": plantel["zona_escolar"],
+        "sector": plantel["sector"],
+        "estado": "HIDALGO",
+        "cct": cct,
+    }
+
+
+def sembrar(n_del, n_pl, n_per, semilla=1, log=print):
+    rnd = random.Random(semilla)
+    t_del, t_pl, t_per = Delegacion.__table__, Plantel.__table__, Personal.__table__
+
+    db.session.execute(t_del.insert(), [
+        {"nombre": f"D-{d:03d}", "nivel": NIVELES[d % len(NIVELES)], "delegado": f"DELEGADO {d}"}
+        for d in range(n_del)
+    ])
+    ids = [i for (i,) in db.session.query(Delegacion.id).order_by(Delegacion.id)]
+
+    planteles = []
+    for d, did in enumerate(ids):
+        for p in range(n_pl):
+            municipio = rnd.choice(MUNICIPIOS)
+            planteles.append({
+                "cct": f"13D{d:03d}{p:05d}X",
+                "nombre": f"ESCUELA {d}-{p}",
+                "turno": rnd.choice(TURNOS),
+                "nivel": NIVELES[d % len(NIVELES)].split()[0],
+                "modalidad": "GENERAL",
+                "zona_escolar": str(rnd.randrange(1, 120)),
+                "sector": str(rnd.randrange(1, 30)),
+                "calle": f"AV. {rnd.randrange(1, 200)}",
+                "num_exterior": str(rnd.randrange(1, 500)),
+                "localidad": municipio,
+                "colonia": "CENTRO",
+                "municipio": municipio,
+                "cp": f"42{rnd.randrange(1000):03d}",
+                "coordenadas_gps": f"20.{rnd.randrange(10**6)},-98.{rnd.randrange(10**6)}",
+                "estado": "HIDALGO",
+                "delegacion_id": did,
+            })
+    for i in range(0, len(planteles), LOTE):
+        db.session.execute(t_pl.insert(), planteles[i:i + LOTE])
+    log(f"  {len(ids)} delegaciones, {len(planteles)} planteles")
+
+    lote, k = [], 0
+    for pl in planteles:
+        for _ in range(n_per):
+            k += 1
+            lote.append(_persona(rnd, k, pl["cct"], pl))
+            if len(lote) >= LOTE:
+                db.session.execute(t_per.insert(), lote)
+                lote = []
+    if lote:
+        db.session.execute(t_per.insert(), lote)
+    db.session.commit()
+    log(f"  {k} personas")
@@ -0,0 +1,66 @@
+# cache_http.py
+"""
+GET condicional (ETag / Last-Modified → 304) para las APIs JSON de lectura.
+
+La ruta calcula una marca barata de los datos (contador o máximo de
+updated_at/version) ANTES de consultar filas y llama a `no_modificado`:
+si el cliente ya tiene esa versión se responde 304 sin tocar nada más.
+Si no, arma la respuesta normal y la pasa por `con_validadores`.
+
+    etag, lm = etag_de(marca, request.query_string), marca_fecha
+    r304 = no_modificado(etag, lm)
+    if r304: return r304
+    ...
+    return con_validadores(jsonify(...), etag, lm)
+"""
+import hashlib
+from datetime import timezone
+
+from flask import request, Response
+
+
+def etag_de(*partes):
+    """ETag fuerte a partir de la marca de datos y los parámetros de la petición."""
+    h = hashlib.sha1()
+    for p in partes:
+        h.update(p if isinstance(p, bytes) else repr(p).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def _utc(dt):
+    """datetime naive en UTC (como se guarda updated_at) -> aware, sin microsegundos."""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.replace(microsecond=0)
+
+
+def _cabeceras(resp, etag, last_modified):
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    # El navegador puede guardarla, pero debe revalidar cada vez
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+def no_modificado(etag, last_modified=None):
+    """Respuesta 304 si el cliente ya tiene esta versión; si no, None."""
+    last_modified = _utc(last_modified)
+    if request.if_none_match:
+        # If-None-Match manda sobre If-Modified-Since (RFC 9110 §13.2.2)
+        fresco = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified is not None:
+        fresco = last_modified <= request.if_modified_since
+    else:
+        fresco = False
+    if not fresco:
+        return None
+    return _cabeceras(Response(status=304), etag, last_modified)
+
+
+def con_validadores(resp, etag, last_modified=None):
+    """Agrega ETag / Last-Modified / Cache-Control a una respuesta 200."""
+    return _cabeceras(resp, etag, _utc(last_modified))
@@ -0,0 +1,229 @@
+# cache_reportes.py
+"""
+Caché en disco para los reportes de delegaciones / planteles / personal.
+
+Clave: (tipo de reporte, alcance del rol, delegacion_id, marca de datos).
+La marca de datos sale de `versiones_tabla`: un contador por tabla que se
+incrementa dentro de la MISMA transacción que escribe en Delegacion,
+Plantel o Personal (eventos de sesión; una vez por tabla, al hacer commit),
+así que un commit invalida solo.
+
+Se guardan dos cosas por clave:
+  - los datos ya consultados (pickle), para no repetir las consultas;
+  - el archivo generado (bytes), que se sirve tal cual en descargas repetidas.
+
+Sólo "Generado por / Fecha" depende de la petición: con `?resellar=1` (o
+REPORTES_CACHE_RESELLAR) el archivo se vuelve a generar con el sello actual
+a partir de los datos en caché, sin consultar la BD.
+
+Escrituras con SQL crudo (`text(...)`) no mueven la marca.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+from datetime import datetime
+from io import BytesIO
+
+from flask import current_app, request, send_file
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import db, Delegacion, Plantel, Personal, VersionTabla
+
+# Modelo -> nombre en versiones_tabla
+TABLAS_VERSIONADAS = {
+    Delegacion: "delegacion",
+    Plantel: "plantel",
+    Personal: "personal",
+}
+
+_PENDIENTES = "versiones_pendientes"
+
+
+# ---- Marca de datos ------------------------------------------------------
+def _incrementar(conn, tablas):
+    """
+    INSERT ... ON CONFLICT DO UPDATE: atómico aunque la fila aún no exista
+    (con UPDATE y luego INSERT, dos primeras escrituras simultáneas chocaban
+    en la llave y la segunda perdía su transacción).
+    """
+    t = VersionTabla.__table__
+    insertar = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+    for tabla in sorted(tablas):  # orden fijo: evita interbloqueos entre transacciones
+        stmt = insertar(t).values(tabla=tabla, version=1)
+        conn.execute(stmt.on_conflict_do_update(index_elements=[t.c.tabla],
+                                                set_={"version": t.c.version + 1}))
+
+
+def _conexion(session):
+    return session.connection(bind_arguments={"mapper": VersionTabla.__mapper__})
+
+
+@event.listens_for(Session, "before_flush")
+def _marcar_tablas(session, flush_context, instances):
+    tablas = session.info.setdefault(_PENDIENTES, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tabla = TABLAS_VERSIONADAS.get(type(obj))
+        if tabla and (obj in session.new or obj in session.deleted or session.is_modified(obj)):
+            tablas.add(tabla)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _marcar_en_masivos(orm_execute_state):
+    """query.update()/delete() y session.execute(update(Modelo)) no pasan por flush."""
+    st = orm_execute_state
+    if not (st.is_update or st.is_delete or st.is_insert):
+        return
+    mapper = st.bind_mapper
+    tabla = TABLAS_VERSIONADAS.get(mapper.class_) if mapper is not None else None
+    if tabla:
+        st.session.info.setdefault(_PENDIENTES, set()).add(tabla)
+
+
+@event.listens_for(Session, "before_commit")
+def _incrementar_versiones(session):
+    """
+    Un incremento por tabla y transacción, justo antes del COMMIT: así el
+    candado de la fila de versiones_tabla dura lo mínimo, aunque la petición
+    haya hecho un UPDATE por fila.
+    """
+    if session.in_nested_transaction():
+        return  # un SAVEPOINT no cierra la transacción: lo hace el commit externo
+    session.flush()  # commit() hace su flush después de este evento; lo pendiente debe contar
+    tablas = session.info.pop(_PENDIENTES, None)
+    if tablas:
+        _incrementar(_conexion(session), tablas)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _descartar_pendientes(session, transaction):
+    """Si la transacción externa terminó sin commit (rollback), lo marcado ya no cuenta."""
+    if transaction.parent is None:
+        session.info.pop(_PENDIENTES, None)
+
+
+def marca_datos(tablas=None):
+    """
+    Marca de agua de las tablas versionadas (todas, o sólo `tablas`),
+    p. ej. 'delegacion:3|personal:120|plantel:9'.
+    """
+    tablas = sorted(tablas or TABLAS_VERSIONADAS.values())
+    filas = dict(db.session.query(VersionTabla.tabla, VersionTabla.version)
+                 .filter(VersionTabla.tabla.in_(tablas))
+                 .all())
+    return "|".join(f"{t}:{filas.get(t, 0)}" for t in tablas)
+
+
+# ---- Disco (LRU por mtime) ----------------------------------------------
+def _directorio():
+    path = current_app.config["REPORTES_CACHE_DIR"]
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _ruta(clave, ext):
+    h = hashlib.sha1(repr(clave).encode("utf-8")).hexdigest()
+    return os.path.join(_directorio(), f"{h}.{ext}")
+
+
+def _leer(ruta):
+    try:
+        with open(ruta, "rb") as fh:
+            datos = fh.read()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(ruta)  # último uso → LRU
+    except OSError:
+        pass
+    return datos
+
+
+def _escribir(ruta, datos):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(datos)
+        os.replace(tmp, ruta)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    _podar()
+
+
+def _podar():
+    """Borra los archivos usados hace más tiempo hasta quedar bajo REPORTES_CACHE_MAX_MB."""
+    limite = current_app.config["REPORTES_CACHE_MAX_MB"] * 1024 * 1024
+    archivos = []
+    total = 0
+    with os.scandir(_directorio()) as it:
+        for e in it:
+            if not e.is_file() or e.name.endswith(".tmp"):
+                continue
+            st = e.stat()
+            archivos.append((st.st_mtime, st.st_size, e.path))
+            total += st.st_size
+    if total <= limite:
+        return
+    for _, size, path in sorted(archivos):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        if total <= limite:
+            break
+
+
+# ---- Reportes ------------------------------------------------------------
+def _alcance():
+    """(rol, delegacion_id) tal como lo aplican los _fetch_* de los reportes."""
+    if current_user.rol == "delegado":
+        return "delegado", current_user.delegacion_id
+    return "global", request.args.get("delegacion_id", type=int)
+
+
+def _sello():
+    return {
+        "generado_por": getattr(current_user, "nombre", "Sistema"),
+        "generado_en": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def reporte_cacheado(tipo, formato, fetch, render, filename, mimetype):
+    """
+    Sirve el reporte `tipo` en `formato` ('xlsx' | 'pdf').
+      fetch()       -> dict de datos (incluye generado_por / generado_en)
+      render(data)  -> bytes del archivo
+    """
+    if not current_app.config.get("REPORTES_CACHE"):
+        return send_file(BytesIO(render(fetch())), as_attachment=True,
+                         download_name=filename, mimetype=mimetype)
+
+    # La marca se lee ANTES de consultar: si algo cambia a media consulta,
+    # la entrada queda bajo la marca vieja y nadie la vuelve a pedir.
+    clave = (tipo,) + _alcance() + (marca_datos(),)
+    resellar = current_app.config.get("REPORTES_CACHE_RESELLAR") or request.args.get("resellar") == "1"
+
+    ruta_archivo = _ruta(clave + (formato,), formato)
+    contenido = None if resellar else _leer(ruta_archivo)
+
+    if contenido is None:
+        ruta_datos = _ruta(clave + ("datos",), "pkl")
+        crudo = _leer(ruta_datos)
+        if crudo is not None:
+            data = pickle.loads(crudo)  # archivo propio en REPORTES_CACHE_DIR
+        else:
+            data = fetch()
+            data.pop("generado_por", None)
+            data.pop("generado_en", None)
+            _escribir(ruta_datos, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+        contenido = render({**data, **_sello()})
+        _escribir(ruta_archivo, contenido)
+
+    return send_file(BytesIO(contenido), as_attachment=True,
+                     download_name=filename, mimetype=mimetype)
@@ -32,3 +32,19 @@ class Config:
     DEFAULT_ADMIN_DELEGACION = "DII-127"
 
     PERMANENT_SESSION_LIFETIME = timedelta(minutes=30)
+
+    # Trabajos en segundo plano (reportes pesados)
+    # TRABAJOS_DIR es área temporal local de cada proceso; entradas y resultados viven en la BD (trabajos_archivos)
+    TRABAJOS_DIR = os.getenv("TRABAJOS_DIR", str(Path(__file__).resolve().parent / "instance" / "trabajos"))
+    TRABAJOS_RETENCION_DIAS = int(os.getenv("TRABAJOS_RETENCION_DIAS", "7"))  # luego se borran los resultados
+    TRABAJOS_INTERVALO_SEG = float(os.getenv("TRABAJOS_INTERVALO_SEG", "2"))
+    TRABAJOS_LATIDO_MAX_MIN = int(os.getenv("TRABAJOS_LATIDO_MAX_MIN", "15"))  # en_proceso sin latido → se reencola
+    FICHAS_PROCESOS = int(os.getenv("FICHAS_PROCESOS", "0")) or os.cpu_count() or 1  # procesos para render de fichas
+    FICHAS_CACHE_DIR = os.getenv("FICHAS_CACHE_DIR", str(Path(__file__).resolve().parent / "instance" / "cache_fichas"))
+    FICHAS_CACHE_MAX_MB = int(os.getenv("FICHAS_CACHE_MAX_MB", "1024"))  # se poda (LRU) al terminar cada ZIP general y, a lo más cada 10 min, desde la ficha individual
+
+    # Caché en disco de reportes (delegaciones / planteles / personal)
+    REPORTES_CACHE = os.getenv("REPORTES_CACHE", "1") == "1"
+    REPORTES_CACHE_DIR = os.getenv("REPORTES_CACHE_DIR", str(Path(__file__).resolve().parent / "instance" / "cache_reportes"))
+    REPORTES_CACHE_MAX_MB = int(os.getenv("REPORTES_CACHE_MAX_MB", "256"))  # LRU por fecha de último uso
+    REPORTES_CACHE_RESELLAR = os.getenv("REPORTES_CACHE_RESELLAR", "0") == "1"  # True: siempre "Generado por/Fecha" actuales
@@ -0,0 +1,378 @@
+# fichas_pdf.py
+"""
+Render de fichas individuales de personal (PDF).
+
+Este módulo NO importa Flask ni modelos: los procesos hijos del pool sólo
+reciben tuplas planas (`FichaFila`) y devuelven los bytes del PDF.
+
+La ficha se dibuja directo en un canvas: el marco de la página (título,
+columnas, plantillas de la tarjeta, estilos) se calcula una sola vez al
+importar y por persona sólo se colocan los valores. Platypus se usa
+únicamente para las tablas de largo variable (observaciones e historial).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from xml.sax.saxutils import escape
+import multiprocessing
+
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas as rl_canvas
+from reportlab.platypus import Table, TableStyle, Paragraph, Spacer, Frame
+from reportlab.platypus.doctemplate import LayoutError
+
+CAMPOS_PERSONA = (
+    "apellido_paterno", "apellido_materno", "nombre", "genero", "rfc", "curp",
+    "clave_presupuestal", "estatus_membresia", "nombramiento",
+    "funcion", "grado_estudios", "titulado",
+    "domicilio", "numero", "colonia", "municipio", "cp",
+    "tel1", "tel2", "correo_electronico",
+    "fecha_ingreso", "fecha_baja_jubilacion",
+)
+
+FichaFila = namedtuple("FichaFila", CAMPOS_PERSONA + ("delegacion", "nivel", "plantel_nombre", "plantel_cct"))
+
+# Debajo de esta cantidad no vale la pena levantar procesos
+MIN_FICHAS_PARALELO = 50
+
+# Subir cuando cambie el diseño de la ficha: invalida el caché en disco
+VERSION_FICHA = 2
+
+
+def fila_ficha(persona, delegacion_nombre="", nivel="", plantel_dict=None):
+    """Convierte un Personal (o cualquier objeto con esos atributos) en FichaFila."""
+    pl = plantel_dict or {}
+    vals = []
+    for c in CAMPOS_PERSONA:
+        v = getattr(persona, c, None)
+        vals.append("" if v is None else str(v))
+    return FichaFila(*vals, delegacion_nombre or "", nivel or "", pl.get("nombre", "") or "", pl.get("cct", "") or "")
+
+
+# ---- Marco fijo de la página (se arma una vez por proceso) ----------------
+PAGINA = landscape(letter)
+_MX, _MY = 20, 22
+ANCHO = PAGINA[0] - 2 * _MX
+_ARRIBA = PAGINA[1] - _MY
+_CENTRO_X = PAGINA[0] / 2.0
+
+_FUENTE, _FUENTE_B = "Helvetica", "Helvetica-Bold"
+_TAM, _INTERLINEA = 8.5, 10.2
+_TITULO = "FICHA INDIVIDUAL DE PERSONAL"
+_TAM_TITULO, _INTERLINEA_TITULO = 18, 22
+
+_COL = ANCHO / 3.0
+_COLS_X = tuple(_MX + i * _COL for i in range(4))
+_PAD_X, _PAD_Y = 4, 2
+_ANCHO_CELDA = _COL - 2 * _PAD_X
+_PAD_NOMBRE = 6
+_GRIS_NOMBRE = colors.HexColor("#F0F0F0")
+
+# Tarjeta de datos: 3 columnas, plantillas sobre los campos de FichaFila
+_TARJETA = (
+    ("Género: {genero}", "RFC: {rfc}", "CURP: {curp}"),
+    ("Clave presup.: {clave_presupuestal}", "Estatus: {estatus_membresia}", "Nombramiento: {nombramiento}"),
+    ("Función: {funcion}", "Grado: {grado_estudios}", "Titulado: {titulado}"),
+    ("Domicilio: {domicilio} {numero}", "Colonia: {colonia}", "Municipio: {municipio}"),
+    ("CP: {cp}", "Tel1: {tel1}", "Tel2: {tel2}"),
+    ("Correo: {correo_electronico}", "", ""),
+    ("F. ingreso: {fecha_ingreso}", "F. baja/jub: {fecha_baja_jubilacion}", ""),
+)
+
+# Estilos para las tablas variables (platypus)
+_styles = getSampleStyleSheet()
+_SMALL = ParagraphStyle("small", parent=_styles["Normal"],
+                        fontName=_FUENTE, fontSize=_TAM, leading=_INTERLINEA, wordWrap="CJK")
+_SMALL_BOLD = ParagraphStyle("small_bold", parent=_SMALL, fontName=_FUENTE_B)
+_ESTILO_TABLA = TableStyle([
+    ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#ECECEC")),
+    ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
+    ("VALIGN", (0,0), (-1,-1), "TOP"),
+])
+_CW_OBS = (3.0*cm, 5.0*cm, ANCHO - 8.0*cm)
+_CW_HIST = (3.2*cm, 3.0*cm, (ANCHO - 12.2*cm) / 2, (ANCHO - 12.2*cm) / 2, 3.0*cm, 3.0*cm)
+
+
+def _lineas(texto, ancho, fuente=_FUENTE, tam=_TAM):
+    """Parte el texto en renglones que caben en `ancho` (corta palabras demasiado largas)."""
+    lineas = []
+    for l in simpleSplit(texto, fuente, tam, ancho) or [""]:
+        while len(l) > 1 and stringWidth(l, fuente, tam) > ancho:
+            n = len(l) - 1
+            while n > 1 and stringWidth(l[:n], fuente, tam) > ancho:
+                n -= 1
+            lineas.append(l[:n])
+            l = l[n:]
+        lineas.append(l)
+    return lineas
+
+
+def _P(txt, bold=False):
+    return Paragraph(escape("" if txt is None else str(txt)), _SMALL_BOLD if bold else _SMALL)
+
+
+def _tablas_variables(observaciones, historial):
+    story = []
+    if observaciones is not None:
+        story.append(Spacer(1, 10))
+        story.append(Paragraph("<b>Observaciones</b>", _SMALL_BOLD))
+        if observaciones:
+            rows = [[_P("Fecha", True), _P("Usuario", True), _P("Texto", True)]]
+            rows += [[_P(v) for v in o] for o in observaciones]
+            t = Table(rows, colWidths=_CW_OBS, hAlign="LEFT", repeatRows=1)
+            t.setStyle(_ESTILO_TABLA)
+            story.append(t)
+        else:
+            story.append(_P("Sin observaciones registradas."))
+    if historial is not None:
+        story.append(Spacer(1, 10))
+        story.append(Paragraph("<b>Historial de movimientos</b>", _SMALL_BOLD))
+        if historial:
+            rows = [[_P(h, True) for h in ("Fecha", "Campo", "Antes", "Después", "Usuario", "Tipo")]]
+            rows += [[_P(v) for v in h] for h in historial]
+            t = Table(rows, colWidths=_CW_HIST, hAlign="LEFT", repeatRows=1)
+            t.setStyle(_ESTILO_TABLA)
+            story.append(t)
+        else:
+            story.append(_P("Sin movimientos en el historial."))
+    return story
+
+
+def _frame(alto_arriba):
+    return Frame(_MX, _MY, ANCHO, alto_arriba - _MY,
+                 leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0, showBoundary=0)
+
+
+def _fluir(c, story, y):
+    """Coloca los flowables desde `y` hacia abajo, partiendo tablas y abriendo páginas."""
+    frame = _frame(y)
+    while story:
+        f = story.pop(0)
+        if frame.add(f, c):
+            continue
+        partes = frame.split(f, c)
+        if partes:
+            story[0:0] = partes
+            continue
+        if frame._atTop:
+            raise LayoutError(f"Flowable {f.__class__.__name__} no cabe en una página")
+        c.showPage()
+        frame = _frame(_ARRIBA)
+        story.insert(0, f)
+
+
+def render_ficha(f: FichaFila, generado_por: str, generado_en: str,
+                 observaciones=None, historial=None) -> bytes:
+    """
+    PDF de una ficha. `observaciones` (fecha, usuario, texto) e `historial`
+    (fecha, campo, antes, después, usuario, tipo) son filas ya en texto;
+    con None la sección no se incluye (así va en el ZIP general).
+    `generado_en` se imprime como "Fecha de elaboración": la ficha se
+    reutiliza desde el caché mientras sus datos no cambien, así que es la
+    fecha en que se dibujó esa versión, no la de la descarga.
+    """
+    buf = BytesIO()
+    c = rl_canvas.Canvas(buf, pagesize=PAGINA)
+    c.setFillColor(colors.black)
+
+    # Título y encabezado
+    y = _ARRIBA
+    c.setFont(_FUENTE_B, _TAM_TITULO)
+    c.drawCentredString(_CENTRO_X, y - _TAM_TITULO, _TITULO)
+    y -= _INTERLINEA_TITULO + 6
+
+    c.setFont(_FUENTE, _TAM)
+    encabezado = (f"Delegación: {f.delegacion} — {f.nivel}  |  Plantel: {f.plantel_nombre} ({f.plantel_cct})",
+                  f"Generado por: {generado_por}  |  Fecha de elaboración: {generado_en}")
+    for texto in encabezado:
+        for l in _lineas(texto, ANCHO):
+            c.drawString(_MX, y - _TAM, l)
+            y -= _INTERLINEA
+    y -= 8
+
+    # Nombre en recuadro gris
+    nombre = f"{f.apellido_paterno} {f.apellido_materno} {f.nombre}".strip()
+    lineas = _lineas(nombre, ANCHO - 2 * _PAD_NOMBRE, _FUENTE_B)
+    alto = len(lineas) * _INTERLINEA + 8
+    c.setFillColor(_GRIS_NOMBRE)
+    c.setStrokeColor(colors.black)
+    c.setLineWidth(0.5)
+    c.rect(_MX, y - alto, ANCHO, alto, stroke=1, fill=1)
+    c.setFillColor(colors.black)
+    c.setFont(_FUENTE_B, _TAM)
+    yy = y - 4 - _TAM
+    for l in lineas:
+        c.drawString(_MX + _PAD_NOMBRE, yy, l)
+        yy -= _INTERLINEA
+    y -= alto + 6
+
+    # Tarjeta de datos (alto de cada renglón según el texto más largo)
+    valores = f._asdict()
+    c.setFont(_FUENTE, _TAM)
+    bordes = [y]
+    for plantillas in _TARJETA:
+        celdas = [_lineas(p.format_map(valores), _ANCHO_CELDA) if p else () for p in plantillas]
+        for x, lineas in zip(_COLS_X, celdas):
+            yy = y - _PAD_Y - _TAM
+            for l in lineas:
+                c.drawString(x + _PAD_X, yy, l)
+                yy -= _INTERLINEA
+        y -= max(1, max(len(l) for l in celdas)) * _INTERLINEA + 2 * _PAD_Y
+        bordes.append(y)
+
+    c.setStrokeColor(colors.lightgrey)
+    c.setLineWidth(0.25)
+    for by in bordes:
+        c.line(_COLS_X[0], by, _COLS_X[-1], by)
+    for x in _COLS_X:
+        c.line(x, bordes[0], x, bordes[-1])
+
+    # Secciones variables
+    story = _tablas_variables(observaciones, historial)
+    if story:
+        _fluir(c, story, y)
+
+    c.showPage()
+    c.save()
+    pdf = buf.getvalue(); buf.close()
+    return pdf
+
+
+def _render_args(args):
+    return render_ficha(*args)
+
+
+def render_fichas(filas, generado_por, generado_en, procesos=None, chunksize=8):
+    """
+    Genera los PDFs de `filas` (FichaFila) y los entrega EN EL MISMO ORDEN.
+
+    Con `procesos` > 1 y suficientes filas usa un ProcessPoolExecutor
+    (contexto 'spawn': los hijos no heredan conexiones a la BD). El resultado
+    es el mismo que el render en serie: la fecha se fija una sola vez aquí.
+    """
+    filas = list(filas)
+    procesos = procesos if procesos is not None else (os.cpu_count() or 1)
+    args = ((f, generado_por, generado_en) for f in filas)
+
+    if procesos <= 1 or len(filas) < MIN_FICHAS_PARALELO:
+        for a in args:
+            yield _render_args(a)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=ctx) as ex:
+        yield from ex.map(_render_args, args, chunksize=chunksize)
+
+
+# ---- Caché en disco de fichas renderizadas --------------------------------
+def huella_ficha(f: FichaFila, generado_por, observaciones=None, historial=None):
+    """
+    Huella (sha256) de todo lo que determina el PDF: datos de la persona,
+    nombres de plantel/delegación, quién lo genera y, si se incluyen, las
+    filas de observaciones e historial. La fecha NO entra: la ficha en caché
+    conserva su "Fecha de elaboración" (ver render_ficha).
+    """
+    base = [VERSION_FICHA, list(f), generado_por or "",
+            None if observaciones is None else [list(o) for o in observaciones],
+            None if historial is None else [list(h) for h in historial]]
+    return hashlib.sha256(json.dumps(base, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class CacheFichas:
+    """Fichas PDF direccionadas por contenido: <dir>/<2 chars>/<huella>.pdf"""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+
+    def ruta(self, huella):
+        return os.path.join(self.directorio, huella[:2], f"{huella}.pdf")
+
+    def existe(self, huella):
+        return os.path.exists(self.ruta(huella))
+
+    def leer(self, huella):
+        ruta = self.ruta(huella)
+        try:
+            with open(ruta, "rb") as fh:
+                pdf = fh.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(ruta)  # último uso → poda LRU
+        except OSError:
+            pass
+        return pdf
+
+    def guardar(self, huella, pdf):
+        ruta = self.ruta(huella)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(pdf)
+            os.replace(tmp, ruta)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def obtener(self, huella, render):
+        """PDF en caché o, si no está, `render()` y se guarda."""
+        pdf = self.leer(huella)
+        if pdf is None:
+            pdf = render()
+            self.guardar(huella, pdf)
+        return pdf
+
+    def podar_cada(self, max_bytes, minutos=10):
+        """
+        `podar` a lo más una vez cada `minutos` (entre todos los procesos, por
+        la fecha de un archivo marca): para rutas que guardan fichas sueltas.
+        """
+        marca = os.path.join(self.directorio, ".ultima_poda")
+        try:
+            if time.time() - os.path.getmtime(marca) < minutos * 60:
+                return 0
+        except OSError:
+            pass
+        os.makedirs(self.directorio, exist_ok=True)
+        with open(marca, "a"):
+            os.utime(marca)
+        return self.podar(max_bytes)
+
+    def podar(self, max_bytes):
+        """Borra las fichas usadas hace más tiempo hasta quedar bajo `max_bytes`."""
+        archivos, total = [], 0
+        for raiz, _, nombres in os.walk(self.directorio):
+            for n in nombres:
+                if not n.endswith(".pdf"):
+                    continue
+                path = os.path.join(raiz, n)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                archivos.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        borrados = 0
+        if total > max_bytes:
+            for _, size, path in sorted(archivos):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                borrados += 1
+                total -= size
+                if total <= max_bytes:
+                    break
+        return borrados
@@ -0,0 +1,783 @@
+# importaciones.py
+"""
+Importación masiva de personal desde Excel, por conjuntos y no fila por fila.
+
+Cada lote (DataFrame con encabezados ya normalizados) pasa por:
+  1. normalización vectorizada (pandas .str) al esquema de `Personal`;
+  2. validación previa por fila (obligatorios, longitudes, CCT existente),
+     que reporta el error y saca la fila del lote sin abrir transacción;
+  3. una consulta por lote para resolver los pares (curp, clave) existentes;
+  4. INSERT ... ON CONFLICT (curp, clave_presupuestal) DO UPDATE en bloque,
+     sobre la restricción `uq_curp_clave`. Si el bloque falla, se reintenta
+     fila por fila con savepoints para aislar la culpable.
+
+Un commit por lote (LOTE_IMPORT filas), no por fila.
+
+El catálogo (delegaciones y planteles) sigue el mismo esquema: UPSERT por
+nombre normalizado y por `cct`; el catálogo estatal resuelve la delegación de
+cada fila con un solo mapa nombre -> id.
+"""
+import re
+import unicodedata
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from lector_excel import LectorExcel
+from models import db, Personal, Plantel, Delegacion
+from reportes_excel import nuevo_workbook, HojaStream
+from trabajos import ruta_resultado, entrada_local
+from utils import es_postgres
+
+LOTE_IMPORT = 1000
+
+# --- Encabezados -----------------------------------------------------------------
+ALIAS_ENCABEZADOS = {
+    "fch_baj_jub": "fecha_baja_jubilacion",
+    "fecha_baja_por_jubilacion": "fecha_baja_jubilacion",
+    "grado_max_estudios": "grado_maximo_estudios",
+    "dom_esc_coords_gps": "dom_esc_coordenadas_gps",
+}
+
+# Encabezado normalizado del Excel -> columna de Personal
+MAPA_PERSONAL = {
+    # Identificación
+    "num": "num",
+    "paterno": "apellido_paterno",
+    "materno": "apellido_materno",
+    "nombre": "nombre",
+    "genero": "genero",
+    "rfc": "rfc",
+    "curp": "curp",
+    "clave_presupuestal": "clave_presupuestal",
+    "funcion": "funcion",
+    "grado_maximo_estudios": "grado_estudios",
+    "titulado": "titulado",
+    "fecha_ingreso": "fecha_ingreso",
+    "fecha_baja_jubilacion": "fecha_baja_jubilacion",
+    "status_memb": "estatus_membresia",
+    "nombramiento": "nombramiento",
+
+    # Dirección persona
+    "dp_calle": "domicilio",
+    "dp_num_ext": "numero",
+    "dp_num_int": "dp_num_int",
+    "dp_cruce1": "dp_cruce1",
+    "dp_cruce2": "dp_cruce2",
+    "dp_localidad": "localidad",
+    "dp_colonia": "colonia",
+    "dp_mun_nom": "municipio",
+    "dp_cp": "cp",
+    "dp_tel1": "tel1",
+    "dp_tel2": "tel2",
+    "correo_electronico": "correo_electronico",
+
+    # Escuela / sindical
+    "escuela_nombre": "escuela_nombre",
+    "cct": "cct",
+    "turno": "turno",
+    "nivel": "nivel",
+    "subs_modalidad": "subs_modalidad",
+    "zona_escolar": "zona_escolar",
+    "sector": "sector",
+
+    # Domicilio escuela
+    "dom_esc_calle": "dom_esc_calle",
+    "dom_esc_num_ext": "dom_esc_num_ext",
+    "dom_esc_num_int": "dom_esc_num_int",
+    "dom_esc_cruce1": "dom_esc_cruce1",
+    "dom_esc_cruce2": "dom_esc_cruce2",
+    "dom_esc_localidad": "dom_esc_localidad",
+    "dom_esc_colonia": "dom_esc_colonia",
+    "dom_esc_mun_nom": "dom_esc_mun_nom",
+    "dom_esc_cp": "dom_esc_cp",
+    "dom_esc_coordenadas_gps": "dom_esc_coordenadas_gps",
+
+    # Otros
+    "estado": "estado",
+    "seccion_snte": "seccion_snte",
+    "del_o_ct": "del_o_ct",
+    "org": "org",
+    "coord_reg": "coord_reg",
+    "fun_sin": "fun_sin",
+}
+
+OBLIGATORIAS_PERSONAL = ["paterno", "materno", "nombre", "genero", "rfc", "curp"]
+
+# Columnas "caché" de Personal que reflejan a su Plantel (columna de Personal -> de Plantel)
+CACHE_PLANTEL = {
+    "escuela_nombre": "nombre",
+    "turno": "turno",
+    "nivel": "nivel",
+    "subs_modalidad": "modalidad",
+    "zona_escolar": "zona_escolar",
+    "sector": "sector",
+    "dom_esc_calle": "calle",
+    "dom_esc_num_ext": "num_exterior",
+    "dom_esc_num_int": "num_interior",
+    "dom_esc_cruce1": "cruce_1",
+    "dom_esc_cruce2": "cruce_2",
+    "dom_esc_localidad": "localidad",
+    "dom_esc_colonia": "colonia",
+    "dom_esc_mun_nom": "municipio",
+    "dom_esc_cp": "cp",
+    "dom_esc_coordenadas_gps": "coordenadas_gps",
+    "estado": "estado",
+}
+
+_COLUMNAS = {c.name: c for c in Personal.__table__.columns}
+# NOT NULL sin default: si llegan vacíos el INSERT/UPDATE fallaría
+NO_NULOS = [n for n, c in _COLUMNAS.items()
+            if not c.nullable and not c.primary_key and c.default is None and c.server_default is None]
+LARGOS = {n: c.type.length for n, c in _COLUMNAS.items() if getattr(c.type, "length", None)}
+
+FECHAS = ("fecha_ingreso", "fecha_baja_jubilacion")
+_RECORTAR = ("cp", "numero", "tel1", "tel2", "cct", "clave_presupuestal")
+_GENERO = {"H": "H", "MASCULINO": "H", "HOMBRE": "H",
+           "M": "M", "F": "M", "FEMENINO": "M", "MUJER": "M"}
+CLAVE = ("curp", "clave_presupuestal")
+
+
+def norm_encabezado(h):
+    """'Fecha Ingreso ' -> 'fecha_ingreso' (sin acentos ni símbolos)."""
+    h = "" if h is None else str(h).strip()
+    h = "".join(c for c in unicodedata.normalize("NFD", h) if unicodedata.category(c) != "Mn")
+    return re.sub(r"[^A-Za-z0-9]+", "_", h).strip("_").lower()
+
+
+def normalizar_encabezados(columnas):
+    return [ALIAS_ENCABEZADOS.get(n, n) for n in (norm_encabezado(c) for c in columnas)]
+
+
+# --- Normalización vectorizada -------------------------------------------------
+def normalizar_personal(df, cct=None):
+    """
+    DataFrame (encabezados normalizados, celdas str/NaN) -> DataFrame con
+    columnas de Personal. `cct` fuerza la adscripción de todas las filas.
+    """
+    out = pd.DataFrame(index=df.index)
+    for src, campo in MAPA_PERSONAL.items():
+        if src in df.columns:
+            out[campo] = df[src].astype(object).where(df[src].notna(), None)
+
+    for k in FECHAS:
+        if k in out.columns:
+            out[k] = pd.to_datetime(out[k], errors="coerce").dt.date
+
+    def texto(col):
+        return out[col].astype("string")
+
+    if "genero" in out.columns:
+        out["genero"] = texto("genero").str.strip().str.upper().map(_GENERO)
+    for k in _RECORTAR:
+        if k in out.columns:
+            out[k] = texto(k).str.strip()
+    if "num" in out.columns:
+        s = texto("num").str.strip()
+        out["num"] = pd.to_numeric(s.where(s.str.fullmatch(r"\d+", na=False)), errors="coerce").astype("Int64")
+    for k in ("rfc", "curp", "cct"):
+        if k in out.columns:
+            out[k] = texto(k).str.strip().str.upper()
+
+    out["curp"] = out["curp"].fillna("") if "curp" in out.columns else ""
+    clave = texto("clave_presupuestal") if "clave_presupuestal" in out.columns else pd.Series("", index=out.index, dtype="string")
+    out["clave_presupuestal"] = clave.fillna("").str.strip().str.upper()
+    if cct is not None:
+        out["cct"] = cct
+    return out
+
+
+def _registros(df):
+    """DataFrame -> lista de dicts con None en lugar de NaN/NaT/<NA>."""
+    obj = df.astype(object)
+    return obj.where(df.notna(), None).to_dict("records")
+
+
+# --- Formatos (dry run) ---------------------------------------------------------
+RE_CURP = r"[A-Z]{4}\d{6}[HMX][A-Z]{5}[A-Z\d]\d"
+RE_RFC = r"[A-ZÑ&]{3,4}\d{6}(?:[A-Z\d]{3})?"
+RE_CCT = r"\d{2}[A-Z]{3}\d{4}[A-Z]"
+
+
+def _marcar(problemas, mascara, texto):
+    """Agrega `texto` (str o callable(fila)) a las filas marcadas: {fila: [textos]}."""
+    for i in mascara.index[mascara.fillna(False).astype(bool)]:
+        problemas.setdefault(i, []).append(texto(i) if callable(texto) else texto)
+
+
+# --- Motor -----------------------------------------------------------------------
+ERRORES_EN_RESUMEN = 100
+
+
+def _upsert(modelo, claves, columnas, **extra):
+    """INSERT ... ON CONFLICT (claves) DO UPDATE de `columnas` (más `extra`), según el dialecto."""
+    stmt = (postgresql.insert if es_postgres() else sqlite.insert)(modelo)
+    actualizar = {c: stmt.excluded[c] for c in columnas if c not in claves}
+    actualizar.update(extra)
+    return stmt.on_conflict_do_update(index_elements=list(claves), set_=actualizar)
+
+
+class _Importador:
+    """Contadores comunes: ok/bad por fila, insertados/actualizados y las fallas (fila, texto)."""
+
+    def __init__(self):
+        self.ok = self.bad = 0
+        self.insertados = self.actualizados = 0
+        self.fallas = []
+
+    def _error(self, fila, texto):
+        self.bad += 1
+        self.fallas.append((fila, texto))
+
+    def _escribir(self, registros, filas, stmt):
+        """Bloque completo en un savepoint; si falla, fila por fila para aislar errores."""
+        try:
+            with db.session.begin_nested():
+                db.session.execute(stmt, registros)
+            return [True] * len(registros)
+        except Exception:
+            pass
+        resultado = []
+        for reg, fila in zip(registros, filas):
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(stmt, [reg])
+                resultado.append(True)
+            except Exception as e:
+                self._error(fila, str(getattr(e, "orig", e)).splitlines()[0])
+                resultado.append(False)
+        return resultado
+
+    @property
+    def errores(self):
+        return [f"Fila {fila}: {texto}" for fila, texto in self.fallas]
+
+    def resumen(self):
+        """Contadores para el avance del trabajo (`detalle`) y el resumen final."""
+        return {
+            "procesadas": self.ok + self.bad,
+            "insertados": self.insertados,
+            "actualizados": self.actualizados,
+            "fallidas": self.bad,
+            "errores": [f"Fila {f}: {t}" for f, t in self.fallas[:ERRORES_EN_RESUMEN]],
+        }
+
+
+class ImportadorPersonal(_Importador):
+    """
+    Acumula el resultado de varios lotes:
+        imp = ImportadorPersonal(cct="13DPR0001X")
+        for lote in lector.lotes(): imp.procesar(lote)     # o imp.revisar(lote): dry run
+        imp.ok, imp.insertados, imp.actualizados, imp.bad, imp.errores
+    Alcance: con `cct` todas las filas van a ese CCT; sin él, el CCT sale de
+    cada fila y, con `delegacion_id`, debe ser de esa delegación, igual que
+    la plaza (curp, clave) si ya existe (estatal si no se da ninguno). Las columnas de CACHE_PLANTEL se llenan del plantel.
+    El índice de cada lote es el número de fila de Excel (ver lector_excel).
+    """
+
+    def __init__(self, cct=None, delegacion_id=None, lote=LOTE_IMPORT):
+        super().__init__()
+        self.cct = cct
+        self.delegacion_id = delegacion_id
+        self.lote = lote
+        self._planteles = {}  # cct -> (delegacion_id, *valores de CACHE_PLANTEL)
+        self._vistos = {}     # (curp, clave) -> primera fila; sólo en dry run
+
+    # ---- validación previa ----
+    def _problemas(self, df):
+        """Errores que harían fallar la fila: {fila: [textos]} (índice = fila de Excel)."""
+        errores = {}
+        _marcar(errores, df["curp"] == "", "CURP vacío.")
+        for campo in NO_NULOS:
+            if campo in df.columns and campo != "curp":
+                _marcar(errores, df[campo].isna(), f"{campo} vacío u inválido.")
+        for campo, n in LARGOS.items():
+            if campo in df.columns:
+                _marcar(errores, df[campo].astype("string").str.len() > n, f"{campo} excede {n} caracteres.")
+
+        if "cct" in df.columns:
+            cct = df["cct"]
+            self._cargar_planteles(set(cct.dropna()))
+            _marcar(errores, cct.notna() & ~cct.isin(list(self._planteles)),
+                    lambda i: f"CCT {cct[i]} no existe en plantel.")
+            if self.delegacion_id is not None:
+                ajenos = [c for c, (d, *_) in self._planteles.items() if d != self.delegacion_id]
+                _marcar(errores, cct.isin(ajenos), lambda i: f"CCT {cct[i]} no pertenece a la delegación.")
+        return errores
+
+    # ---- planteles ----
+    def _cargar_planteles(self, ccts):
+        """Una consulta por lote, sólo por los CCTs que no se han visto en el archivo."""
+        nuevos = ccts - set(self._planteles)
+        if not nuevos:
+            return
+        columnas = [getattr(Plantel, c) for c in CACHE_PLANTEL.values()]
+        for cct, delegacion_id, *valores in (db.session.query(Plantel.cct, Plantel.delegacion_id, *columnas)
+                                             .filter(Plantel.cct.in_(nuevos))):
+            self._planteles[cct] = (delegacion_id, *valores)
+
+    def _cache_plantel(self, df):
+        """Copia al lote (ya validado) los datos de su plantel: nombre, turno, domicilio..."""
+        valores = pd.DataFrame([self._planteles[c][1:] for c in df["cct"]],
+                               index=df.index, columns=list(CACHE_PLANTEL), dtype=object)
+        df[list(CACHE_PLANTEL)] = valores
+
+    def _avisos(self, crudo, df):
+        """Datos sospechosos que sí se importan: formato CURP/RFC, fechas y números ilegibles."""
+        avisos = {}
+        curp = df["curp"]
+        _marcar(avisos, (curp != "") & ~curp.str.fullmatch(RE_CURP), "CURP con formato inválido.")
+        if "rfc" in df.columns:
+            _marcar(avisos, df["rfc"].notna() & ~df["rfc"].str.fullmatch(RE_RFC).fillna(False),
+                    "RFC con formato inválido.")
+        for src, campo in (("fecha_ingreso", "fecha_ingreso"), ("fecha_baja_jubilacion", "fecha_baja_jubilacion"),
+                           ("num", "num")):
+            if src in crudo.columns:
+                _marcar(avisos, crudo[src].notna() & df[campo].isna(),
+                        lambda i, src=src: f"{src.upper()} ilegible ({crudo.at[i, src]}); se deja vacío.")
+        return avisos
+
+    # ---- pares existentes ----
+    def _resolver_claves(self, df):
+        """
+        Una consulta: pares (curp, clave) ya existentes para las CURP del lote,
+        con su CCT y la delegación de ese CCT. Sin clave en el Excel se toma la plaza existente de esa CURP
+        (la de menor id), como hacía el filtro por CURP sola.
+
+        Clave NULL y '' son la misma: el importador escribe '', pero ON
+        CONFLICT nunca empata con (curp, NULL). Devuelve también `nulos`
+        {curp: id} de la plaza con clave NULL que ocupa el lugar de (curp, '')
+        (si no hay ya una con ''); `_procesar_lote` la pasa a '' antes del upsert.
+        """
+        existentes = (db.session.query(Personal.id, Personal.curp, Personal.clave_presupuestal,
+                                       Personal.cct, Plantel.delegacion_id)
+                      .outerjoin(Plantel, Personal.cct == Plantel.cct)
+                      .filter(Personal.curp.in_(set(df["curp"])))
+                      .order_by(Personal.id)
+                      .all())
+        pares, nulos, primera = {}, {}, {}
+        for pid, curp, clave, cct, delegacion_id in existentes:
+            primera.setdefault(curp, clave or "")
+            if clave is not None:
+                pares[(curp, clave)] = (cct, delegacion_id)
+        for pid, curp, clave, cct, delegacion_id in existentes:
+            if clave is None and (curp, "") not in pares:
+                pares[(curp, "")] = (cct, delegacion_id)
+                nulos[curp] = pid
+        sin_clave = df["clave_presupuestal"] == ""
+        if sin_clave.any():
+            df.loc[sin_clave, "clave_presupuestal"] = df.loc[sin_clave, "curp"].map(primera).fillna("")
+        return pares, nulos
+
+    def _preparar(self, crudo):
+        """Normaliza y separa las filas con error; resuelve claves de las válidas."""
+        df = normalizar_personal(crudo, cct=self.cct)
+        errores = self._problemas(df)
+        df = df.drop(index=list(errores)).copy()
+        if df.empty:
+            return df, errores, {}, {}
+        if "cct" in df.columns:
+            self._cache_plantel(df)
+        pares, nulos = self._resolver_claves(df)
+        if self.delegacion_id is not None:
+            # El alcance vale también para la plaza que ya existe: no se jala una de otra delegación
+            previas = [pares.get(p) for p in zip(df["curp"], df["clave_presupuestal"])]
+            ajenas = pd.Series([p is not None and p[1] != self.delegacion_id for p in previas], index=df.index)
+            if ajenas.any():
+                plazas = dict(zip(df.index, previas))
+                _marcar(errores, ajenas,
+                        lambda i: f"La plaza (CURP+clave) está en el CCT {plazas[i][0]}, de otra delegación.")
+                df = df[~ajenas]
+        return df, errores, pares, nulos
+
+    # ---- dry run ----
+    def revisar(self, crudo):
+        """
+        Valida un lote sin escribir nada. Devuelve (errores, avisos), ambos
+        {fila: [textos]}, y acumula en los contadores lo que haría `procesar`.
+        """
+        df, errores, pares, _ = self._preparar(crudo)
+        avisos = self._avisos(crudo, df) if not df.empty else {}
+        for fila, textos in sorted(errores.items()):
+            self._error(fila, " ".join(textos))
+
+        ccts = df["cct"] if "cct" in df.columns else [None] * len(df)
+        for fila, curp, clave, cct in zip(df.index, df["curp"], df["clave_presupuestal"], ccts):
+            par = (curp, clave)
+            previa = self._vistos.setdefault(par, fila)
+            if previa != fila:
+                avisos.setdefault(fila, []).append(f"CURP+clave repetida (fila {previa}); queda la última.")
+            elif par in pares:
+                self.actualizados += 1
+                if cct and pares[par][0] != cct:
+                    avisos.setdefault(fila, []).append(f"La plaza ya existe en el CCT {pares[par][0]}; pasará a {cct}.")
+            else:
+                self.insertados += 1
+        self.ok += len(df)
+        return errores, avisos
+
+    # ---- escritura ----
+    def _upsert(self, columnas):
+        return _upsert(Personal, CLAVE, columnas, version=Personal.version + 1, updated_at=datetime.utcnow())
+
+    def procesar(self, df):
+        """Normaliza, valida y escribe un DataFrame (en tramos de `lote` filas)."""
+        for ini in range(0, len(df), self.lote):
+            self._procesar_lote(df.iloc[ini:ini + self.lote])
+
+    def _procesar_lote(self, crudo):
+        df, errores, pares, nulos = self._preparar(crudo)
+        for fila, textos in sorted(errores.items()):
+            self._error(fila, " ".join(textos))
+        if df.empty:
+            return
+
+        # Repetidos (curp, clave) dentro del lote: gana el último, como al ir fila por fila
+        ultimo = ~df.duplicated(subset=list(CLAVE), keep="last")
+        repetidos = int((~ultimo).sum())
+        df = df[ultimo]
+
+        # Plazas con clave NULL que el lote va a tocar: NULL -> '' para que el upsert las empate
+        ids = [nulos[c] for c in df.loc[df["clave_presupuestal"] == "", "curp"] if c in nulos]
+        if ids:
+            db.session.execute(update(Personal).where(Personal.id.in_(ids))
+                               .values(clave_presupuestal="").execution_options(synchronize_session=False))
+
+        existe = pd.Series([p in pares for p in zip(df["curp"], df["clave_presupuestal"])], index=df.index)
+        registros = _registros(df)
+        escritos = self._escribir(registros, list(df.index), self._upsert(df.columns))
+        db.session.commit()
+
+        escritos = pd.Series(escritos, index=df.index)
+        self.ok += int(escritos.sum()) + repetidos
+        self.actualizados += int((escritos & existe).sum())
+        self.insertados += int((escritos & ~existe).sum())
+
+
+# --- Catálogo: CCTs -------------------------------------------------------------
+OBLIGATORIAS_CCT = ["cct", "nombre", "turno", "nivel", "modalidad"]
+LARGOS_CCT = {c.name: c.type.length for c in Plantel.__table__.columns
+              if getattr(c.type, "length", None) and c.name != "estado"}
+LARGOS_DELEGACION = {c.name: c.type.length for c in Delegacion.__table__.columns if getattr(c.type, "length", None)}
+
+# Catálogo estatal: columnas de la delegación junto a las del plantel
+ALIAS_CATALOGO = {
+    "nombre_delegacion": "delegacion",
+    "nivel_de_la_delegacion": "nivel_delegacion",
+}
+
+
+def normalizar_encabezados_catalogo(columnas):
+    return [ALIAS_CATALOGO.get(n, n) for n in (norm_encabezado(c) for c in columnas)]
+
+
+def normalizar_nombre_delegacion(s):
+    """Nombre de delegación: trim, MAYÚSCULAS, guiones Unicode → '-', colapsa espacios."""
+    s = (s or "").strip().upper()
+    s = s.translate(str.maketrans({"–": "-", "—": "-"}))
+    return re.sub(r"\s+", " ", s)
+
+
+def _texto(lote, columna):
+    """Columna del lote como texto recortado ('' si falta la columna o la celda)."""
+    s = lote[columna] if columna in lote.columns else pd.Series(None, index=lote.index, dtype=object)
+    return s.astype("string").str.strip().fillna("")
+
+
+class ImportadorCCTs(_Importador):
+    """
+    Catálogo de planteles: INSERT ... ON CONFLICT (cct) DO UPDATE por lote.
+      - ImportadorCCTs(delegacion_id): subir_excel_ccts; todas las filas van a
+        esa delegación y un CCT registrado en otra se reporta y se salta.
+      - ImportadorCCTs(): catálogo estatal; la delegación de cada fila sale de
+        la columna `delegacion` (nombre normalizado, un solo mapa nombre -> id).
+        Las que no existen se dan de alta si la fila trae `nivel_delegacion`,
+        y un CCT que estaba en otra delegación se mueve.
+    Al actualizar sólo se tocan las columnas que trae el archivo; si un CCT se
+    repite, gana la última fila. `revisar` es el dry run con las mismas reglas.
+    """
+
+    def __init__(self, delegacion_id=None):
+        super().__init__()
+        self.delegacion_id = delegacion_id
+        self.delegaciones_nuevas = 0
+        self._delegaciones = None  # nombre normalizado -> id (modo estatal)
+        self._por_crear = set()    # dry run: delegaciones que se darían de alta
+        self._vistos = {}          # cct -> primera fila (dry run)
+
+    @property
+    def estatal(self):
+        return self.delegacion_id is None
+
+    def _mapa_delegaciones(self):
+        if self._delegaciones is None:
+            self._delegaciones = {normalizar_nombre_delegacion(n): i
+                                  for i, n in db.session.query(Delegacion.id, Delegacion.nombre)}
+        return self._delegaciones
+
+    def _preparar(self, lote):
+        """
+        Normaliza y valida el lote. Devuelve (txt, errores, avisos, existentes):
+        txt con cct en mayúsculas (y `_delegacion`/`_nivel` en modo estatal),
+        {fila: [textos]} y {cct: (delegacion_id, nombre)} de los ya registrados.
+        """
+        errores, avisos = {}, {}
+        txt = pd.DataFrame({c: (lote[c] if c in lote.columns else None) for c in LARGOS_CCT}, index=lote.index)
+        txt = txt.astype("string").apply(lambda s: s.str.strip())
+
+        faltan = pd.Series(False, index=lote.index)
+        for c in OBLIGATORIAS_CCT:
+            faltan |= txt[c].isna() | (txt[c] == "")
+        _marcar(errores, faltan, lambda i: "Faltan datos obligatorios ("
+                + ", ".join(c for c in OBLIGATORIAS_CCT if pd.isna(txt.at[i, c]) or txt.at[i, c] == "")
+                + "); la fila se ignora.")
+        for c, n in LARGOS_CCT.items():
+            _marcar(errores, txt[c].str.len() > n, f"{c} excede {n} caracteres.")
+
+        cct = txt["cct"].str.upper()
+        txt["cct"] = cct
+        _marcar(avisos, cct.notna() & (cct != "") & ~cct.str.fullmatch(RE_CCT).fillna(False),
+                "CCT con formato inválido (esperado p. ej. 13DPR0001X).")
+
+        if self.estatal:
+            nombres = _texto(lote, "delegacion").map(normalizar_nombre_delegacion)
+            niveles = _texto(lote, "nivel_delegacion").str.upper()
+            # Conocida: ya existe, o la da de alta otra fila (de éste o de un lote anterior)
+            conocida = nombres.isin([*self._mapa_delegaciones(), *self._por_crear, *nombres[niveles != ""]])
+            _marcar(errores, nombres == "", "Falta la delegación.")
+            _marcar(errores, (nombres != "") & ~conocida & (niveles == ""),
+                    lambda i: f"La delegación {nombres[i]} no existe (indica nivel_delegacion para darla de alta).")
+            _marcar(errores, nombres.str.len() > LARGOS_DELEGACION["nombre"],
+                    f"delegacion excede {LARGOS_DELEGACION['nombre']} caracteres.")
+            _marcar(errores, niveles.str.len() > LARGOS_DELEGACION["nivel"],
+                    f"nivel_delegacion excede {LARGOS_DELEGACION['nivel']} caracteres.")
+            txt["_delegacion"], txt["_nivel"] = nombres, niveles
+
+        con_cct = cct.notna() & (cct != "")
+        existentes = {
+            c: (d, n) for c, d, n in
+            db.session.query(Plantel.cct, Plantel.delegacion_id, Delegacion.nombre)
+            .join(Delegacion, Plantel.delegacion_id == Delegacion.id)
+            .filter(Plantel.cct.in_(set(cct[con_cct])))
+        } if con_cct.any() else {}
+        if not self.estatal:
+            ajenos = [c for c, (d, _) in existentes.items() if d != self.delegacion_id]
+            _marcar(errores, cct.isin(ajenos),
+                    lambda i: f"El CCT ya está registrado en otra delegación ({existentes[cct[i]][1]}).")
+        return txt, errores, avisos, existentes
+
+    def revisar(self, lote):
+        txt, errores, avisos, existentes = self._preparar(lote)
+        validas = txt.drop(index=list(errores))
+        for fila, cct in validas["cct"].items():
+            previa = self._vistos.setdefault(cct, fila)
+            if previa != fila:
+                avisos.setdefault(fila, []).append(f"CCT repetido en el archivo (fila {previa}); queda la última.")
+            elif cct in existentes:
+                self.actualizados += 1
+            else:
+                self.insertados += 1
+            if not self.estatal:
+                continue
+            destino, nivel = validas.at[fila, "_delegacion"], validas.at[fila, "_nivel"]
+            if nivel and destino not in self._mapa_delegaciones() and destino not in self._por_crear:
+                self._por_crear.add(destino)
+                self.delegaciones_nuevas += 1
+                avisos.setdefault(fila, []).append(
+                    f"Se dará de alta la delegación {destino} ({nivel}).")
+            if cct in existentes and normalizar_nombre_delegacion(existentes[cct][1]) != destino:
+                avisos.setdefault(fila, []).append(
+                    f"El CCT está en la delegación {existentes[cct][1]}; pasará a {destino}.")
+        self.bad += len(errores)
+        self.ok += len(lote) - len(errores)
+        return errores, avisos
+
+    def _alta_delegaciones(self, validas):
+        """Modo estatal: inserta de una vez las delegaciones del lote que aún no existen."""
+        mapa = self._mapa_delegaciones()
+        nuevas = validas[~validas["_delegacion"].isin(list(mapa)) & (validas["_delegacion"] != "")
+                         & (validas["_nivel"] != "")].drop_duplicates("_delegacion", keep="last")
+        if nuevas.empty:
+            return
+        registros = [{"nombre": n, "nivel": v} for n, v in zip(nuevas["_delegacion"], nuevas["_nivel"])]
+        stmt = (postgresql.insert if es_postgres() else sqlite.insert)(Delegacion)
+        db.session.execute(stmt.on_conflict_do_nothing(index_elements=["nombre"]), registros)
+        ids = dict(db.session.query(Delegacion.nombre, Delegacion.id)
+                   .filter(Delegacion.nombre.in_([r["nombre"] for r in registros])))
+        self.delegaciones_nuevas += len(ids)
+        mapa.update(ids)
+
+    def procesar(self, lote):
+        txt, errores, _, existentes = self._preparar(lote)
+        for fila, textos in sorted(errores.items()):
+            self._error(fila, " ".join(textos))
+        validas = txt.drop(index=list(errores))
+        if validas.empty:
+            return
+
+        if self.estatal:
+            self._alta_delegaciones(validas)
+            destino = validas["_delegacion"].map(self._delegaciones)
+            # La fila que traía el nivel de una delegación nueva pudo venir con error
+            for fila in destino.index[destino.isna()]:
+                self._error(fila, f"La delegación {validas.at[fila, '_delegacion']} no existe.")
+            validas = validas[destino.notna()].assign(delegacion_id=destino.dropna().astype(int))
+        else:
+            validas = validas.assign(delegacion_id=self.delegacion_id)
+        if validas.empty:
+            db.session.commit()
+            return
+
+        # Repetidos en el lote: gana la última fila (ON CONFLICT no admite dos veces la misma clave)
+        ultimo = ~validas.duplicated(subset="cct", keep="last")
+        repetidos = int((~ultimo).sum())
+        validas = validas[ultimo]
+
+        columnas = [c for c in LARGOS_CCT if c in lote.columns]
+        registros = validas[list(LARGOS_CCT)].fillna("").astype(object)
+        registros["estado"] = "HIDALGO"
+        registros["delegacion_id"] = validas["delegacion_id"].astype(object)
+        existe = validas["cct"].isin(list(existentes))
+
+        escritos = self._escribir(registros.to_dict("records"), list(registros.index),
+                                  _upsert(Plantel, ("cct",), [*columnas, "delegacion_id"]))
+        db.session.commit()
+
+        escritos = pd.Series(escritos, index=validas.index)
+        self.ok += int(escritos.sum()) + repetidos
+        self.actualizados += int((escritos & existe).sum())
+        self.insertados += int((escritos & ~existe).sum())
+
+
+# --- Catálogo: delegaciones ------------------------------------------------------
+class ImportadorDelegaciones(_Importador):
+    """
+    subir_excel_delegaciones: UPSERT por nombre normalizado (ON CONFLICT
+    (nombre) DO UPDATE del nivel y, si viene la columna, del delegado). Sin
+    nombre o nivel la fila se salta; repetidas en el archivo gana la última.
+    """
+
+    def procesar(self, lote):
+        nombres = _texto(lote, "nombre").map(normalizar_nombre_delegacion)
+        niveles = _texto(lote, "nivel").str.upper()
+        delegados = _texto(lote, "delegado") if "delegado" in lote.columns else None
+
+        validas, repetidos = {}, 0
+        for fila, nombre, nivel in zip(lote.index, nombres, niveles):
+            if not (nombre and nivel):
+                self._error(fila, "Faltan nombre o nivel; la fila se ignora.")
+                continue
+            reg = {"nombre": nombre, "nivel": nivel}
+            if delegados is not None:
+                reg["delegado"] = delegados[fila] or None
+            largos = [c for c, n in LARGOS_DELEGACION.items() if len(reg.get(c) or "") > n]
+            if largos:
+                self._error(fila, " ".join(f"{c} excede {LARGOS_DELEGACION[c]} caracteres." for c in largos))
+                continue
+            if validas.pop(nombre, None) is not None:
+                repetidos += 1
+            validas[nombre] = (fila, reg)  # gana la última
+        if not validas:
+            return
+
+        existentes = {n for (n,) in db.session.query(Delegacion.nombre).filter(Delegacion.nombre.in_(list(validas)))}
+        filas = [f for f, _ in validas.values()]
+        registros = [r for _, r in validas.values()]
+        escritos = self._escribir(registros, filas, _upsert(Delegacion, ("nombre",), registros[0].keys()))
+        db.session.commit()
+
+        for ok, nombre in zip(escritos, validas):
+            if ok:
+                self.ok += 1
+                if nombre in existentes:
+                    self.actualizados += 1
+                else:
+                    self.insertados += 1
+        self.ok += repetidos
+
+
+def correr_importacion(lector, importador, progreso=None):
+    """
+    Pasa cada lote del lector al importador y, si hay `progreso`
+    (trabajos.Progreso), publica filas leídas y contadores por lote.
+    """
+    if progreso is not None and lector.filas_estimadas:
+        progreso.fijar_total(lector.filas_estimadas)
+    for lote in lector.lotes():
+        importador.procesar(lote)
+        if progreso is not None:
+            progreso.avanzar(len(lote), detalle=importador.resumen())
+    return importador.resumen()
+
+
+def importar_en_trabajo(trabajo, progreso, importador, nombre_errores, columnas=None):
+    """
+    Cuerpo común de los trabajos de importación: lee el Excel que la ruta
+    encoló con el trabajo (viene de la BD), publica el avance y, si hubo
+    filas rechazadas, deja el Excel de errores como resultado del trabajo
+    (devuelve su ruta o None).
+    """
+    with entrada_local(trabajo) as ruta, LectorExcel(ruta, columnas=columnas) as lector:
+        correr_importacion(lector, importador, progreso)
+    if not importador.fallas:
+        return None
+    destino = ruta_resultado(trabajo, nombre_errores)
+    libro_errores(importador, f"Errores de importación (trabajo #{trabajo.id})").save(destino)
+    return destino
+
+
+def libro_errores(importador, titulo):
+    """Workbook con todas las filas rechazadas (el resumen del trabajo sólo lleva las primeras)."""
+    wb = nuevo_workbook()
+    ws = HojaStream(wb, "Errores", freeze="A3")
+    ws.titulo(titulo, combinar=2)
+    ws.encabezado(["Fila", "Error"])
+    for fila, texto in importador.fallas:
+        ws.celdas([(fila, "celda"), (texto, "error")])
+    ws.cerrar()
+    return wb
+
+
+# --- Libro de validación -------------------------------------------------------
+def libro_validacion(lector, revisar, titulo, notas=()):
+    """
+    Dry run completo: recorre el archivo lote por lote con
+    `revisar(lote) -> (errores, avisos)` y arma el workbook anotado:
+      - "Resumen": totales (y `notas`, lista de (etiqueta, valor) o callable
+        que la devuelve, evaluado al final);
+      - "Observaciones": sólo las filas con problemas, con sus valores
+        originales y las columnas Errores / Avisos.
+    """
+    wb = nuevo_workbook()
+    resumen = HojaStream(wb, "Resumen", muestra=None)
+    obs = HojaStream(wb, "Observaciones", freeze="B2")
+    obs.encabezado(["Fila", *lector.encabezados, "Errores", "Avisos"])
+
+    con_error = con_aviso = 0
+    for lote in lector.lotes():
+        errores, avisos = revisar(lote)
+        marcadas = sorted(set(errores) | set(avisos))
+        con_error += len(errores)
+        con_aviso += len(avisos)
+        for fila, *valores in lote.loc[marcadas].itertuples(name=None):
+            err, av = " ".join(errores.get(fila, ())), " ".join(avisos.get(fila, ()))
+            obs.celdas([(fila, "celda"), *((v, "celda") for v in valores),
+                        (err or None, "error" if err else "celda"), (av or None, "aviso" if av else "celda")])
+    obs.cerrar()
+
+    resumen.titulo(titulo, combinar=2)
+    resumen.titulo(f"Validación sin guardar cambios — {datetime.now():%d/%m/%Y %H:%M}", estilo="subtitulo", combinar=2)
+    resumen.vacia()
+    filas = [
+        ("Filas leídas", lector.filas_leidas),
+        ("Filas que se importarían", lector.filas_leidas - con_error),
+        ("Filas con error (no se importarían)", con_error),
+        ("Filas con aviso", con_aviso),
+        *(notas() if callable(notas) else notas),
+    ]
+    for etiqueta, valor in filas:
+        resumen.celdas([(etiqueta, "etiqueta"), (valor, "celda")])
+    resumen.cerrar()
+    return wb
@@ -0,0 +1,145 @@
+# lector_excel.py
+"""
+Lector compartido de cargas Excel (openpyxl read_only), contraparte de
+reportes_excel.
+
+- El archivo subido se copia a un temporal (en memoria hasta LIMITE_MEMORIA,
+  luego a disco) y se abre con read_only=True: openpyxl resuelve libro,
+  estilos y cadenas compartidas sin construir el modelo de celdas.
+- Las filas se leen con iter_rows(values_only=True) (API pública: nada de
+  internos de openpyxl) y se entregan en lotes (DataFrame de `lote` filas),
+  así la memoria depende del lote y no del archivo.
+- Las celdas llegan como texto o None, igual que pd.read_excel(dtype=str).
+- El índice de cada lote es el número de fila de Excel (para los mensajes
+  "Fila N: ...").
+"""
+import os
+import tempfile
+from datetime import date, datetime, time
+
+import pandas as pd
+from openpyxl import load_workbook
+
+LOTE_LECTURA = 1000
+LIMITE_MEMORIA = 8 * 1024 * 1024
+
+
+def texto_celda(v):
+    """Valor de openpyxl -> str | None (12.0 -> '12', fechas ISO)."""
+    if v is None:
+        return None
+    if isinstance(v, str):
+        return v if v.strip() else None
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    if isinstance(v, datetime):
+        return v.date().isoformat() if v.time() == time(0) else v.isoformat(sep=" ")
+    if isinstance(v, (date, time)):
+        return v.isoformat()
+    return str(v)
+
+
+def _filas(ws):
+    """
+    (número de fila de Excel, valores). En read_only iter_rows empieza SIEMPRE
+    en la fila 1 y rellena las vacías, aunque <dimension> empiece más abajo.
+    """
+    return enumerate(ws.iter_rows(values_only=True), start=1)
+
+
+def _sin_repetidos(nombres):
+    """Encabezados repetidos -> 'x', 'x.1', 'x.2' (como pandas)."""
+    vistos, out = {}, []
+    for n in nombres:
+        if n in vistos:
+            vistos[n] += 1
+            n = f"{n}.{vistos[n]}"
+        else:
+            vistos[n] = 0
+        out.append(n)
+    return out
+
+
+class LectorExcel:
+    """
+    Uso:
+        with LectorExcel(request.files["archivo_excel"]) as lector:   # o una ruta en disco
+            lector.encabezados            # originales, como vienen en la fila 1
+            for lote in lector.lotes():   # DataFrame, columnas = lector.columnas
+                ...
+    `columnas` es un callable opcional que recibe los encabezados y devuelve
+    los nombres a usar (p. ej. importaciones.normalizar_encabezados).
+    """
+
+    def __init__(self, archivo, columnas=None, lote=LOTE_LECTURA):
+        self.lote = lote
+        self._tmp = None
+        try:
+            if isinstance(archivo, (str, os.PathLike)):   # ya está en disco (trabajos)
+                fuente = archivo
+            else:
+                fuente = self._tmp = tempfile.SpooledTemporaryFile(max_size=LIMITE_MEMORIA)
+                if hasattr(archivo, "save"):   # FileStorage de Werkzeug
+                    archivo.save(self._tmp)
+                else:
+                    self._copiar(archivo)
+                self._tmp.seek(0)
+            self._wb = load_workbook(fuente, read_only=True, data_only=True)
+        except Exception:
+            if self._tmp is not None:
+                self._tmp.close()
+            raise
+        ws = self._wb.worksheets[0]
+        # Estimado (de la <dimension> de la hoja): sirve de total para la barra de avance
+        self.filas_estimadas = max(ws.max_row - 1, 0) if ws.max_row else None
+        self._filas = _filas(ws)
+
+        _, cabecera = next(self._filas, (1, ()))
+        self.encabezados = _sin_repetidos(["" if h is None else str(h).strip() for h in cabecera])
+        self.columnas = _sin_repetidos(columnas(self.encabezados) if columnas else self.encabezados)
+        self.filas_leidas = 0
+
+    def _copiar(self, archivo):
+        while True:
+            bloque = archivo.read(64 * 1024)
+            if not bloque:
+                break
+            self._tmp.write(bloque)
+
+    def lotes(self):
+        """Lotes de hasta `lote` filas; se saltan las filas totalmente vacías."""
+        n = len(self.columnas)
+        datos, indices = [], []
+        for num, fila in self._filas:
+            valores = [texto_celda(v) for v in fila[:n]]
+            if not any(v is not None for v in valores):
+                continue
+            valores += [None] * (n - len(valores))
+            datos.append(valores)
+            indices.append(num)
+            if len(datos) >= self.lote:
+                yield self._frame(datos, indices)
+                datos, indices = [], []
+        if datos:
+            yield self._frame(datos, indices)
+
+    def _frame(self, datos, indices):
+        self.filas_leidas += len(datos)
+        return pd.DataFrame(datos, columns=self.columnas, index=pd.Index(indices, name="fila"), dtype=object)
+
+    def cerrar(self):
+        try:
+            if hasattr(self._filas, "close"):
+                self._filas.close()
+            self._wb.close()
+        finally:
+            if self._tmp is not None:
+                self._tmp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
@@ -0,0 +1,24 @@
+# migrar_personal_version.py
+# Agrega personal.updated_at (indexada) y personal.version para el bloqueo optimista.
+from app import create_app
+from models import db, Personal
+from sqlalchemy import text
+
+app = create_app()
+
+with app.app_context():
+    eng = db.engines[getattr(Personal, "__bind_key__", None)]
+    tabla = Personal.__tablename__
+
+    # 1) DDL: columnas e índice si no existen
+    print(">> Asegurando columnas updated_at / version en", tabla)
+    with eng.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP'))
+        conn.execute(text(f'ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1'))
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{tabla}_updated_at ON {tabla} (updated_at)'))
+
+    # 2) Backfill: filas sin fecha toman la hora de la migración
+    print(">> Backfill updated_at…")
+    with eng.begin() as conn:
+        res = conn.execute(text(f"UPDATE {tabla} SET updated_at = NOW() AT TIME ZONE 'UTC' WHERE updated_at IS NULL"))
+    print(f"Listo. Filas con updated_at inicial: {res.rowcount}.")
@@ -0,0 +1,16 @@
+# migrar_trabajos_detalle.py
+# Agrega trabajos.detalle (JSON con contadores de avance, p. ej. de las importaciones).
+from app import create_app
+from models import db, Trabajo
+from sqlalchemy import text
+
+app = create_app()
+
+with app.app_context():
+    eng = db.engines[getattr(Trabajo, "__bind_key__", None)]
+    tabla = Trabajo.__tablename__
+
+    print(">> Asegurando columna detalle en", tabla)
+    with eng.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS detalle TEXT'))
+    print("Listo.")
@@ -151,6 +151,13 @@ class Personal(db.Model):
     coord_reg = db.Column(db.Text)
     fun_sin = db.Column(db.Text)
 
+    # --- Control de concurrencia ---
+    # onupdate aplica en flush del ORM y en UPDATE de Core/ORM masivo que no
+    # fije la columna; sólo el SQL crudo (text) tiene que moverlas a mano.
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1",
+                        onupdate=db.literal_column("version + 1"))
+
     # FK
     cct = db.Column(
         db.String(15),
@@ -226,3 +233,47 @@ class Notificacion(db.Model):
     tipo = db.Column(db.String(50), nullable=True)  # ejemplo: 'cct', 'delegacion', 'personal'
     leida = db.Column(db.Boolean, default=False)
 
+
+
+class Trabajo(db.Model):
+    """Trabajo en segundo plano (lo ejecuta `flask trabajos worker`)."""
+    __tablename__ = 'trabajos'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default='pendiente', index=True)  # pendiente|en_proceso|terminado|error
+    parametros = db.Column(db.Text)        # JSON
+    progreso = db.Column(db.Integer, default=0)
+    total = db.Column(db.Integer)
+    mensaje = db.Column(db.Text)
+    detalle = db.Column(db.Text)           # JSON: contadores / resumen que publica el handler
+    archivo = db.Column(db.String(255))    # nombre de descarga del resultado (el contenido va en trabajos_archivos)
+    usuario_id = db.Column(db.Integer)     # sin foreign key porque está en otra BD
+    usuario = db.Column(db.String(100))
+    creado_en = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    iniciado_en = db.Column(db.DateTime)
+    actualizado_en = db.Column(db.DateTime)  # latido del worker
+    terminado_en = db.Column(db.DateTime)
+
+
+class ArchivoTrabajo(db.Model):
+    """
+    Archivo de un trabajo guardado en la BD por partes: el proceso web y el
+    worker no comparten disco. rol: 'entrada' (lo subido) | 'resultado'.
+    """
+    __tablename__ = 'trabajos_archivos'
+    __table_args__ = (db.UniqueConstraint('trabajo_id', 'rol', 'parte', name='uq_trabajo_archivo_parte'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    trabajo_id = db.Column(db.Integer, db.ForeignKey('trabajos.id', ondelete='CASCADE'), nullable=False, index=True)
+    rol = db.Column(db.String(20), nullable=False)
+    parte = db.Column(db.Integer, nullable=False)
+    datos = db.Column(db.LargeBinary, nullable=False)
+
+
+class VersionTabla(db.Model):
+    """Contador de escrituras por tabla (marca de agua para el caché de reportes)."""
+    __tablename__ = 'versiones_tabla'
+
+    tabla = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
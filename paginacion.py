@@ -0,0 +1,181 @@
+# paginacion.py
+"""
+Paginación por cursor (keyset / "seek") para las APIs de listas.
+
+En lugar de OFFSET, cada página pide las filas que van DESPUÉS de la última
+ya entregada según el orden (k1, k2, ..., id):
+
+    WHERE (k1, k2, id) > (:v1, :v2, :id) ORDER BY k1, k2, id LIMIT :n
+
+así el costo de una página no depende de su profundidad. El cursor es
+opaco para el cliente: base64 de los valores de la última fila más una
+firma del orden (un cursor de otro orden se rechaza).
+
+    ks = Keyset([(Personal.apellido_paterno, "asc"), (Personal.id, "asc")])
+    q = ks.ordenar(ks.despues_de(q, request.args.get("cursor")))
+    filas = q.limit(size + 1).all()
+    siguiente = ks.cursor(filas[size - 1]) if len(filas) > size else None
+
+La última clave debe ser única y no nula (el id). Las columnas con NULL se
+ordenan con NULLS LAST en ambas direcciones para que el orden y la
+comparación coincidan en Postgres y sqlite.
+
+Totales: `CacheConteos` guarda los count() ya hechos por (alcance, firma de
+filtros, marca de datos), así que paginar u ordenar no vuelve a contar;
+`conteo_estimado` lee la estimación del planificador para vistas sin filtro.
+"""
+import base64
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_, false, text, tuple_
+
+from models import db
+from utils import es_postgres
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def _acepta_nulos(col):
+    try:
+        return any(c.nullable for c in col.property.columns)
+    except AttributeError:
+        return True
+
+
+def _a_json(v):
+    return v.isoformat() if isinstance(v, (date, datetime)) else v
+
+
+def _de_json(col, v):
+    """Regresa el valor del cursor al tipo de la columna (fechas llegan como ISO)."""
+    if v is None:
+        return None
+    try:
+        tipo = col.type.python_type
+    except (AttributeError, NotImplementedError):
+        return v
+    if tipo is datetime:
+        return datetime.fromisoformat(v)
+    if tipo is date:
+        return date.fromisoformat(v)
+    return v
+
+
+class Keyset:
+    """Orden + cursor. `claves`: [(columna ORM, "asc"|"desc")], la última única (id)."""
+
+    def __init__(self, claves):
+        self.claves = [(col, "desc" if d == "desc" else "asc", _acepta_nulos(col)) for col, d in claves]
+        self.firma = ",".join(f"{col.key}:{d}" for col, d, _ in self.claves)
+
+    # ---- ORDER BY ----
+    def ordenar(self, q):
+        orden = []
+        for col, d, nulos in self.claves:
+            o = col.desc() if d == "desc" else col.asc()
+            orden.append(o.nulls_last() if nulos else o)
+        return q.order_by(*orden)
+
+    # ---- WHERE ----
+    def despues_de(self, q, cursor):
+        """Filtra lo que va después del cursor (sin cursor, desde el inicio)."""
+        if not cursor:
+            return q
+        valores = self._leer(cursor)
+        direcciones = {d for _, d, _ in self.claves}
+        if len(direcciones) == 1 and not any(n for _, _, n in self.claves):
+            # Misma dirección y sin NULLs: comparación de tuplas (usa el índice compuesto)
+            izq = tuple_(*(col for col, _, _ in self.claves))
+            der = tuple_(*valores)
+            return q.filter(izq < der if direcciones == {"desc"} else izq > der)
+        return q.filter(self._predicado(valores))
+
+    def _predicado(self, valores):
+        """(k1 > v1) OR (k1 = v1 AND k2 > v2) OR ..., respetando dirección y NULLS LAST."""
+        ramas, iguales = [], []
+        for (col, d, nulos), v in zip(self.claves, valores):
+            if v is not None:
+                despues = col < v if d == "desc" else col > v
+                ramas.append(and_(*iguales, or_(despues, col.is_(None)) if nulos else despues))
+            # con v NULL no hay nada después en esta clave (los NULL van al final)
+            iguales.append(col.is_(None) if v is None else col == v)
+        return or_(*ramas) if ramas else false()
+
+    # ---- cursor ----
+    def cursor(self, fila):
+        datos = {"f": self.firma, "v": [_a_json(getattr(fila, col.key)) for col, _, _ in self.claves]}
+        crudo = json.dumps(datos, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+    def _leer(self, cursor):
+        try:
+            crudo = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            datos = json.loads(crudo)
+            if datos["f"] != self.firma or len(datos["v"]) != len(self.claves):
+                raise CursorInvalido("El cursor corresponde a otro orden.")
+            return [_de_json(col, v) for (col, _, _), v in zip(self.claves, datos["v"])]
+        except CursorInvalido:
+            raise
+        except (ValueError, TypeError, KeyError) as e:
+            raise CursorInvalido("Cursor inválido.") from e
+
+
+# ---- Totales ------------------------------------------------------------------
+def firma_filtros(filters, columna):
+    """
+    Filtros de Tabulator -> tupla ordenada de (columna, valor), sin vacíos ni
+    campos desconocidos: el mismo filtro da la misma firma sin importar el
+    orden en que llegue o el alias usado. `columna(field)` resuelve el campo.
+    """
+    firma = set()
+    for f in filters:
+        field, value = (f or {}).get("field"), (f or {}).get("value")
+        if not field or value in (None, ""):
+            continue
+        col = columna(field)
+        if col is not None:
+            firma.add((col.key, str(value)))
+    return tuple(sorted(firma))
+
+
+class CacheConteos:
+    """
+    Totales ya contados, en memoria del proceso (LRU de `maximo` claves).
+    La clave lleva la marca de datos: al cambiar los datos cambia la clave y
+    la entrada vieja sale sola por antigüedad.
+    """
+
+    def __init__(self, maximo=512):
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def contar(self, clave, contar):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                return self._datos[clave]
+        n = contar()  # fuera del lock: dos peticiones iguales pueden contar a la vez, no pasa nada
+        with self._lock:
+            self._datos[clave] = n
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+        return n
+
+
+def conteo_estimado(modelo):
+    """
+    Filas de la tabla según las estadísticas del planificador (pg_class.reltuples,
+    las actualiza ANALYZE / autovacuum). None sin estimación (sqlite o tabla
+    nunca analizada): ahí el llamador cuenta de verdad.
+    """
+    if not es_postgres():
+        return None
+    n = db.session.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:tabla)"),
+                           {"tabla": modelo.__table__.name}).scalar()
+    return n if n is not None and n >= 0 else None
@@ -0,0 +1,90 @@
+# proyeccion.py
+"""
+Proyección de columnas para las APIs de listas.
+
+En lugar de cargar objetos ORM completos y convertir celda por celda con
+getattr/hasattr, se seleccionan sólo las columnas pedidas (filas Core, sin
+hidratar) y se serializan con conversores decididos UNA vez por columna:
+sólo las fechas pasan por isoformat, el resto va tal cual.
+
+    pr = Proyeccion(Personal, ["id", "curp", "fecha_ingreso"])
+    filas = pr.seleccionar(q).limit(50).all()
+    datos = pr.dicts(filas)          # [{id:.., curp:..}, ...]
+    datos = pr.columnar(filas)       # {"columns": [...], "data": {id: [...], ...}, ...}
+
+El formato columnar manda un arreglo por columna en vez de repetir las
+llaves en cada fila; las columnas que repiten valores (género, estatus,
+nivel, CCT...) van como diccionario + índices:
+
+    {"columns": ["id", "genero"], "rows": 3,
+     "data": {"id": [7, 8, 9], "genero": [0, 1, 0]},
+     "dictionaries": {"genero": ["H", "M"]}}
+"""
+from datetime import date, datetime, time
+
+
+def _es_fecha(col):
+    try:
+        return issubclass(col.type.python_type, (date, datetime, time))
+    except (AttributeError, NotImplementedError):
+        return False
+
+
+class Proyeccion:
+    """
+    Columnas de `modelo` a entregar. `campos`: nombres de columna (o alias con
+    `columna(field)`, que debe dar None para lo que no sea columna: relaciones,
+    `query`...); los desconocidos se ignoran, como en los filtros. El id
+    va siempre. `extra`: columnas que la consulta necesita aunque no se
+    entreguen (p. ej. las claves del cursor).
+    """
+
+    def __init__(self, modelo, campos, columna=None, extra=()):
+        columna = columna or (lambda f: getattr(modelo, f, None) if f in modelo.__table__.c else None)
+        cols = {"id": modelo.id}
+        for f in campos:
+            col = columna(f)
+            if col is not None:
+                cols.setdefault(col.key, col)
+        self.nombres = list(cols)
+        self.fechas = [i for i, c in enumerate(cols.values()) if _es_fecha(c)]
+        for col in extra:
+            cols.setdefault(col.key, col)
+        self.columnas = list(cols.values())
+
+    def seleccionar(self, q):
+        """Misma consulta (joins, filtros, orden) pero sólo con estas columnas."""
+        return q.with_entities(*self.columnas)
+
+    def valores(self, fila):
+        """Tupla con los campos entregados, fechas ya en ISO."""
+        v = list(fila[:len(self.nombres)])
+        for i in self.fechas:
+            if v[i] is not None:
+                v[i] = v[i].isoformat()
+        return v
+
+    def dicts(self, filas):
+        nombres = self.nombres
+        if not self.fechas:  # zip corta en los nombres: las columnas extra no salen
+            return [dict(zip(nombres, f)) for f in filas]
+        return [dict(zip(nombres, self.valores(f))) for f in filas]
+
+    def columnar(self, filas):
+        """Un arreglo por columna; con valores repetidos, diccionario + índices."""
+        n = len(filas)
+        nombres = self.nombres
+        columnas = list(zip(*filas))[:len(nombres)] if n else [()] * len(nombres)
+        data, diccionarios = {}, {}
+        for i, (nombre, valores) in enumerate(zip(nombres, columnas)):
+            if i in self.fechas:
+                valores = [v.isoformat() if v is not None else None for v in valores]
+            distintos = dict.fromkeys(valores)  # conserva el orden de aparición
+            if nombre != "id" and len(distintos) * 2 <= n:
+                for k, v in enumerate(distintos):
+                    distintos[v] = k
+                data[nombre] = [distintos[v] for v in valores]
+                diccionarios[nombre] = list(distintos)
+            else:
+                data[nombre] = list(valores)
+        return {"columns": nombres, "rows": n, "data": data, "dictionaries": diccionarios}
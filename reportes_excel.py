@@ -0,0 +1,198 @@
+# reportes_excel.py
+"""
+Escritor compartido de reportes Excel (openpyxl write_only).
+
+- Estilos con nombre (NamedStyle) registrados una vez por workbook; cada
+  celda sólo referencia el estilo, en lugar de crear Font/Border propios.
+- El formato se aplica al escribir cada fila (no hay recorridos posteriores).
+- Los anchos de columna se calculan de los valores conforme llegan.
+- El archivo final se envía en bloques sin cargarlo completo en memoria.
+"""
+import tempfile
+from io import BytesIO
+
+from flask import Response
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.utils import get_column_letter
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Estilos compartidos (mismos colores que el resto de reportes)
+BOLD = Font(bold=True)
+TITLE_FONT = Font(size=14, bold=True)
+CENTER = Alignment(horizontal="center", vertical="center")
+HEADER_FILL = PatternFill(start_color="ECECEC", end_color="ECECEC", fill_type="solid")
+_THIN = Side(style="thin", color="AAAAAA")
+BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+
+CHUNK_SIZE = 64 * 1024
+
+# nombre -> atributos del NamedStyle
+ESTILOS = {
+    "titulo":      {"font": TITLE_FONT, "alignment": CENTER},
+    "subtitulo":   {"font": Font(size=12, bold=True), "alignment": CENTER},
+    "centrado":    {"alignment": CENTER},
+    "negrita":     {"font": BOLD},
+    "encabezado":  {"font": BOLD, "fill": HEADER_FILL, "alignment": CENTER, "border": BORDER},
+    "etiqueta":    {"font": BOLD, "fill": HEADER_FILL, "border": BORDER},
+    "seccion":     {"font": BOLD, "fill": HEADER_FILL},
+    "celda":       {"border": BORDER},
+    "error":       {"font": Font(color="9C0006"), "fill": PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"), "border": BORDER},
+    "aviso":       {"font": Font(color="7F6000"), "fill": PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid"), "border": BORDER},
+}
+
+
+def nuevo_workbook():
+    """Workbook en modo write_only (sin hoja activa) con los ESTILOS registrados."""
+    wb = Workbook(write_only=True)
+    for nombre, attrs in ESTILOS.items():
+        ns = NamedStyle(name=nombre)
+        for k, v in attrs.items():
+            setattr(ns, k, v)
+        wb.add_named_style(ns)
+    return wb
+
+
+class HojaStream:
+    """
+    Hoja write_only con estilos por nombre y anchos calculados de los datos.
+
+    En write_only los anchos (<cols>) van antes de las filas, así que las
+    primeras `muestra` filas se retienen para medirlas (muestra=None: todas);
+    después se fijan los anchos y el resto se escribe directo al archivo
+    temporal. Con `anchos` fijos no se retiene nada.
+    """
+
+    def __init__(self, wb, titulo, ancho_max=45, margen=3, muestra=200, freeze=None, anchos=None):
+        self.ws = wb.create_sheet(titulo)
+        if freeze:
+            self.ws.freeze_panes = freeze  # debe fijarse antes de la primera fila
+        self.ancho_max = ancho_max
+        self.margen = margen
+        self.muestra = muestra
+        self.num_filas = 0
+        self._anchos = {}
+        self._pendientes = []
+        self._anchos_fijos = False
+        self._estilos = {}  # nombre -> StyleArray ya resuelto en este workbook
+        if anchos:
+            items = anchos.items() if isinstance(anchos, dict) else enumerate(anchos, start=1)
+            for col, w in items:
+                letra = col if isinstance(col, str) else get_column_letter(col)
+                self.ws.column_dimensions[letra].width = w
+            self._anchos_fijos = True
+
+    # ---- medición ----
+    def _medir(self, valores):
+        for idx, v in enumerate(valores, start=1):
+            if v is None:
+                continue
+            n = len(str(v))
+            if n > self._anchos.get(idx, 0):
+                self._anchos[idx] = n
+
+    def _fijar_anchos(self):
+        for idx, n in self._anchos.items():
+            self.ws.column_dimensions[get_column_letter(idx)].width = min(n + self.margen, self.ancho_max)
+        self._anchos_fijos = True
+        for fila in self._pendientes:
+            self.ws.append(fila)
+        self._pendientes = []
+
+    def _agregar(self, fila, valores=None):
+        """Agrega la fila; si trae `valores`, cuentan para el ancho de columnas."""
+        self.num_filas += 1
+        if self._anchos_fijos:
+            self.ws.append(fila)
+            return
+        if valores is not None:
+            self._medir(valores)
+        self._pendientes.append(fila)
+        if self.muestra is not None and len(self._pendientes) >= self.muestra:
+            self._fijar_anchos()
+
+    def _combinar(self, columnas):
+        if columnas and columnas > 1:
+            r = self.num_filas
+            self.ws.merged_cells.add(f"A{r}:{get_column_letter(columnas)}{r}")
+
+    # ---- escritura ----
+    def _celda(self, valor, estilo=None):
+        c = WriteOnlyCell(self.ws, value=valor)
+        if estilo is not None:
+            arr = self._estilos.get(estilo)
+            if arr is None:
+                c.style = estilo
+                self._estilos[estilo] = StyleArray(c._style)
+            else:
+                c._style = StyleArray(arr)  # copia directa: mucho más barato que resolver el nombre
+        return c
+
+    def titulo(self, texto, estilo="titulo", combinar=None):
+        """Fila de título (no cuenta para el ancho); `combinar` = columnas a unir."""
+        self._agregar([self._celda(texto, estilo)])
+        self._combinar(combinar)
+
+    def encabezado(self, valores):
+        self._agregar([self._celda(v, "encabezado") for v in valores], valores)
+
+    def fila(self, valores, estilo="celda"):
+        """Fila de datos; estilo=None escribe los valores sin formato."""
+        if estilo is None:
+            fila = list(valores)
+        else:
+            fila = [self._celda(v, estilo) for v in valores]
+        self._agregar(fila, valores)
+
+    def celdas(self, pares):
+        """Fila con estilo por celda: [(valor, estilo|None), ...]."""
+        pares = list(pares)
+        self._agregar([self._celda(v, e) for v, e in pares], [v for v, _ in pares])
+
+    def vacia(self):
+        self._agregar([])
+
+    def cerrar(self):
+        """Vacía las filas retenidas (si hubo menos de `muestra`)."""
+        if not self._anchos_fijos:
+            self._fijar_anchos()
+
+
+def xlsx_bytes(wb):
+    """Bytes del workbook (para reportes chicos o que van a caché / ZIP)."""
+    out = BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def respuesta_xlsx(wb, filename):
+    """
+    Guarda el workbook en un archivo temporal y lo devuelve como respuesta
+    chunked (sin Content-Length), leyendo en bloques de CHUNK_SIZE.
+    """
+    tmp = tempfile.TemporaryFile()
+    try:
+        wb.save(tmp)
+    except Exception:
+        tmp.close()
+        raise
+    tmp.seek(0)
+
+    def generar():
+        try:
+            while True:
+                bloque = tmp.read(CHUNK_SIZE)
+                if not bloque:
+                    break
+                yield bloque
+        finally:
+            tmp.close()
+
+    return Response(
+        generar(),
+        mimetype=XLSX_MIMETYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,23 +1,29 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, send_file, abort, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, send_file, abort, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
-from io import BytesIO
-from datetime import datetime
-from utils import registrar_notificacion, registrar_historial
+from io import BytesIO, StringIO
+import csv
+from datetime import datetime, date
+from utils import registrar_notificacion, registrar_historial, es_postgres
 from models import db, Delegacion, Plantel, Personal, ObservacionPersonal
-import pandas as pd
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func, not_
+from sqlalchemy import func, not_, tuple_, select, update
 from authz import roles_required, has_role
-from pytz import timezone
+from cache_reportes import reporte_cacheado, marca_datos
+from cache_http import etag_de, no_modificado, con_validadores
+from reportes_excel import XLSX_MIMETYPE, nuevo_workbook, HojaStream, respuesta_xlsx, xlsx_bytes
+from lector_excel import LectorExcel
+from importaciones import (ImportadorCCTs, ImportadorDelegaciones, libro_validacion, importar_en_trabajo,
+                          normalizar_nombre_delegacion, normalizar_encabezados_catalogo)
+from trabajos import tarea, encolar, parametros_de
+from paginacion import Keyset, CursorInvalido, CacheConteos, firma_filtros, conteo_estimado
+from proyeccion import Proyeccion
 import json
 from math import ceil
+from itertools import groupby
+from operator import itemgetter
 
 
 
-# Excel
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
 # PDF
 from reportlab.lib.pagesizes import letter, landscape
 from reportlab.lib import colors
@@ -25,20 +31,19 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import PageBreak
 from reportlab.lib.units import cm
+from tablas_pdf import TablaPaginada
 
 
 delegaciones_bp = Blueprint('delegaciones_bp', __name__)
 
+# Filas por bloque al leer del cursor en exportaciones grandes
+EXPORT_CHUNK = 1000
+
 def _norm(s: str) -> str:
     return (s or "").strip()
 
-def _norm_nombre(s: str) -> str:
-    """Normaliza el 'nombre' de la delegación: trim, MAYÚSCULAS, guiones Unicode → '-', colapsa espacios."""
-    s = (s or "").strip().upper()
-    s = s.translate(str.maketrans({"–": "-", "—": "-"}))
-    import re
-    s = re.sub(r"\s+", " ", s)
-    return s
+# Normaliza el 'nombre' de la delegación (la misma regla que usa la importación)
+_norm_nombre = normalizar_nombre_delegacion
 
 def _parse_tabulator_args(req):
     page = req.args.get("page", type=int) or 1
@@ -106,93 +111,112 @@ def _fetch_personal_por_cct():
          }, ...
       ]
     }
+    Dos consultas para cualquier alcance: delegaciones+planteles y conteos
+    de personal. En PostgreSQL los totales por delegación salen de la misma
+    consulta (GROUPING SETS); en otras BD se suman aquí.
     """
-    del_q = _alcance_delegaciones_query().order_by(Delegacion.nivel.asc(), Delegacion.nombre.asc())
-
-    resultado = {
-        "generado_por": getattr(current_user, "nombre", "Sistema"),
-        "generado_en": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "delegaciones": []
-    }
+    alcance = _alcance_delegaciones_query()
 
-    for d in del_q.all():
-        # Planteles de la delegación
-        planteles = (Plantel.query
-                     .filter(Plantel.delegacion_id == d.id)
-                     .order_by(Plantel.nombre.asc())
-                     .all())
-
-        # Mapa CCT -> nombre de plantel
-        cct2nombre = {p.cct: (p.nombre or "") for p in planteles if p.cct}
-
-        # Personal por CCT (join por CCT)
-        per_rows = (
-            db.session.query(
-                Personal.cct,
-                Personal.genero,
-                Personal.funcion_coordinacion,
-                func.count(Personal.id)
-            )
-            .join(Plantel, Personal.cct == Plantel.cct)
-            .filter(Plantel.delegacion_id == d.id)
-            .group_by(Personal.cct, Personal.genero, Personal.funcion_coordinacion)
-            .all()
-        )
+    # 1) Delegaciones del alcance con sus planteles (LEFT JOIN: también las que no tienen)
+    del_rows = (
+        alcance.outerjoin(Plantel, Plantel.delegacion_id == Delegacion.id)
+        .with_entities(Delegacion.id, Delegacion.nombre, Delegacion.nivel, Plantel.cct, Plantel.nombre)
+        .order_by(Delegacion.nivel.asc(), Delegacion.nombre.asc(), Delegacion.id.asc(), Plantel.nombre.asc())
+        .all()
+    )
 
-        # Acumular por CCT (usa funcion_coordinacion)
-        por_cct = {}
-        funciones_globales = set()
-        for cct, genero, funcion_coord, cnt in per_rows:
-            if not cct:
-                continue
-            nodo = por_cct.setdefault(cct, {
-                "cct": cct,
-                "plantel": cct2nombre.get(cct, ""),
+    # 2) Personal por (delegación, CCT, género, función coord.) + totales por delegación
+    ids_alcance = alcance.with_entities(Delegacion.id)
+    cols = (Plantel.delegacion_id, Personal.cct, Personal.genero, Personal.funcion_coordinacion)
+    per_q = (
+        db.session.query(*cols, func.count(Personal.id))
+        .join(Plantel, Personal.cct == Plantel.cct)
+        .filter(Plantel.delegacion_id.in_(ids_alcance))
+    )
+    if es_postgres():
+        per_q = (per_q
+                 .add_columns(func.grouping(Personal.cct), func.grouping(Personal.genero))
+                 .group_by(func.grouping_sets(
+                     tuple_(*cols),
+                     tuple_(Plantel.delegacion_id, Personal.genero),
+                     tuple_(Plantel.delegacion_id, Personal.funcion_coordinacion),
+                 )))
+    else:
+        per_q = per_q.group_by(*cols)
+    per_rows = per_q.all()
+
+    # Armar estructura: delegación -> CCT
+    delegaciones = {}
+    for d_id, d_nombre, d_nivel, cct, pl_nombre in del_rows:
+        d = delegaciones.get(d_id)
+        if d is None:
+            d = delegaciones[d_id] = {
+                "id": d_id, "nombre": d_nombre, "nivel": d_nivel,
+                "por_cct": {}, "funciones": set(),
+                "totales": {"hombres": 0, "mujeres": 0, "total": 0, "funciones": {}},
+            }
+        if cct:
+            d["por_cct"][cct] = {
+                "cct": cct, "plantel": pl_nombre or "",
                 "hombres": 0, "mujeres": 0, "total": 0,
                 "funciones": {}
-            })
+            }
+
+    def _sumar(nodo, genero, funcion_coord, cnt, por_genero=True, por_funcion=True):
+        if por_genero:
             g = (genero or "").upper()
             if g == "H":
-                nodo["hombres"] += int(cnt)
+                nodo["hombres"] += cnt
             elif g == "M":
-                nodo["mujeres"] += int(cnt)
-            nodo["total"] += int(cnt)
-
+                nodo["mujeres"] += cnt
+            nodo["total"] += cnt
+        if por_funcion:
             f = (funcion_coord or "SIN FUNCIÓN COORD.").upper()
-            nodo["funciones"][f] = nodo["funciones"].get(f, 0) + int(cnt)
-            funciones_globales.add(f)
+            nodo["funciones"][f] = nodo["funciones"].get(f, 0) + cnt
 
-        # Asegurar presencia de CCTs sin personal (con ceros)
-        for cct, nombre in cct2nombre.items():
-            por_cct.setdefault(cct, {
-                "cct": cct, "plantel": nombre,
-                "hombres": 0, "mujeres": 0, "total": 0,
-                "funciones": {}
-            })
-
-        # Orden de funciones estable
-        funciones_orden = sorted(funciones_globales)
-
-        # Totales por delegación
-        tot_h = sum(n["hombres"] for n in por_cct.values())
-        tot_m = sum(n["mujeres"] for n in por_cct.values())
-        tot_tot = sum(n["total"] for n in por_cct.values())
-        tot_func = {}
-        for n in por_cct.values():
-            for f, v in n["funciones"].items():
-                tot_func[f] = tot_func.get(f, 0) + v
-
-        resultado["delegaciones"].append({
-            "id": d.id,
-            "nombre": d.nombre,
-            "nivel": d.nivel,
-            "planteles": sorted(por_cct.values(), key=lambda x: x["plantel"]),
-            "totales": {"hombres": tot_h, "mujeres": tot_m, "total": tot_tot, "funciones": tot_func},
-            "funciones_orden": funciones_orden
-        })
+    for row in per_rows:
+        d_id, cct, genero, funcion_coord, cnt = row[:5]
+        d = delegaciones.get(d_id)
+        if d is None:
+            continue
+        cnt = int(cnt)
+        if len(row) > 5 and row[5]:
+            # fila de GROUPING SETS: total de la delegación por género o por función
+            sin_genero = bool(row[6])
+            _sumar(d["totales"], genero, funcion_coord, cnt, por_genero=not sin_genero, por_funcion=sin_genero)
+            continue
+        nodo = d["por_cct"].get(cct)
+        if nodo is None:
+            continue
+        _sumar(nodo, genero, funcion_coord, cnt)
+        d["funciones"].add((funcion_coord or "SIN FUNCIÓN COORD.").upper())
+        if len(row) == 5:
+            _sumar(d["totales"], genero, funcion_coord, cnt)
 
+    resultado = {
+        "generado_por": getattr(current_user, "nombre", "Sistema"),
+        "generado_en": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "delegaciones": [
+            {
+                "id": d["id"],
+                "nombre": d["nombre"],
+                "nivel": d["nivel"],
+                "planteles": sorted(d["por_cct"].values(), key=lambda x: x["plantel"]),
+                "totales": d["totales"],
+                "funciones_orden": sorted(d["funciones"]),  # orden de funciones estable
+            }
+            for d in delegaciones.values()
+        ],
+    }
     return resultado
 
+# Columnas del plantel que usan los reportes de CCTs (en este orden)
+CAMPOS_PLANTEL_REPORTE = (
+    "cct", "nombre", "turno", "nivel", "modalidad", "zona_escolar", "sector",
+    "calle", "num_exterior", "num_interior", "cruce_1", "cruce_2",
+    "localidad", "colonia", "municipio", "cp", "coordenadas_gps",
+)
+
 def _fetch_ccts_grouped_by_delegacion():
     """
     Regresa:
@@ -215,58 +239,47 @@ def _fetch_ccts_grouped_by_delegacion():
       - delegado: solo su delegación
       - admin/coordinador: todas o una en específico via ?delegacion_id=ID
     """
+    # Una sola consulta (Core, sin hidratar objetos): delegación + columnas del plantel,
+    # ordenada para agrupar por delegación en una pasada.
+    stmt = (
+        select(Delegacion.id, Delegacion.nombre, Delegacion.nivel, Delegacion.delegado,
+               *[getattr(Plantel, c) for c in CAMPOS_PLANTEL_REPORTE])
+        .select_from(Delegacion)
+        .outerjoin(Plantel, Plantel.delegacion_id == Delegacion.id)
+    )
+
     # Alcance por rol
     if current_user.rol == 'delegado':
-        delegaciones_q = Delegacion.query.filter(Delegacion.id == current_user.delegacion_id)
+        stmt = stmt.where(Delegacion.id == current_user.delegacion_id)
     else:
         delegacion_id = request.args.get("delegacion_id", type=int)
         if delegacion_id:
-            delegaciones_q = Delegacion.query.filter(Delegacion.id == delegacion_id)
-        else:
-            delegaciones_q = Delegacion.query
+            stmt = stmt.where(Delegacion.id == delegacion_id)
+
+    stmt = stmt.order_by(Delegacion.nivel.asc(), Delegacion.nombre.asc(), Delegacion.id.asc(), Plantel.nombre.asc())
 
-    delegaciones_q = delegaciones_q.order_by(Delegacion.nivel.asc(), Delegacion.nombre.asc())
     delegaciones = []
     total_planteles = 0
     planteles_por_delegacion = {}
 
-    for d in delegaciones_q.all():
-        # obtén planteles ordenados por nombre (ajusta si prefieres por CCT)
-        planteles = (Plantel.query
-                     .filter(Plantel.delegacion_id == d.id)
-                     .order_by(Plantel.nombre.asc())
-                     .all())
-
+    for (d_id, d_nombre, d_nivel, d_delegado), grupo in groupby(db.session.execute(stmt), key=itemgetter(0, 1, 2, 3)):
         rows = []
-        for p in planteles:
-            rows.append({
-                "cct": (p.cct or "").upper(),
-                "nombre": p.nombre or "",
-                "turno": p.turno or "",
-                "nivel": p.nivel or "",
-                "modalidad": p.modalidad or "",
-                "zona_escolar": p.zona_escolar or "",
-                "sector": p.sector or "",
-                "calle": p.calle or "",
-                "num_exterior": p.num_exterior or "",
-                "num_interior": p.num_interior or "",
-                "cruce_1": p.cruce_1 or "",
-                "cruce_2": p.cruce_2 or "",
-                "localidad": p.localidad or "",
-                "colonia": p.colonia or "",
-                "municipio": p.municipio or "",
-                "cp": p.cp or "",
-                "coordenadas_gps": p.coordenadas_gps or "",
-            })
+        for r in grupo:
+            valores = r[4:]
+            if valores[0] is None:  # delegación sin planteles (LEFT JOIN)
+                continue
+            p = {c: (v or "") for c, v in zip(CAMPOS_PLANTEL_REPORTE, valores)}
+            p["cct"] = p["cct"].upper()
+            rows.append(p)
 
         delegaciones.append({
-            "id": d.id,
-            "nombre": d.nombre,
-            "nivel": d.nivel,
-            "delegado": d.delegado,
+            "id": d_id,
+            "nombre": d_nombre,
+            "nivel": d_nivel,
+            "delegado": d_delegado,
             "planteles": rows
         })
-        planteles_por_delegacion[d.nombre] = len(rows)
+        planteles_por_delegacion[d_nombre] = len(rows)
         total_planteles += len(rows)
 
     data = {
@@ -327,7 +340,7 @@ def _fetch_delegaciones_data_para_reporte():
     data = {
         "total_delegaciones": len(rows),
         "totales_por_nivel": totales_por_nivel,
-        "rows": rows,
+        "rows": [tuple(r) for r in rows],
         "generado_por": getattr(current_user, "nombre", "Sistema"),
         "generado_en": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
     }
@@ -522,180 +535,145 @@ def subir_excel_delegaciones(delegacion_id):
         return redirect(url_for('delegaciones_bp.vista_delegaciones'))
 
     if archivo and archivo.filename.endswith('.xlsx'):
-        try:
-            df = pd.read_excel(archivo)
-            registros_agregados = 0
-            registros_ignorados = 0
-
-            for index, row in df.iterrows():
-                raw_nombre = row.get('nombre')
-                raw_nivel  = row.get('nivel')
-
-                if isinstance(raw_nombre, str) and isinstance(raw_nivel, str) and raw_nombre.strip() and raw_nivel.strip():
-                    nombre = _norm_nombre(raw_nombre)
-                    nivel  = _norm(raw_nivel).upper()
-                    try:
-                        nueva = Delegacion(nombre=nombre, nivel=nivel)
-                        db.session.add(nueva)
-                        db.session.flush()  # detecta duplicado aquí sin tumbar todo
-                        registros_agregados += 1
-                    except IntegrityError:
-                        db.session.rollback()
-                        registros_ignorados += 1
-                else:
-                    registros_ignorados += 1
-
-            db.session.commit()
-            flash(f'Se cargaron {registros_agregados} delegaciones. {registros_ignorados} filas ignoradas.', 'success')
-        except Exception as e:
-            flash(f'Ocurrió un error al procesar el archivo: {str(e)}', 'danger')
-
+        # ⏳ La carga corre en el worker; la vista muestra el avance con ?trabajo=<id>
+        t = encolar("importar_delegaciones", usuario=current_user, entrada=archivo.stream)
+        flash(f"Carga de delegaciones en cola (trabajo #{t.id}).", 'info')
+        return redirect(url_for('delegaciones_bp.vista_delegaciones', trabajo=t.id))
     else:
         flash('Formato de archivo no permitido. Usa .xlsx', 'danger')
 
     return redirect(url_for('delegaciones_bp.vista_delegaciones'))
 
-@delegaciones_bp.route('/delegacion/<int:delegacion_id>/subir_excel', methods=['POST'])
-@roles_required('admin')
-def subir_excel_ccts(delegacion_id):
+
+@tarea("importar_delegaciones")
+def importar_delegaciones_trabajo(trabajo, progreso):
+    imp = ImportadorDelegaciones()
+    archivo = importar_en_trabajo(trabajo, progreso, imp, "errores_delegaciones.xlsx",
+                                  columnas=normalizar_encabezados_catalogo)
+    progreso.mensaje(f'Delegaciones: {imp.insertados} nuevas, {imp.actualizados} actualizadas. '
+                     f'{imp.bad} filas ignoradas.')
+    registrar_notificacion(
+        f"{trabajo.usuario or 'Sistema'} cargó delegaciones desde Excel "
+        f"({imp.insertados} nuevas, {imp.actualizados} actualizadas)",
+        tipo="delegacion", usuario=trabajo.usuario)
+    return archivo
+
+
+def _subir_excel_catalogo(delegacion_id=None):
+    """
+    Carga de planteles: de una delegación (subir_excel_ccts) o el catálogo
+    estatal (delegacion_id=None, la delegación sale de cada fila).
+    """
+    if delegacion_id is None:
+        vista, args = 'delegaciones_bp.vista_delegaciones', {}
+        sufijo, titulo = "estatal", "Validación del catálogo estatal de CCTs"
+    else:
+        vista, args = 'delegaciones_bp.vista_ccts_por_delegacion', {'delegacion_id': delegacion_id}
+        sufijo, titulo = delegacion_id, f"Validación de CCTs — delegación {delegacion_id}"
+    volver = url_for(vista, **args)
+
     if 'archivo_excel' not in request.files:
         flash('No se envió ningún archivo.', 'danger')
-        return redirect(url_for('delegaciones_bp.vista_ccts_por_delegacion', delegacion_id=delegacion_id))
+        return redirect(volver)
 
     archivo = request.files['archivo_excel']
 
     if archivo.filename == '':
         flash('Nombre de archivo vacío.', 'danger')
-        return redirect(url_for('delegaciones_bp.vista_ccts_por_delegacion', delegacion_id=delegacion_id))
+        return redirect(volver)
 
-    if archivo and archivo.filename.endswith('.xlsx'):
+    if not (archivo and archivo.filename.endswith('.xlsx')):
+        flash('Formato de archivo no permitido. Usa .xlsx', 'danger')
+        return redirect(volver)
+
+    # 🔎 Sólo validar: no escribe nada, devuelve el Excel anotado
+    if request.form.get("dry_run") == "1":
         try:
-            df = pd.read_excel(archivo)
-            registros_agregados = 0
-            registros_ignorados = 0
-
-            def limpiar(valor):
-                return str(valor).strip() if pd.notna(valor) else ''
-
-            for _, row in df.iterrows():
-                cct = row.get('cct')
-                nombre = row.get('nombre')
-                turno = row.get('turno')
-                nivel = row.get('nivel')
-                modalidad = row.get('modalidad')
-
-                if all(isinstance(v, str) and v.strip() for v in [cct, nombre, turno, nivel, modalidad]):
-                    nuevo = Plantel(
-                        cct=limpiar(cct).upper(),
-                        nombre=limpiar(nombre),
-                        turno=limpiar(turno),
-                        nivel=limpiar(nivel),
-                        modalidad=limpiar(modalidad),
-                        zona_escolar=limpiar(row.get('zona_escolar')),
-                        sector=limpiar(row.get('sector')),
-                        calle=limpiar(row.get('calle')),
-                        num_exterior=limpiar(row.get('num_exterior')),
-                        num_interior=limpiar(row.get('num_interior')),
-                        cruce_1=limpiar(row.get('cruce_1')),
-                        cruce_2=limpiar(row.get('cruce_2')),
-                        localidad=limpiar(row.get('localidad')),
-                        colonia=limpiar(row.get('colonia')),
-                        municipio=limpiar(row.get('municipio')),
-                        cp=limpiar(row.get('cp')),
-                        coordenadas_gps=limpiar(row.get('coordenadas_gps')),
-                        estado='HIDALGO',
-                        delegacion_id=delegacion_id
-                    )
-                    db.session.add(nuevo)
-                    registros_agregados += 1
-                else:
-                    registros_ignorados += 1
-
-            db.session.commit()
-            flash(f'Se cargaron {registros_agregados} CCTs. {registros_ignorados} filas ignoradas.', 'success')
+            with LectorExcel(archivo, columnas=normalizar_encabezados_catalogo) as lector:
+                if delegacion_id is None and "delegacion" not in lector.columnas:
+                    flash('El catálogo estatal necesita la columna "delegacion".', 'danger')
+                    return redirect(volver)
+                imp = ImportadorCCTs(delegacion_id)
+                wb = libro_validacion(lector, imp.revisar, titulo, notas=lambda: [
+                    ("CCTs nuevos", imp.insertados),
+                    ("CCTs que se actualizarían", imp.actualizados),
+                    *([("Delegaciones nuevas", imp.delegaciones_nuevas)] if imp.estatal else []),
+                ])
+                return respuesta_xlsx(wb, f"validacion_ccts_{sufijo}.xlsx")
         except Exception as e:
             flash(f'Ocurrió un error al procesar el archivo: {str(e)}', 'danger')
-    else:
-        flash('Formato de archivo no permitido. Usa .xlsx', 'danger')
+            return redirect(volver)
 
-    return redirect(url_for('delegaciones_bp.vista_ccts_por_delegacion', delegacion_id=delegacion_id))
+    # ⏳ La carga corre en el worker; la vista muestra el avance con ?trabajo=<id>
+    t = encolar("importar_ccts", {"delegacion_id": delegacion_id}, usuario=current_user, entrada=archivo.stream)
+    flash(f"Carga de CCTs en cola (trabajo #{t.id}).", 'info')
+    return redirect(url_for(vista, trabajo=t.id, **args))
 
-@delegaciones_bp.route("/delegaciones/reporte/excel")
-@login_required
-def reporte_delegaciones_excel():
-    data = _fetch_delegaciones_data_para_reporte()
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Resumen"
+@delegaciones_bp.route('/delegacion/<int:delegacion_id>/subir_excel', methods=['POST'])
+@roles_required('admin')
+def subir_excel_ccts(delegacion_id):
+    return _subir_excel_catalogo(delegacion_id)
+
 
-    bold = Font(bold=True)
-    center = Alignment(horizontal="center", vertical="center")
-    header_fill = PatternFill(start_color="ECECEC", end_color="ECECEC", fill_type="solid")
-    thin = Side(style="thin", color="AAAAAA")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+@delegaciones_bp.route('/planteles/subir_excel', methods=['POST'])
+@roles_required('admin')
+def subir_excel_catalogo():
+    """Catálogo estatal: planteles de todas las delegaciones en un solo archivo."""
+    return _subir_excel_catalogo()
+
+
+@tarea("importar_ccts")
+def importar_ccts_trabajo(trabajo, progreso):
+    delegacion_id = parametros_de(trabajo).get("delegacion_id")
+    imp = ImportadorCCTs(delegacion_id)
+    archivo = importar_en_trabajo(trabajo, progreso, imp, f"errores_ccts_{delegacion_id or 'estatal'}.xlsx",
+                                  columnas=normalizar_encabezados_catalogo)
+    nuevas = f", {imp.delegaciones_nuevas} delegaciones nuevas" if imp.estatal else ""
+    progreso.mensaje(f'CCTs: {imp.insertados} nuevos, {imp.actualizados} actualizados{nuevas}. '
+                     f'{imp.bad} filas ignoradas.')
+    donde = "en el catálogo estatal" if imp.estatal else f"en la delegación {delegacion_id}"
+    registrar_notificacion(
+        f"{trabajo.usuario or 'Sistema'} cargó CCTs desde Excel {donde} "
+        f"({imp.insertados} nuevos, {imp.actualizados} actualizados)",
+        tipo="cct", usuario=trabajo.usuario)
+    return archivo
 
-    # Encabezado
-    ws.merge_cells("A1:E1")
-    ws["A1"] = "REPORTE DE DELEGACIONES"
-    ws["A1"].font = Font(size=14, bold=True)
-    ws["A1"].alignment = center
 
-    ws.merge_cells("A2:E2")
-    ws["A2"] = f"Generado por: {data['generado_por']}  |  Fecha: {data['generado_en']}"
-    ws["A2"].alignment = center
+def _excel_reporte_delegaciones(data):
+    wb = nuevo_workbook()
 
-    ws.append([])
-    ws.append(["Total de delegaciones", data["total_delegaciones"]])
+    # Encabezado + resumen
+    ws = HojaStream(wb, "Resumen", muestra=None)
+    ws.titulo("REPORTE DE DELEGACIONES", combinar=5)
+    ws.titulo(f"Generado por: {data['generado_por']}  |  Fecha: {data['generado_en']}", estilo="centrado", combinar=5)
+    ws.vacia()
+    ws.fila(["Total de delegaciones", data["total_delegaciones"]], estilo=None)
 
     # Totales por nivel
-    ws.append(["Totales por nivel", "Cantidad"])
-    ws["A5"].font = bold; ws["B5"].font = bold
-    fila = 6
+    ws.fila(["Totales por nivel", "Cantidad"], estilo="negrita")
     for nivel, cant in sorted(data["totales_por_nivel"].items()):
-        ws.cell(row=fila, column=1, value=nivel)
-        ws.cell(row=fila, column=2, value=cant)
-        fila += 1
-
-    # Hoja detalle
-    ws_det = wb.create_sheet("Detalle")
-    headers = ["Delegación", "Nivel", "Delegado", "# CCTs"]
-    ws_det.append(headers)
-    for cell in ws_det[1]:
-        cell.font = bold
-        cell.fill = header_fill
-        cell.alignment = center
-        cell.border = border
+        ws.fila([nivel, cant], estilo=None)
+    ws.cerrar()
 
+    # Hoja detalle (bordes y anchos al escribir)
+    ws_det = HojaStream(wb, "Detalle", ancho_max=40, margen=4, muestra=None, freeze="A2")
+    ws_det.encabezado(["Delegación", "Nivel", "Delegado", "# CCTs"])
     for _, nombre, nivel, delegado, num_ccts in data["rows"]:
-        ws_det.append([nombre, nivel, delegado if delegado else "—", num_ccts])
-
-    # Bordes + anchos
-    for row in ws_det.iter_rows(min_row=1, max_row=ws_det.max_row, min_col=1, max_col=4):
-        for cell in row:
-            cell.border = border
-
-    for col_idx in range(1, 5):
-        max_len = 0
-        for row in range(1, ws_det.max_row + 1):
-            val = ws_det.cell(row=row, column=col_idx).value
-            max_len = max(max_len, len(str(val)) if val else 0)
-        ws_det.column_dimensions[get_column_letter(col_idx)].width = min(max_len + 4, 40)
+        ws_det.fila([nombre, nivel, delegado if delegado else "—", num_ccts])
+    ws_det.cerrar()
 
-    ws_det.freeze_panes = "A2"
+    return xlsx_bytes(wb)
 
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
+@delegaciones_bp.route("/delegaciones/reporte/excel")
+@login_required
+def reporte_delegaciones_excel():
     filename = f"delegaciones_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return send_file(output, as_attachment=True, download_name=filename,
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return reporte_cacheado("delegaciones", "xlsx", _fetch_delegaciones_data_para_reporte,
+                            _excel_reporte_delegaciones, filename, XLSX_MIMETYPE)
 
 
-@delegaciones_bp.route("/delegaciones/reporte/pdf")
-@login_required
-def reporte_delegaciones_pdf():
-    data = _fetch_delegaciones_data_para_reporte()
+def _pdf_reporte_delegaciones(data):
 
     buffer = BytesIO()
     doc = SimpleDocTemplate(
@@ -749,46 +727,31 @@ def reporte_delegaciones_pdf():
     doc.build(story)
     pdf = buffer.getvalue()
     buffer.close()
+    return pdf
 
-    filename = f"delegaciones_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    return send_file(BytesIO(pdf), as_attachment=True, download_name=filename, mimetype="application/pdf")
 
-@delegaciones_bp.route("/planteles/reporte/excel")
+@delegaciones_bp.route("/delegaciones/reporte/pdf")
 @login_required
-def reporte_ccts_excel():
-    data = _fetch_ccts_grouped_by_delegacion()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Resumen"
-
-    bold = Font(bold=True)
-    center = Alignment(horizontal="center", vertical="center")
-    header_fill = PatternFill(start_color="ECECEC", end_color="ECECEC", fill_type="solid")
-    thin = Side(style="thin", color="AAAAAA")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-    # Encabezado
-    ws.merge_cells("A1:D1")
-    ws["A1"] = "REPORTE DE PLANTELES (CCTs)"
-    ws["A1"].font = Font(size=14, bold=True)
-    ws["A1"].alignment = center
-
-    ws.merge_cells("A2:D2")
-    ws["A2"] = f"Generado por: {data['generado_por']}  |  Fecha: {data['generado_en']}"
-    ws["A2"].alignment = center
-
-    ws.append([])
-    ws.append(["Total de delegaciones", data["totales"]["delegaciones"]])
-    ws.append(["Total de planteles", data["totales"]["planteles"]])
-    ws.append([])
-    ws.append(["Delegación", "Planteles"])
-    ws["A6"].font = bold; ws["B6"].font = bold
-    fila = 7
+def reporte_delegaciones_pdf():
+    filename = f"delegaciones_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    return reporte_cacheado("delegaciones", "pdf", _fetch_delegaciones_data_para_reporte,
+                            _pdf_reporte_delegaciones, filename, "application/pdf")
+
+def _excel_reporte_ccts(data):
+    wb = nuevo_workbook()
+
+    # Encabezado + resumen
+    ws = HojaStream(wb, "Resumen", muestra=None)
+    ws.titulo("REPORTE DE PLANTELES (CCTs)", combinar=4)
+    ws.titulo(f"Generado por: {data['generado_por']}  |  Fecha: {data['generado_en']}", estilo="centrado", combinar=4)
+    ws.vacia()
+    ws.fila(["Total de delegaciones", data["totales"]["delegaciones"]], estilo=None)
+    ws.fila(["Total de planteles", data["totales"]["planteles"]], estilo=None)
+    ws.vacia()
+    ws.fila(["Delegación", "Planteles"], estilo="negrita")
     for nombre, cant in data["totales"]["planteles_por_delegacion"].items():
-        ws.cell(row=fila, column=1, value=nombre)
-        ws.cell(row=fila, column=2, value=cant)
-        fila += 1
+        ws.fila([nombre, cant], estilo=None)
+    ws.cerrar()
 
     # Hoja por delegación
     headers = [
@@ -803,70 +766,28 @@ def reporte_ccts_excel():
     for d in data["delegaciones"]:
         # Excel limita a 31 caracteres el nombre de hoja
         sheet_name = f"{d['nombre']}"[:31] if d['nombre'] else f"Deleg_{d['id']}"
-        ws_det = wb.create_sheet(sheet_name)
-
-        # Encabezado hoja
-        ws_det.merge_cells("A1:R1")
-        ws_det["A1"] = f"{d['nombre']} — {d['nivel']}"
-        ws_det["A1"].font = Font(size=12, bold=True)
-        ws_det["A1"].alignment = center
+        ws_det = HojaStream(wb, sheet_name, ancho_max=35, margen=3, muestra=None, freeze="A5")
 
         delegado_txt = d["delegado"] if d["delegado"] else "—"
-        ws_det.merge_cells("A2:R2")
-        ws_det["A2"] = f"Delegado(a): {delegado_txt}    |    Planteles: {len(d['planteles'])}"
-        ws_det["A2"].alignment = center
-
-        ws_det.append([])
-
-        ws_det.append(headers)
-        for cell in ws_det[ws_det.max_row]:
-            cell.font = bold
-            cell.fill = header_fill
-            cell.alignment = center
-            cell.border = border
+        ws_det.titulo(f"{d['nombre']} — {d['nivel']}", estilo="subtitulo", combinar=18)
+        ws_det.titulo(f"Delegado(a): {delegado_txt}    |    Planteles: {len(d['planteles'])}", estilo="centrado", combinar=18)
+        ws_det.vacia()
 
+        ws_det.encabezado(headers)
         for p in d["planteles"]:
-            ws_det.append([
-                p["cct"], p["nombre"], p["turno"], p["nivel"], p["modalidad"],
-                p["zona_escolar"], p["sector"],
-                p["calle"], p["num_exterior"], p["num_interior"],
-                p["cruce_1"], p["cruce_2"],
-                p["localidad"], p["colonia"], p["municipio"], p["cp"],
-                p["coordenadas_gps"]
-            ])
-
-        # Bordes y anchos
-        for row in ws_det.iter_rows(min_row=4, max_row=ws_det.max_row, min_col=1, max_col=len(headers)):
-            for cell in row:
-                cell.border = border
-
-        for col_idx in range(1, len(headers) + 1):
-            max_len = 0
-            for row_i in range(1, ws_det.max_row + 1):
-                val = ws_det.cell(row=row_i, column=col_idx).value
-                max_len = max(max_len, len(str(val)) if val else 0)
-            ws_det.column_dimensions[get_column_letter(col_idx)].width = min(max_len + 3, 35)
-
-        ws_det.freeze_panes = "A5"
-
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    filename = f"planteles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return send_file(output, as_attachment=True, download_name=filename,
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            ws_det.fila([p[c] for c in CAMPOS_PLANTEL_REPORTE])
+        ws_det.cerrar()
 
-@delegaciones_bp.route("/planteles/reporte/pdf")
+    return xlsx_bytes(wb)
+
+@delegaciones_bp.route("/planteles/reporte/excel")
 @login_required
-def reporte_ccts_pdf():
-    data = _fetch_ccts_grouped_by_delegacion()
+def reporte_ccts_excel():
+    filename = f"planteles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return reporte_cacheado("planteles", "xlsx", _fetch_ccts_grouped_by_delegacion,
+                            _excel_reporte_ccts, filename, XLSX_MIMETYPE)
 
-    from io import BytesIO
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-    from reportlab.lib.pagesizes import letter, landscape
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import cm
+def _pdf_reporte_ccts(data):
 
     buffer = BytesIO()
     doc = SimpleDocTemplate(
@@ -944,6 +865,18 @@ def reporte_ccts_pdf():
             ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.white, colors.HexColor("#FAFAFA")]),
         ])
 
+    # Un estilo por tipo de tabla para todo el reporte
+    ts_gen = base_style()
+    ts_gen.add("ALIGN", (0,1), (0,-1), "CENTER")   # No.
+    ts_gen.add("ALIGN", (1,1), (1,-1), "CENTER")   # CCT
+    ts_gen.add("ALIGN", (3,1), (3,-1), "CENTER")   # Turno
+    ts_gen.add("ALIGN", (6,1), (7,-1), "CENTER")   # Zona/Sector
+
+    ts_dom = base_style()
+    ts_dom.add("ALIGN", (0,1), (0,-1), "CENTER")   # No.
+    ts_dom.add("ALIGN", (2,1), (3,-1), "CENTER")   # No.Ext/No.Int
+    ts_dom.add("ALIGN", (9,1), (9,-1), "CENTER")   # CP
+
     for i, d in enumerate(data["delegaciones"]):
         delegado_txt = d["delegado"] if d["delegado"] else "—"
         title = f"{d['nombre']} — {d['nivel']}  (Delegado(a): {delegado_txt} | Planteles: {len(d['planteles'])})"
@@ -951,9 +884,8 @@ def reporte_ccts_pdf():
         story.append(Spacer(1, 4))
 
         # -------- Tabla 1: Generales (mismas columnas SIEMPRE) --------
-        tbl_gen = [headers_generales]
-        for idx, p in enumerate(d["planteles"], start=1):
-            row = [
+        filas_gen = [
+            [
                 P(idx),                         # No.
                 P(p.get("cct")),                # CCT
                 P(p.get("nombre"), maxlen=120), # Nombre (limite prudente)
@@ -963,27 +895,14 @@ def reporte_ccts_pdf():
                 P(p.get("zona_escolar")),
                 P(p.get("sector")),
             ]
-            # seguridad: si por alguna razón cambia el largo, lo normalizamos:
-            row = (row + [P("")]*8)[:8]
-            tbl_gen.append(row)
-
-        table_gen = Table(
-            tbl_gen, repeatRows=1, hAlign="LEFT",
-            colWidths=colw_generales, splitByRow=1   # <— clave para cortes limpios
-        )
-        ts_gen = base_style()
-        ts_gen.add("ALIGN", (0,1), (0,-1), "CENTER")   # No.
-        ts_gen.add("ALIGN", (1,1), (1,-1), "CENTER")   # CCT
-        ts_gen.add("ALIGN", (3,1), (3,-1), "CENTER")   # Turno
-        ts_gen.add("ALIGN", (6,1), (7,-1), "CENTER")   # Zona/Sector
-        table_gen.setStyle(ts_gen)
-        story.append(table_gen)
+            for idx, p in enumerate(d["planteles"], start=1)
+        ]
+        story.append(TablaPaginada(headers_generales, filas_gen, colw_generales, ts_gen))
         story.append(Spacer(1, 6))
 
         # -------- Tabla 2: Domicilio (mismas columnas SIEMPRE) --------
-        tbl_dom = [headers_dom]
-        for idx, p in enumerate(d["planteles"], start=1):
-            row = [
+        filas_dom = [
+            [
                 P(idx),
                 P(p.get("calle"), maxlen=120),
                 P(p.get("num_exterior")), P(p.get("num_interior")),
@@ -992,19 +911,9 @@ def reporte_ccts_pdf():
                 P(p.get("municipio")),
                 P(p.get("cp")), P(p.get("coordenadas_gps"), maxlen=120),
             ]
-            row = (row + [P("")]*11)[:11]
-            tbl_dom.append(row)
-
-        table_dom = Table(
-            tbl_dom, repeatRows=1, hAlign="LEFT",
-            colWidths=colw_dom, splitByRow=1       # <— evita desacomodos
-        )
-        ts_dom = base_style()
-        ts_dom.add("ALIGN", (0,1), (0,-1), "CENTER")   # No.
-        ts_dom.add("ALIGN", (2,1), (3,-1), "CENTER")   # No.Ext/No.Int
-        ts_dom.add("ALIGN", (9,1), (9,-1), "CENTER")   # CP
-        table_dom.setStyle(ts_dom)
-        story.append(table_dom)
+            for idx, p in enumerate(d["planteles"], start=1)
+        ]
+        story.append(TablaPaginada(headers_dom, filas_dom, colw_dom, ts_dom))
 
         if i < len(data["delegaciones"]) - 1:
             story.append(PageBreak())
@@ -1012,100 +921,59 @@ def reporte_ccts_pdf():
     doc.build(story)
     pdf = buffer.getvalue()
     buffer.close()
+    return pdf
 
-    filename = f"planteles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    return send_file(BytesIO(pdf), as_attachment=True, download_name=filename, mimetype="application/pdf")
 
-@delegaciones_bp.route("/personal/reporte/excel")
+@delegaciones_bp.route("/planteles/reporte/pdf")
 @login_required
-def reporte_personal_excel():
-    delegacion_id = request.args.get("delegacion_id", type=int)
-    if current_user.rol == "delegado" and (not delegacion_id or delegacion_id != current_user.delegacion_id):
-        abort(403)
-    data = _fetch_personal_por_cct()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Resumen"
-
-    bold = Font(bold=True)
-    center = Alignment(horizontal="center", vertical="center")
-    header_fill = PatternFill(start_color="ECECEC", end_color="ECECEC", fill_type="solid")
-    thin = Side(style="thin", color="AAAAAA")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-    # Cabecera
-    ws.merge_cells("A1:E1")
-    ws["A1"] = "REPORTE DE PERSONAL POR CCT"
-    ws["A1"].font = Font(size=14, bold=True); ws["A1"].alignment = center
-    ws.merge_cells("A2:E2")
-    ws["A2"] = f"Generado por: {data['generado_por']}  |  Fecha: {data['generado_en']}"
-    ws["A2"].alignment = center
-    ws.append([])
-
-    fila = 4
+def reporte_ccts_pdf():
+    filename = f"planteles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    return reporte_cacheado("planteles", "pdf", _fetch_ccts_grouped_by_delegacion,
+                            _pdf_reporte_ccts, filename, "application/pdf")
+
+def _excel_reporte_personal(data):
+    wb = nuevo_workbook()
+
+    # Cabecera + totales por delegación
+    ws = HojaStream(wb, "Resumen", muestra=None)
+    ws.titulo("REPORTE DE PERSONAL POR CCT", combinar=5)
+    ws.titulo(f"Generado por: {data['generado_por']}  |  Fecha: {data['generado_en']}", estilo="centrado", combinar=5)
+    ws.vacia()
+    for d in data["delegaciones"]:
+        ws.fila([f"Delegación: {d['nombre']} — {d['nivel']}"], estilo=None)
+        ws.encabezado(["Hombres", "Mujeres", "Total"])
+        ws.fila([d["totales"]["hombres"], d["totales"]["mujeres"], d["totales"]["total"]], estilo=None)
+        ws.vacia()
+    ws.cerrar()
+
+    # Hoja detalle por delegación (una por cada delegación)
     for d in data["delegaciones"]:
-        ws.append([f"Delegación: {d['nombre']} — {d['nivel']}"])
-        ws.append(["Hombres", "Mujeres", "Total"])
-        for c in ws[fila+1]:
-            c.font = bold; c.fill = header_fill; c.alignment = center; c.border = border
-        ws.append([d["totales"]["hombres"], d["totales"]["mujeres"], d["totales"]["total"]])
-        fila += 3
-        ws.append([]); fila += 1
-
-        # Hoja detalle por delegación (una por cada delegación)
         sheet_name = f"{d['nombre']}"[:31] if d['nombre'] else f"Deleg_{d['id']}"
-        ws_det = wb.create_sheet(sheet_name)
+        ws_det = HojaStream(wb, sheet_name, ancho_max=40, margen=3, muestra=None, freeze="A3")
 
-        # Encabezado hoja
         titulo = f"{d['nombre']} — {d['nivel']}  |  H: {d['totales']['hombres']}  M: {d['totales']['mujeres']}  T: {d['totales']['total']}"
-        ws_det.merge_cells(start_row=1, start_column=1, end_row=1, end_column=6 + len(d["funciones_orden"]))
-        ws_det.cell(row=1, column=1, value=titulo).font = Font(size=12, bold=True)
-        ws_det.cell(row=1, column=1).alignment = center
-
-        # Encabezados
-        headers = ["CCT", "Plantel", "H", "M", "Total"]
-        headers += d["funciones_orden"]  # columnas dinámicas por función
-        ws_det.append(headers)
-        for cell in ws_det[2]:
-            cell.font = bold; cell.fill = header_fill; cell.alignment = center; cell.border = border
-
-        # Filas
+        ws_det.titulo(titulo, estilo="subtitulo", combinar=6 + len(d["funciones_orden"]))
+
+        # Encabezados (columnas dinámicas por función)
+        ws_det.encabezado(["CCT", "Plantel", "H", "M", "Total"] + d["funciones_orden"])
         for n in d["planteles"]:
-            fila_vals = [n["cct"], n["plantel"], n["hombres"], n["mujeres"], n["total"]]
-            for f in d["funciones_orden"]:
-                fila_vals.append(n["funciones"].get(f, 0))
-            ws_det.append(fila_vals)
-
-        # Bordes y anchos
-        col_count = 5 + len(d["funciones_orden"])
-        for row in ws_det.iter_rows(min_row=2, max_row=ws_det.max_row, min_col=1, max_col=col_count):
-            for c in row:
-                c.border = border
-
-        for col_idx in range(1, col_count + 1):
-            # ancho automático aproximado
-            max_len = 0
-            for r in range(1, ws_det.max_row + 1):
-                v = ws_det.cell(row=r, column=col_idx).value
-                max_len = max(max_len, len(str(v)) if v is not None else 0)
-            ws_det.column_dimensions[get_column_letter(col_idx)].width = min(max_len + 3, 40)
-
-        ws_det.freeze_panes = "A3"
-
-    output = BytesIO()
-    wb.save(output); output.seek(0)
-    filename = f"personal_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return send_file(output, as_attachment=True, download_name=filename,
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            ws_det.fila([n["cct"], n["plantel"], n["hombres"], n["mujeres"], n["total"]]
+                        + [n["funciones"].get(f, 0) for f in d["funciones_orden"]])
+        ws_det.cerrar()
 
-@delegaciones_bp.route("/personal/reporte/pdf")
+    return xlsx_bytes(wb)
+
+@delegaciones_bp.route("/personal/reporte/excel")
 @login_required
-def reporte_personal_pdf():
+def reporte_personal_excel():
     delegacion_id = request.args.get("delegacion_id", type=int)
     if current_user.rol == "delegado" and (not delegacion_id or delegacion_id != current_user.delegacion_id):
         abort(403)
-    data = _fetch_personal_por_cct()
+    filename = f"personal_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return reporte_cacheado("personal", "xlsx", _fetch_personal_por_cct,
+                            _excel_reporte_personal, filename, XLSX_MIMETYPE)
+
+def _pdf_reporte_personal(data):
 
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=landscape(letter),
@@ -1117,6 +985,20 @@ def reporte_personal_pdf():
     def P(txt, bold=False):
         return Paragraph("" if txt is None else str(txt), small_bold if bold else small)
 
+    # Mismo estilo para las tablas de todas las delegaciones
+    estilo_tabla = TableStyle([
+        ("FONTSIZE", (0,0), (-1,-1), 7.5),
+        ("LEADING", (0,0), (-1,-1), 9),
+        ("VALIGN", (0,0), (-1,-1), "TOP"),
+        ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
+        ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#F5F5F5")),
+        ("ALIGN", (0,0), (-1,0), "CENTER"),
+        ("ALIGN", (0,1), (0,-1), "CENTER"),  # No.
+        ("ALIGN", (1,1), (1,-1), "CENTER"),  # CCT
+        ("ALIGN", (3,1), (5,-1), "CENTER"),  # H M T
+        ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.white, colors.HexColor("#FAFAFA")]),
+    ])
+
     story = []
     story.append(Paragraph("<b>REPORTE DE PERSONAL POR CCT</b>", styles["Title"]))
     story.append(Paragraph(f"Generado por: {data['generado_por']} &nbsp;&nbsp;|&nbsp;&nbsp; Fecha: {data['generado_en']}", styles["Normal"]))
@@ -1132,12 +1014,12 @@ def reporte_personal_pdf():
         for f in d["funciones_orden"]:
             headers.append(P(f, True))
 
-        tbl_data = [headers]
+        filas = []
         for idx, n in enumerate(d["planteles"], start=1):
             row = [P(idx), P(n["cct"]), P(n["plantel"]), P(n["hombres"]), P(n["mujeres"]), P(n["total"])]
             for f in d["funciones_orden"]:
                 row.append(P(n["funciones"].get(f, 0)))
-            tbl_data.append(row)
+            filas.append(row)
 
         # colWidths compactos (ajusta si tienes muchas funciones)
         base_widths = [0.8*cm, 2.0*cm, 6.5*cm, 1.2*cm, 1.2*cm, 1.2*cm]
@@ -1145,28 +1027,25 @@ def reporte_personal_pdf():
         func_widths = [2.0*cm] * func_cols  # cada función a 2.0 cm
         col_widths = base_widths + func_widths
 
-        table = Table(tbl_data, repeatRows=1, hAlign="LEFT", colWidths=col_widths, splitByRow=1)
-        table.setStyle(TableStyle([
-            ("FONTSIZE", (0,0), (-1,-1), 7.5),
-            ("LEADING", (0,0), (-1,-1), 9),
-            ("VALIGN", (0,0), (-1,-1), "TOP"),
-            ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
-            ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#F5F5F5")),
-            ("ALIGN", (0,0), (-1,0), "CENTER"),
-            ("ALIGN", (0,1), (0,-1), "CENTER"),  # No.
-            ("ALIGN", (1,1), (1,-1), "CENTER"),  # CCT
-            ("ALIGN", (3,1), (5,-1), "CENTER"),  # H M T
-            ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.white, colors.HexColor("#FAFAFA")]),
-        ]))
-        story.append(table)
+        story.append(TablaPaginada(headers, filas, col_widths, estilo_tabla))
 
         if i < len(data["delegaciones"]) - 1:
             story.append(PageBreak())
 
     doc.build(story)
     pdf = buffer.getvalue(); buffer.close()
+    return pdf
+
+
+@delegaciones_bp.route("/personal/reporte/pdf")
+@login_required
+def reporte_personal_pdf():
+    delegacion_id = request.args.get("delegacion_id", type=int)
+    if current_user.rol == "delegado" and (not delegacion_id or delegacion_id != current_user.delegacion_id):
+        abort(403)
     filename = f"personal_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    return send_file(BytesIO(pdf), as_attachment=True, download_name=filename, mimetype="application/pdf")
+    return reporte_cacheado("personal", "pdf", _fetch_personal_por_cct,
+                            _pdf_reporte_personal, filename, "application/pdf")
 
 @delegaciones_bp.route('/agregar_delegacion', methods=['POST'])
 @roles_required('admin', 'coordinador')
@@ -1217,61 +1096,179 @@ def tabla_personal_delegacion(delegacion_id):
         can_edit=can_edit
     )
 
-# ---------- API: listar (GET remoto para Tabulator) ----------
-@delegaciones_bp.route('/api/delegaciones/<int:delegacion_id>/personal')
-@login_required
-def api_listar_personal(delegacion_id):
-    Delegacion.query.get_or_404(delegacion_id)
-    if current_user.rol == "delegado" and current_user.delegacion_id != delegacion_id:
-        abort(403)
+def _marca_personal_delegacion(delegacion_id):
+    """
+    Marca de cambios del personal de una delegación en UNA consulta agregada:
+    (filas, max(updated_at), sum(version)). Cualquier alta/edición mueve
+    updated_at y version; una eliminación mueve el conteo (eso último sólo
+    lo ve el ETag, no Last-Modified).
+    """
+    return tuple(db.session.query(func.count(Personal.id),
+                                  func.max(Personal.updated_at),
+                                  func.sum(Personal.version))
+                 .join(Plantel, Personal.cct == Plantel.cct)
+                 .filter(Plantel.delegacion_id == delegacion_id)
+                 .one())
+
+
+def _validadores_personal(tipo, delegacion_id, marca=None):
+    """(etag, last_modified) para `tipo` con los parámetros de la petición."""
+    marca = marca or _marca_personal_delegacion(delegacion_id)
+    return etag_de(tipo, delegacion_id, marca, request.query_string), marca[1]
+
 
+# Totales ya contados por (alcance, firma de filtros, marca de datos): paginar
+# u ordenar la misma vista no repite el count().
+_CONTEOS = CacheConteos()
+
+
+def _total_personal(q, alcance, filters, sin_filtros=None):
+    """
+    Total de la lista. Sin filtros usa `sin_filtros` si el llamador ya lo
+    conoce (p. ej. el conteo de la marca); si no, el count() en caché. La marca
+    de personal/plantel se mueve con cada escritura, así que un cambio de
+    datos cuenta de nuevo.
+    """
+    firma = firma_filtros(filters, _col_personal)
+    if not firma and sin_filtros is not None:
+        return sin_filtros
+    clave = (*alcance, firma, marca_datos(("personal", "plantel")))
+    return _CONTEOS.contar(clave, lambda: q.order_by(None).count())
+
+
+# Columnas por vista (?vista=). "tabla" es el grid editable de la delegación:
+# arma sus columnas con lo que llega y devuelve `version` al guardar.
+CAMPOS_VISTA_PERSONAL = {
+    "tabla": [c.name for c in Personal.__table__.columns if c.name != "num"],
+    "lista": [
+        "id", "cct", "escuela_nombre", "apellido_paterno", "apellido_materno", "nombre",
+        "genero", "rfc", "curp", "clave_presupuestal", "funcion", "funcion_coordinacion",
+        "nombramiento", "estatus_membresia", "fecha_ingreso", "nivel", "turno",
+        "tel1", "correo_electronico", "updated_at",
+    ],
+}
+
+
+def _campos_personal(vista):
+    """?fields=a,b,c manda; si no, ?vista= o la vista por defecto de la ruta."""
+    fields = request.args.get("fields")
+    if fields:
+        return [f.strip() for f in fields.split(",") if f.strip()]
+    return CAMPOS_VISTA_PERSONAL.get(request.args.get("vista"), CAMPOS_VISTA_PERSONAL[vista])
+
+
+def _listar_personal(q, etag, ultimo, alcance, total_sin_filtros=None, estimable=False, vista="tabla"):
+    """
+    Respuesta de Tabulator (página/size o ?cursor=) sobre `q` ya limitado al
+    alcance, sólo con las columnas de la vista / ?fields=. `estimable`: con
+    ?conteo=estimado y sin filtros, el total sale de las estadísticas del
+    planificador ("total_estimado": true).
+    """
+    # ?cursor= (vacío en la primera página) activa la paginación por cursor
+    cursor = request.args.get("cursor")
     has_page = request.args.get("page") is not None
     has_size = request.args.get("size") is not None
-    page, size, sorters, filters = _parse_tabulator_args(request) if (has_page or has_size) else (None, None, [], [])
-
-    ALIAS = {
-        "puesto": Personal.funcion_coordinacion,
-        "estatus": Personal.estatus_membresia,
-        "telefono": Personal.tel1,
-        "correo": Personal.correo_electronico,
-    }
+    # ?format=columnar: arreglos por columna; sin page/cursor trae todo (carga del grid)
+    columnar = request.args.get("format") == "columnar"
+    con_args = has_page or has_size or cursor is not None or columnar
+    page, size, sorters, filters = _parse_tabulator_args(request) if con_args else (None, None, [], [])
+    if columnar and not has_page and cursor is None:
+        page = size = None
 
-    q = (Personal.query
-         .join(Plantel, Personal.cct == Plantel.cct)
-         .filter(Plantel.delegacion_id == delegacion_id))
+    def cuerpo(rows):
+        if columnar:
+            return {"format": "columnar", **pr.columnar(rows)}
+        return {"data": pr.dicts(rows)}
 
-    # filtros
-    for f in filters:
-        field = (f or {}).get("field"); value = (f or {}).get("value")
-        if not field or value in (None, ""): continue
-        col = getattr(Personal, field, None) or ALIAS.get(field)
-        if col is not None: q = q.filter(col.ilike(f"%{value}%"))
+    q = _filtrar_personal(q, filters)
 
     # orden
+    claves = []
     for s in sorters:
         field = (s or {}).get("field"); direction = (s or {}).get("dir", "asc")
-        col = getattr(Personal, field, None) or ALIAS.get(field)
-        if col is not None: q = q.order_by(col.asc() if direction == "asc" else col.desc())
+        col = _col_personal(field)
+        if col is not None: claves.append((col, direction))
+
+    # filas Core sólo con las columnas pedidas (+ las claves de orden, que el cursor lee)
+    pr = Proyeccion(Personal, _campos_personal(vista), _col_personal, extra=[col for col, _ in claves])
+
+    def total():
+        if estimable and request.args.get("conteo") == "estimado" and not firma_filtros(filters, _col_personal):
+            n = conteo_estimado(Personal)
+            if n is not None:
+                return n, True
+        return _total_personal(q, alcance, filters, total_sin_filtros), False
+
+    # paginación por cursor: WHERE (k1, k2, id) > (...) en vez de OFFSET
+    if cursor is not None:
+        ks = Keyset([*claves, (Personal.id, "asc")])
+        try:
+            rows = pr.seleccionar(ks.ordenar(ks.despues_de(q, cursor))).limit(size + 1).all()
+        except CursorInvalido as e:
+            return jsonify({"error": str(e)}), 400
+        siguiente = ks.cursor(rows[size - 1]) if len(rows) > size else None
+        datos = {**cuerpo(rows[:size]), "next_cursor": siguiente, "total": None}
+        if request.args.get("total") == "1":  # el conteo es opcional
+            datos["total"], estimado = total()
+            if estimado:
+                datos["total_estimado"] = True
+        return con_validadores(jsonify(datos), etag, ultimo)
+
+    for col, direction in claves:
+        q = q.order_by(col.asc() if direction == "asc" else col.desc())
 
     # paginación
+    estimado = False
     if page is None or size is None:
-        rows = q.all()
-        total = len(rows)
+        rows = pr.seleccionar(q).all()
+        n = len(rows)
         last_page = 1
     else:
-        total = q.count()
-        rows = q.offset((page - 1) * size).limit(size).all()
-        last_page = max(1, ceil(total / size))
+        n, estimado = total()
+        rows = pr.seleccionar(q).offset((page - 1) * size).limit(size).all()
+        last_page = max(1, ceil(n / size))
+
+    datos = {**cuerpo(rows), "total": n, "last_page": last_page}
+    if estimado:
+        datos["total_estimado"] = True
+    return con_validadores(jsonify(datos), etag, ultimo)
+
+
+# ---------- API: listar (GET remoto para Tabulator) ----------
+@delegaciones_bp.route('/api/delegaciones/<int:delegacion_id>/personal')
+@login_required
+def api_listar_personal(delegacion_id):
+    Delegacion.query.get_or_404(delegacion_id)
+    if current_user.rol == "delegado" and current_user.delegacion_id != delegacion_id:
+        abort(403)
+
+    # 304 antes de consultar filas
+    marca = _marca_personal_delegacion(delegacion_id)
+    etag, ultimo = _validadores_personal("personal", delegacion_id, marca)
+    r304 = no_modificado(etag, ultimo)
+    if r304:
+        return r304
+
+    q = (Personal.query
+         .join(Plantel, Personal.cct == Plantel.cct)
+         .filter(Plantel.delegacion_id == delegacion_id))
+    # sin filtros el total ya viene en la marca (count de la delegación)
+    return _listar_personal(q, etag, ultimo, ("delegacion", delegacion_id), total_sin_filtros=marca[0])
 
-    cols = [c.name for c in Personal.__table__.columns]
-    def to_dict(p): 
-        d = {}
-        for c in cols:
-            v = getattr(p, c, None)
-            d[c] = v.isoformat() if hasattr(v, "isoformat") else v
-        return d
 
-    return jsonify({"data": [to_dict(r) for r in rows], "total": total, "last_page": last_page})
+@delegaciones_bp.route('/api/personal', endpoint='api_listar_personal_estatal')
+@roles_required('secretario')  # admin siempre pasa
+def api_listar_personal_estatal():
+    """
+    Lista estatal (columnas de la vista "lista" salvo ?fields=); ?conteo=estimado
+    usa la estimación del planificador si no hay filtros.
+    """
+    marca = marca_datos(("personal",))
+    etag = etag_de("personal_estatal", marca, request.query_string)
+    r304 = no_modificado(etag)
+    if r304:
+        return r304
+    return _listar_personal(Personal.query, etag, None, ("estatal",), estimable=True, vista="lista")
 
 
 
@@ -1330,13 +1327,6 @@ def api_guardar_personal_bulk(delegacion_id):
             return v if v != "" else None
         return val
 
-    # helper: compara updated_at tolerando tz/precisión
-    def _dt_sig(s: str):
-        # toma solo 'YYYY-mm-ddTHH:MM:SS'
-        if not s or not isinstance(s, str):
-            return None
-        return s[:19]
-
     # ✅ catálogo permitido para funcion_coordinacion + normalización
     ALLOWED_FUNC_COORD = {
         "DIRECTOR (A)",
@@ -1373,57 +1363,69 @@ def api_guardar_personal_bulk(delegacion_id):
 
         return s if s in ALLOWED_FUNC_COORD else None
     
-    def _cachear_plantel_en_personal(persona, plantel):
+    def _cache_plantel(plantel):
         # Campos “cache” en Personal que reflejan al Plantel
-        persona.escuela_nombre = plantel.nombre
-        persona.turno = plantel.turno
-        persona.nivel = plantel.nivel
-        persona.subs_modalidad = getattr(plantel, "modalidad", None)
-        persona.zona_escolar = plantel.zona_escolar
-        persona.sector = plantel.sector
-
-        persona.dom_esc_calle = plantel.calle
-        persona.dom_esc_num_ext = plantel.num_exterior
-        persona.dom_esc_num_int = plantel.num_interior
-        persona.dom_esc_cruce1 = plantel.cruce_1
-        persona.dom_esc_cruce2 = plantel.cruce_2
-        persona.dom_esc_localidad = plantel.localidad
-        persona.dom_esc_colonia = plantel.colonia
-        persona.dom_esc_mun_nom = plantel.municipio
-        persona.dom_esc_cp = plantel.cp
-        persona.dom_esc_coordenadas_gps = plantel.coordenadas_gps
-
-        # Otros (si los usas en Personal como “cache” institucional)
-        persona.estado = plantel.estado
-
-
-    actualizados = 0
+        return {
+            "escuela_nombre": plantel.nombre,
+            "turno": plantel.turno,
+            "nivel": plantel.nivel,
+            "subs_modalidad": getattr(plantel, "modalidad", None),
+            "zona_escolar": plantel.zona_escolar,
+            "sector": plantel.sector,
+
+            "dom_esc_calle": plantel.calle,
+            "dom_esc_num_ext": plantel.num_exterior,
+            "dom_esc_num_int": plantel.num_interior,
+            "dom_esc_cruce1": plantel.cruce_1,
+            "dom_esc_cruce2": plantel.cruce_2,
+            "dom_esc_localidad": plantel.localidad,
+            "dom_esc_colonia": plantel.colonia,
+            "dom_esc_mun_nom": plantel.municipio,
+            "dom_esc_cp": plantel.cp,
+            "dom_esc_coordenadas_gps": plantel.coordenadas_gps,
+
+            # Otros (si los usas en Personal como “cache” institucional)
+            "estado": plantel.estado,
+        }
 
+    # --- IDs robustos ---
+    por_id = {}
     for r in rows:
-        # --- ID robusto ---
-        pid_raw = r.get("id")
+        pid_raw = (r or {}).get("id")
         try:
-            pid = int(pid_raw)
+            por_id[int(pid_raw)] = r
         except (TypeError, ValueError):
             if debug: skips.append({"id": pid_raw, "razon": "id_invalido"})
-            continue
 
-        # Asegura que la persona pertenezca a la delegación (JOIN con Plantel)
-        persona = (Personal.query
-                   .join(Plantel, Personal.cct == Plantel.cct)
-                   .filter(Personal.id == pid, Plantel.delegacion_id == delegacion_id)
-                   .first())
+    # Una sola lectura: personas de la delegación (JOIN con Plantel) y CCTs destino
+    personas = {}
+    if por_id:
+        personas = {p.id: p for p in (Personal.query
+                                      .join(Plantel, Personal.cct == Plantel.cct)
+                                      .filter(Personal.id.in_(por_id.keys()),
+                                              Plantel.delegacion_id == delegacion_id))}
+    ccts = {_norm_empty(r.get("cct")) for r in por_id.values()} - {None}
+    planteles = {p.cct: p for p in Plantel.query.filter(Plantel.cct.in_(ccts))} if ccts else {}
+
+    actualizados = 0
+    conflictos = []
+    historial = []  # (id, (campo, antes, después)) de las filas que sí se actualizaron
+
+    for pid, r in por_id.items():
+        persona = personas.get(pid)
         if not persona:
             if debug: skips.append({"id": pid, "razon": "no_pertenece_delegacion_o_no_existe"})
             continue
 
-        # Bloqueo optimista (tolerante)
-        client_updated_at = r.get("updated_at")
-        server_updated_at = getattr(persona, "updated_at", None)
-        if client_updated_at and server_updated_at:
-            if _dt_sig(server_updated_at.isoformat()) != _dt_sig(client_updated_at):
-                if debug: skips.append({"id": pid, "razon": "conflicto_updated_at"})
-                continue
+        # Bloqueo optimista: la versión con la que el cliente cargó la fila.
+        # Sin versión (cliente viejo) se usa la leída arriba.
+        try:
+            version = int(r["version"]) if r.get("version") is not None else persona.version
+        except (TypeError, ValueError):
+            version = persona.version
+        if version != persona.version:
+            conflictos.append({"id": pid, "version": version})
+            continue
 
         cambios = []
         for k, v in r.items():
@@ -1442,16 +1444,15 @@ def api_guardar_personal_bulk(delegacion_id):
                 v = v.strip().upper() or None
 
             if attr in ("fecha_ingreso", "fecha_baja_jubilacion") and isinstance(v, str) and v:
-                from datetime import datetime as _dt
                 try:
-                    v = _dt.strptime(v[:10], "%Y-%m-%d").date()
+                    v = datetime.strptime(v[:10], "%Y-%m-%d").date()
                 except ValueError:
                     if debug: skips.append({"id": pid, "campo": attr, "razon": "fecha_invalida"})
                     continue
 
             # Validación FK del CCT si cambia
             if attr == "cct" and v and v != (persona.cct or ""):
-                if not Plantel.query.filter_by(cct=v).first():
+                if v not in planteles:
                     if debug: skips.append({"id": pid, "campo": "cct", "razon": "cct_inexistente"})
                     continue
 
@@ -1466,42 +1467,48 @@ def api_guardar_personal_bulk(delegacion_id):
 
             prev = getattr(persona, attr, None)
             if v != prev:
-                setattr(persona, attr, v)
                 cambios.append((attr, prev, v))
 
-        if cambios:
-            if hasattr(persona, "updated_at"):
-                persona.updated_at = datetime.now(timezone('America/Mexico_City'))
-            # Si el CCT cambió, recalcular cache desde Plantel
-            cambio_cct = any(campo == "cct" for campo, _, _ in cambios)
-            if cambio_cct:
-                p = Plantel.query.filter_by(cct=persona.cct).first()
-                if p:
-                    _cachear_plantel_en_personal(persona, p)
-                    # (Opcional) también podrías registrar en historial campos cacheados, pero no es necesario
-
-            db.session.add(persona)
-            db.session.flush()
-
-            for campo, antes, despues in cambios:
-                try:
-                    registrar_historial(
-                        entidad="personal",
-                        campo=campo,
-                        valor_anterior=antes,
-                        valor_nuevo=despues,
-                        entidad_id=persona.id,
-                        usuario=getattr(current_user, "nombre", "sistema"),
-                        tipo="edicion masiva"
-                    )
-                except Exception:
-                    pass
-            actualizados += 1
-        else:
+        if not cambios:
             if debug: skips.append({"id": pid, "razon": "sin_cambios"})
+            continue
+
+        valores = {campo: despues for campo, _, despues in cambios}
+        # Si el CCT cambió, recalcular cache desde Plantel
+        if "cct" in valores and valores["cct"] in planteles:
+            valores.update(_cache_plantel(planteles[valores["cct"]]))
+
+        # UPDATE ... WHERE id = :id AND version = :version (version/updated_at por onupdate)
+        res = db.session.execute(
+            update(Personal)
+            .where(Personal.id == pid, Personal.version == version)
+            .values(**valores)
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount == 0:
+            conflictos.append({"id": pid, "version": version})
+            continue
+
+        historial.extend((pid, c) for c in cambios)
+        actualizados += 1
 
+    # Los UPDATE van en una sola transacción (un solo incremento de versiones_tabla);
+    # registrar_historial hace commit por campo, por eso va después
     db.session.commit()
-    resp = {"ok": True, "actualizados": actualizados}
+    for pid, (campo, antes, despues) in historial:
+        try:
+            registrar_historial(
+                entidad="personal",
+                campo=campo,
+                valor_anterior=antes,
+                valor_nuevo=despues,
+                entidad_id=pid,
+                usuario=getattr(current_user, "nombre", "sistema"),
+                tipo="edicion masiva"
+            )
+        except Exception:
+            pass
+    resp = {"ok": True, "actualizados": actualizados, "conflictos": conflictos}
     if debug:
         resp["skips"] = skips
     return jsonify(resp)
@@ -1516,6 +1523,11 @@ def api_resumen_personal(delegacion_id):
         from flask import abort
         abort(403)
 
+    etag, ultimo = _validadores_personal("resumen", delegacion_id)
+    r304 = no_modificado(etag, ultimo)
+    if r304:
+        return r304
+
     # 👉 lee parámetro (por si un día quieres incluirlos desde la UI)
     excluir_en_proceso = (request.args.get("excluir_baja_en_proceso", "1") == "1")
 
@@ -1552,10 +1564,113 @@ def api_resumen_personal(delegacion_id):
     tot_total = sum(v["total"] for v in funciones_map.values())
     funciones_list = sorted(funciones_map.values(), key=lambda x: x["funcion"])
 
-    return jsonify({
+    return con_validadores(jsonify({
         "totales": {"hombres": tot_h, "mujeres": tot_m, "total": tot_total},
         "funciones": funciones_list
-    })
+    }), etag, ultimo)
+
+
+# ---------- Exportación de personal (Excel / CSV / NDJSON) ----------
+# Alias opcionales (compatibles con la UI)
+ALIAS_PERSONAL = {
+    "puesto": Personal.funcion_coordinacion,
+    "estatus": Personal.estatus_membresia,
+    "telefono": Personal.tel1,
+    "correo": Personal.correo_electronico,
+}
+
+EXPORT_OCULTOS = {"num", "id", "version"}
+
+EXPORT_ORDEN = [
+    "apellido_paterno","apellido_materno","nombre","genero","rfc","curp",
+    "clave_presupuestal","funcion_coordinacion","funcion","grado_estudios","titulado",
+    "fecha_ingreso","fecha_baja_jubilacion","estatus_membresia","nombramiento",
+    "domicilio","numero","dp_num_int","dp_cruce1","dp_cruce2",
+    "localidad","colonia","municipio","cp","tel1","tel2","correo_electronico",
+    "escuela_nombre","cct","turno","nivel","subs_modalidad","zona_escolar","sector",
+    "dom_esc_calle","dom_esc_num_ext","dom_esc_num_int","dom_esc_cruce1","dom_esc_cruce2",
+    "dom_esc_localidad","dom_esc_colonia","dom_esc_mun_nom","dom_esc_cp","dom_esc_coordenadas_gps",
+    "estado","seccion_snte","del_o_ct","org","coord_reg","fun_sin",
+    "updated_at"
+]
+
+
+EXPORT_TITULOS = {
+    "apellido_paterno":"PATERNO","apellido_materno":"MATERNO","nombre":"NOMBRE",
+    "genero":"GENERO","rfc":"RFC","curp":"CURP","clave_presupuestal":"CLAVE_PRESUPUESTAL",
+    "funcion_coordinacion":"FUNCION_COORDINACION","funcion":"FUNCION","grado_estudios":"GRADO_MAXIMO_ESTUDIOS","titulado":"TITULADO",
+    "fecha_ingreso":"FECHA_INGRESO","fecha_baja_jubilacion":"FCH_BAJ_JUB",
+    "estatus_membresia":"STATUS_MEMB","nombramiento":"NOMBRAMIENTO",
+    "domicilio":"DP_CALLE","numero":"DP_NUM_EXT","dp_num_int":"DP_NUM_INT",
+    "dp_cruce1":"DP_CRUCE1","dp_cruce2":"DP_CRUCE2","localidad":"DP_LOCALIDAD",
+    "colonia":"DP_COLONIA","municipio":"DP_MUN_NOM","cp":"DP_CP",
+    "tel1":"DP_TEL1","tel2":"DP_TEL2","correo_electronico":"CORREO_ELECTRONICO",
+    "escuela_nombre":"ESCUELA_NOMBRE","cct":"CCT","turno":"TURNO","nivel":"NIVEL",
+    "subs_modalidad":"SUBS_MODALIDAD","zona_escolar":"ZONA_ESCOLAR","sector":"SECTOR",
+    "dom_esc_calle":"DOM_ESC_CALLE","dom_esc_num_ext":"DOM_ESC_NUM_EXT","dom_esc_num_int":"DOM_ESC_NUM_INT",
+    "dom_esc_cruce1":"DOM_ESC_CRUCE1","dom_esc_cruce2":"DOM_ESC_CRUCE2",
+    "dom_esc_localidad":"DOM_ESC_LOCALIDAD","dom_esc_colonia":"DOM_ESC_COLONIA",
+    "dom_esc_mun_nom":"DOM_ESC_MUN_NOM","dom_esc_cp":"DOM_ESC_CP","dom_esc_coordenadas_gps":"DOM_ESC_COORDENADAS GPS",
+    "estado":"ESTADO","seccion_snte":"SECCION_SNTE","del_o_ct":"DEL_O_CT","org":"ORG","coord_reg":"COORD_REG","fun_sin":"FUN_SIN",
+    "updated_at":"UPDATED_AT"
+}
+
+
+
+def _columnas_export_personal():
+    """Columnas de Personal a exportar, en el orden de EXPORT_ORDEN y luego el resto."""
+    todas = [c.name for c in Personal.__table__.columns]
+    cols = [c for c in EXPORT_ORDEN if c in todas and c not in EXPORT_OCULTOS]
+    cols += [c for c in todas if c not in cols and c not in EXPORT_OCULTOS]
+    return cols
+
+
+def _col_personal(field):
+    """Columna de Personal (o alias) para `field`; relaciones, métodos y nombres desconocidos dan None."""
+    if field in Personal.__table__.c:
+        return getattr(Personal, field)
+    return ALIAS_PERSONAL.get(field)
+
+
+def _filtrar_personal(q, filters):
+    """Filtros de Tabulator (ilike %valor%) sobre columnas de Personal o alias."""
+    for f in filters:
+        field = (f or {}).get("field")
+        value = (f or {}).get("value")
+        if not field or value in (None, ""):
+            continue
+        col = _col_personal(field)
+        if col is None:
+            continue
+        q = q.filter(col.ilike(f"%{value}%"))
+    return q
+
+
+def _ordenar_personal(q, sorters):
+    for srt in sorters:
+        field = (srt or {}).get("field")
+        direction = (srt or {}).get("dir", "asc")
+        col = _col_personal(field)
+        if col is None:
+            continue
+        q = q.order_by(col.asc() if direction == "asc" else col.desc())
+    return q
+
+
+def _query_export_personal(cols, sorters, filters, delegacion_id=None):
+    """
+    Tuplas (sin hidratar Personal) con `cols`, sin BAJA / BAJA EN PROCESO.
+    Con delegacion_id se limita a los planteles de esa delegación; sin él es estatal.
+    """
+    query = db.session.query(*[getattr(Personal, c) for c in cols])
+    if delegacion_id is not None:
+        query = (query.join(Plantel, Personal.cct == Plantel.cct)
+                 .filter(Plantel.delegacion_id == delegacion_id))
+
+    # ⛔ EXCLUIR BAJA EN PROCESO y BAJA
+    query = query.filter(~Personal.estatus_membresia.in_(["BAJA EN PROCESO", "BAJA"]))
+    query = _filtrar_personal(query, filters)
+    return _ordenar_personal(query, sorters)
 
 
 @delegaciones_bp.route('/api/delegaciones/<int:delegacion_id>/personal/export-excel', endpoint='api_exportar_personal_excel')
@@ -1567,142 +1682,24 @@ def api_exportar_personal_excel(delegacion_id):
         from flask import abort
         abort(403)
 
-    # Base query: solo personal de la delegación
-    base_query = (Personal.query
-                  .join(Plantel, Personal.cct == Plantel.cct)
-                  .filter(Plantel.delegacion_id == delegacion_id))
-
-    # ⛔ EXCLUIR BAJA EN PROCESO y BAJA (hazlo aquí; NO uses 'query' todavía)
-    base_query = base_query.filter(~Personal.estatus_membresia.in_(["BAJA EN PROCESO", "BAJA"]))
-
-    # Alias opcionales (compatibles con la UI)
-    ALIAS = {
-        "puesto": Personal.funcion_coordinacion,
-        "estatus": Personal.estatus_membresia,
-        "telefono": Personal.tel1,
-        "correo": Personal.correo_electronico,
-    }
-
-    # Reusar sorters/filters que manda Tabulator
     _, _, sorters, filters = _parse_tabulator_args(request)
+    ordered_cols = _columnas_export_personal()
+    query = _query_export_personal(ordered_cols, sorters, filters, delegacion_id)
 
-    # --- Aplicar filtros (para datos y para resumen) ---
-    def apply_filters(q):
-        for f in filters:
-            field = (f or {}).get("field")
-            value = (f or {}).get("value")
-            if not field or value in (None, ""):
-                continue
-            col = getattr(Personal, field, None) or ALIAS.get(field)
-            if col is None:
-                continue
-            q = q.filter(col.ilike(f"%{value}%"))
-        return q
-
-    # ==== Hoja 1: Datos ====
-    query = apply_filters(base_query)
-
-    # Orden
-    for s in sorters:
-        field = (s or {}).get("field")
-        direction = (s or {}).get("dir", "asc")
-        col = getattr(Personal, field, None) or ALIAS.get(field)
-        if col is None:
-            continue
-        query = query.order_by(col.asc() if direction == "asc" else col.desc())
-
-    rows = query.all()
-
-    # ---------- Columnas a exportar ----------
-    ALL_COLS = [c.name for c in Personal.__table__.columns]
-    HIDE_FIELDS = {"num", "id"}
-
-    DISPLAY_ORDER = [
-        "apellido_paterno","apellido_materno","nombre","genero","rfc","curp",
-        "clave_presupuestal","funcion_coordinacion","funcion","grado_estudios","titulado",
-        "fecha_ingreso","fecha_baja_jubilacion","estatus_membresia","nombramiento",
-        "domicilio","numero","dp_num_int","dp_cruce1","dp_cruce2",
-        "localidad","colonia","municipio","cp","tel1","tel2","correo_electronico",
-        "escuela_nombre","cct","turno","nivel","subs_modalidad","zona_escolar","sector",
-        "dom_esc_calle","dom_esc_num_ext","dom_esc_num_int","dom_esc_cruce1","dom_esc_cruce2",
-        "dom_esc_localidad","dom_esc_colonia","dom_esc_mun_nom","dom_esc_cp","dom_esc_coordenadas_gps",
-        "estado","seccion_snte","del_o_ct","org","coord_reg","fun_sin",
-        "updated_at"
-    ]
-
-    ordered_cols = [c for c in DISPLAY_ORDER if c in ALL_COLS and c not in HIDE_FIELDS]
-    for c in ALL_COLS:
-        if c not in ordered_cols and c not in HIDE_FIELDS:
-            ordered_cols.append(c)
-
-    EXCEL_TITLES = {
-        "apellido_paterno":"PATERNO","apellido_materno":"MATERNO","nombre":"NOMBRE",
-        "genero":"GENERO","rfc":"RFC","curp":"CURP","clave_presupuestal":"CLAVE_PRESUPUESTAL",
-        "funcion_coordinacion":"FUNCION_COORDINACION","funcion":"FUNCION","grado_estudios":"GRADO_MAXIMO_ESTUDIOS","titulado":"TITULADO",
-        "fecha_ingreso":"FECHA_INGRESO","fecha_baja_jubilacion":"FCH_BAJ_JUB",
-        "estatus_membresia":"STATUS_MEMB","nombramiento":"NOMBRAMIENTO",
-        "domicilio":"DP_CALLE","numero":"DP_NUM_EXT","dp_num_int":"DP_NUM_INT",
-        "dp_cruce1":"DP_CRUCE1","dp_cruce2":"DP_CRUCE2","localidad":"DP_LOCALIDAD",
-        "colonia":"DP_COLONIA","municipio":"DP_MUN_NOM","cp":"DP_CP",
-        "tel1":"DP_TEL1","tel2":"DP_TEL2","correo_electronico":"CORREO_ELECTRONICO",
-        "escuela_nombre":"ESCUELA_NOMBRE","cct":"CCT","turno":"TURNO","nivel":"NIVEL",
-        "subs_modalidad":"SUBS_MODALIDAD","zona_escolar":"ZONA_ESCOLAR","sector":"SECTOR",
-        "dom_esc_calle":"DOM_ESC_CALLE","dom_esc_num_ext":"DOM_ESC_NUM_EXT","dom_esc_num_int":"DOM_ESC_NUM_INT",
-        "dom_esc_cruce1":"DOM_ESC_CRUCE1","dom_esc_cruce2":"DOM_ESC_CRUCE2",
-        "dom_esc_localidad":"DOM_ESC_LOCALIDAD","dom_esc_colonia":"DOM_ESC_COLONIA",
-        "dom_esc_mun_nom":"DOM_ESC_MUN_NOM","dom_esc_cp":"DOM_ESC_CP","dom_esc_coordenadas_gps":"DOM_ESC_COORDENADAS GPS",
-        "estado":"ESTADO","seccion_snte":"SECCION_SNTE","del_o_ct":"DEL_O_CT","org":"ORG","coord_reg":"COORD_REG","fun_sin":"FUN_SIN",
-        "updated_at":"UPDATED_AT"
-    }
-
-    # ---------- Construir Excel ----------
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from openpyxl.utils import get_column_letter
-    from io import BytesIO
+    # ---------- Construir Excel (write_only, memoria constante) ----------
     from datetime import date, datetime as dt
 
-    wb = Workbook()
-
-    # Hoja 1: Datos
-    ws = wb.active
-    ws.title = "Personal"
-
-    bold = Font(bold=True)
-    center = Alignment(horizontal="center", vertical="center")
-    header_fill = PatternFill(start_color="ECECEC", end_color="ECECEC", fill_type="solid")
-    thin = Side(style="thin", color="AAAAAA")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    wb = nuevo_workbook()
 
-    ws.append([EXCEL_TITLES.get(c, c.upper()) for c in ordered_cols])
-    for cell in ws[1]:
-        cell.font = bold; cell.alignment = center; cell.fill = header_fill; cell.border = border
+    hoja = HojaStream(wb, "Personal", ancho_max=45, freeze="A2")
+    hoja.encabezado([EXPORT_TITULOS.get(c, c.upper()) for c in ordered_cols])
 
-    for p in rows:
-        vals = []
-        for c in ordered_cols:
-            v = getattr(p, c, "")
-            if isinstance(v, (dt, date)):
-                v = v.isoformat()
-            vals.append(v)
-        ws.append(vals)
-
-    for r in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=len(ordered_cols)):
-        for cell in r:
-            cell.border = border
-
-    for idx, c in enumerate(ordered_cols, start=1):
-        max_len = len(str(EXCEL_TITLES.get(c, c)))
-        for r in range(2, ws.max_row + 1):
-            val = ws.cell(row=r, column=idx).value
-            max_len = max(max_len, len(str(val)) if val is not None else 0)
-        ws.column_dimensions[get_column_letter(idx)].width = min(max_len + 3, 45)
-
-    ws.freeze_panes = "A2"
+    # Filas en bloques: el cursor trae EXPORT_CHUNK filas a la vez
+    for r in query.yield_per(EXPORT_CHUNK):
+        hoja.fila([v.isoformat() if isinstance(v, (dt, date)) else v for v in r])
+    hoja.cerrar()
 
     # ==== Hoja 2: Resumen ====
-    ws2 = wb.create_sheet("Resumen")
-
     sum_query = (db.session.query(Personal.funcion_coordinacion, Personal.genero, func.count(Personal.id))
                  .join(Plantel, Personal.cct == Plantel.cct)
                  .filter(Plantel.delegacion_id == delegacion_id))
@@ -1710,7 +1707,7 @@ def api_exportar_personal_excel(delegacion_id):
     # 💡 Mismo filtro de exclusión en el resumen
     sum_query = sum_query.filter(~Personal.estatus_membresia.in_(["BAJA EN PROCESO", "BAJA"]))
 
-    sum_query = apply_filters(sum_query)
+    sum_query = _filtrar_personal(sum_query, filters)
 
     funciones_map, tot_h, tot_m = {}, 0, 0
     for funcion_coord, genero, cnt in sum_query.group_by(Personal.funcion_coordinacion, Personal.genero).all():
@@ -1726,39 +1723,91 @@ def api_exportar_personal_excel(delegacion_id):
 
     tot_total = sum(v["total"] for v in funciones_map.values())
 
-    ws2.merge_cells("A1:D1")
-    ws2["A1"] = "RESUMEN POR FUNCIÓN DE COORDINACIÓN"
-    ws2["A1"].font = Font(size=14, bold=True)
-    ws2["A1"].alignment = center
-
-    ws2.append([])
-    ws2.append(["Hombres", "Mujeres", "Total"])
-    for c in ws2[3]:
-        c.font = bold; c.alignment = center; c.fill = header_fill; c.border = border
-    ws2.append([tot_h, tot_m, tot_total])
-
-    ws2.append([])
-    ws2.append(["Función de coordinación", "Hombres", "Mujeres", "Total"])
-    for c in ws2[6]:
-        c.font = bold; c.alignment = center; c.fill = header_fill; c.border = border
-
-    row_i = 7
+    res = HojaStream(wb, "Resumen", ancho_max=45)
+    res.titulo("RESUMEN POR FUNCIÓN DE COORDINACIÓN")
+    res.vacia()
+    res.encabezado(["Hombres", "Mujeres", "Total"])
+    res.fila([tot_h, tot_m, tot_total], estilo=None)
+    res.vacia()
+    res.encabezado(["Función de coordinación", "Hombres", "Mujeres", "Total"])
     for funcion in sorted(funciones_map.keys()):
         vals = funciones_map[funcion]
-        ws2.append([funcion, vals["hombres"], vals["mujeres"], vals["total"]])
-        for c in ws2[row_i]:
-            c.border = border
-        row_i += 1
-
-    for col_idx in range(1, 5):
-        max_len = 0
-        for r in range(1, ws2.max_row + 1):
-            val = ws2.cell(row=r, column=col_idx).value
-            max_len = max(max_len, len(str(val)) if val is not None else 0)
-        ws2.column_dimensions[get_column_letter(col_idx)].width = min(max_len + 3, 45)
-
-    output = BytesIO()
-    wb.save(output); output.seek(0)
+        res.fila([funcion, vals["hombres"], vals["mujeres"], vals["total"]])
+    res.cerrar()
+
     filename = f"personal_deleg_{delegacion_id}_{dt.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return send_file(output, as_attachment=True, download_name=filename,
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return respuesta_xlsx(wb, filename)
+
+
+# ---------- Exportación en streaming (CSV / NDJSON) ----------
+EXPORT_FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+EXPORT_BLOQUE_BYTES = 64 * 1024
+
+
+def _valor_export(v):
+    return v.isoformat() if isinstance(v, (datetime, date)) else v
+
+
+def _generar_csv(query, cols):
+    buf = StringIO()
+    w = csv.writer(buf)
+    w.writerow([EXPORT_TITULOS.get(c, c.upper()) for c in cols])
+    for r in query.yield_per(EXPORT_CHUNK):
+        w.writerow([_valor_export(v) for v in r])
+        if buf.tell() >= EXPORT_BLOQUE_BYTES:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0); buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _generar_ndjson(query, cols):
+    partes, tam = [], 0
+    for r in query.yield_per(EXPORT_CHUNK):
+        linea = json.dumps({c: _valor_export(v) for c, v in zip(cols, r)}, ensure_ascii=False) + "\n"
+        partes.append(linea); tam += len(linea)
+        if tam >= EXPORT_BLOQUE_BYTES:
+            yield "".join(partes).encode("utf-8")
+            partes, tam = [], 0
+    if partes:
+        yield "".join(partes).encode("utf-8")
+
+
+def _respuesta_export_stream(formato, query, cols, nombre):
+    """Respuesta chunked: las filas salen del cursor (yield_per / stream_results) al cliente."""
+    gen = _generar_csv if formato == "csv" else _generar_ndjson
+    filename = f"{nombre}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    return Response(
+        stream_with_context(gen(query, cols)),
+        mimetype=EXPORT_FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@delegaciones_bp.route('/api/delegaciones/<int:delegacion_id>/personal/export.<formato>', endpoint='api_exportar_personal_stream')
+@login_required
+def api_exportar_personal_stream(delegacion_id, formato):
+    if formato not in EXPORT_FORMATOS:
+        abort(404)
+    Delegacion.query.get_or_404(delegacion_id)
+    if current_user.rol == "delegado" and current_user.delegacion_id != delegacion_id:
+        abort(403)
+
+    _, _, sorters, filters = _parse_tabulator_args(request)
+    cols = _columnas_export_personal()
+    query = _query_export_personal(cols, sorters, filters, delegacion_id)
+    return _respuesta_export_stream(formato, query, cols, f"personal_deleg_{delegacion_id}")
+
+
+@delegaciones_bp.route('/api/personal/export.<formato>', endpoint='api_exportar_personal_estatal')
+@roles_required('secretario')  # admin siempre pasa
+def api_exportar_personal_estatal(formato):
+    if formato not in EXPORT_FORMATOS:
+        abort(404)
+    _, _, sorters, filters = _parse_tabulator_args(request)
+    cols = _columnas_export_personal()
+    query = _query_export_personal(cols, sorters, filters)
+    return _respuesta_export_stream(formato, query, cols, "personal_estatal")
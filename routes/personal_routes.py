@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_from_directory, jsonify, send_file, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_from_directory, jsonify, send_file, abort, current_app
 from flask_login import login_required, current_user
 from io import BytesIO
 from datetime import datetime, timedelta
@@ -7,15 +7,17 @@ from models import db, Plantel, Personal, Usuario, HistorialCambios, Delegacion,
 
 from utils import registrar_historial, registrar_notificacion
 from sqlalchemy import distinct, func, text
-import pandas as pd
 import re
 from sqlalchemy.exc import IntegrityError
 from authz import roles_required, requires, limit_query_to_user_delegacion, is_global_viewer, require_same_delegacion
+from fichas_pdf import fila_ficha, render_ficha, huella_ficha, CacheFichas
+from importaciones import (ImportadorPersonal, MAPA_PERSONAL, OBLIGATORIAS_PERSONAL, CACHE_PLANTEL,
+                           normalizar_encabezados, libro_validacion, importar_en_trabajo)
+from trabajos import tarea, encolar, parametros_de, guardar_entrada, borrar_entrada
+from lector_excel import LectorExcel
 
 # Excel
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
+from reportes_excel import nuevo_workbook, HojaStream, respuesta_xlsx
 
 # PDF
 from reportlab.lib.pagesizes import letter, landscape
@@ -122,8 +124,8 @@ def _fetch_personal_detalle_por_cct(cct: str):
             mujeres += 1
         total += 1
 
-        func = (p.funcion or 'SIN FUNCIÓN').upper()
-        funciones[func] = funciones.get(func, 0) + 1
+        fn = (p.funcion or 'SIN FUNCIÓN').upper()
+        funciones[fn] = funciones.get(fn, 0) + 1
 
         rows.append({
             "apellido_paterno": p.apellido_paterno or "",
@@ -270,6 +272,12 @@ def eliminar_personal(id):
 def editar_personal(id):
     persona = Personal.query.get_or_404(id)
 
+    # Bloqueo optimista: el form trae la versión con la que se abrió la ficha
+    version = request.form.get("version", type=int)
+    if version is not None and version != persona.version:
+        flash("⚠️ Otro usuario modificó esta ficha mientras la editabas. Revisa los datos y vuelve a intentar.", "warning")
+        return redirect(url_for("personal_bp.vista_detalle_personal", id=persona.id))
+
     # ... (validaciones de CURP/RFC)
 
     campos = {
@@ -349,210 +357,114 @@ def editar_personal(id):
 
 
 
-@personal_bp.route('/subir_excel_personal/<cct>', methods=['POST'])
-@roles_required('admin', 'coordinador')
-def subir_excel_personal(cct):
-    plantel = _check_access_cct(cct)
-
+def _subir_excel_personal(alcance, vista, args, titulo, sufijo):
+    """
+    Cuerpo común de las cargas de personal. `alcance` son los parámetros del
+    trabajo: {"cct": ...} (todo a ese CCT), {"delegacion_id": ...} (CCT por
+    fila, dentro de la delegación) o {} (estatal). Regresa a `vista`(**args).
+    """
+    volver = url_for(vista, **args)
     file = request.files.get('archivo_excel')
     if not file or file.filename == '':
         flash('Sube un archivo .xlsx en el campo "archivo_excel".', 'danger')
-        return redirect(url_for('personal_bp.vista_personal',
-                                delegacion=plantel.delegacion.nombre, cct=cct))
+        return redirect(volver)
 
+    # Copia local sólo para revisar encabezados (o el dry run); al worker le llega por la BD
+    ruta = guardar_entrada(file, "personal.xlsx")
     try:
-        import unicodedata, re
-        df = pd.read_excel(file, sheet_name=0, engine="openpyxl", dtype=str)
-
-        def norm(h):
-            h = "" if h is None else str(h).strip()
-            h = "".join(c for c in unicodedata.normalize("NFD", h) if unicodedata.category(c) != "Mn")
-            h = re.sub(r"[^A-Za-z0-9]+","_", h).strip("_").lower()
-            return h
-
-        original_cols = list(df.columns)
-        df.columns = [norm(c) for c in df.columns]
-
-        # --- Aceptar variantes de encabezados:
-        ALIASES = {
-            "fch_baj_jub": "fecha_baja_jubilacion",
-            "fecha_baja_por_jubilacion": "fecha_baja_jubilacion",
-            "grado_max_estudios": "grado_maximo_estudios",
-            "dom_esc_coords_gps": "dom_esc_coordenadas_gps",
-        }
-        df.rename(columns=ALIASES, inplace=True)
+        with LectorExcel(ruta, columnas=normalizar_encabezados) as lector:
+            columnas = lector.columnas
+
+            # Validación mínima (base); sin CCT en la URL, cada fila trae el suyo
+            obligatorias = OBLIGATORIAS_PERSONAL if "cct" in alcance else [*OBLIGATORIAS_PERSONAL, "cct"]
+            faltantes = [h for h in obligatorias if h not in columnas]
+            if faltantes:
+                ejemplo = ", ".join(lector.encabezados[:10])
+                flash(f"Faltan columnas base: {', '.join(faltantes)}. Detectados (ejemplo): {ejemplo}", "danger")
+                return redirect(volver)
+
+            # Los datos de la escuela (CACHE_PLANTEL) se toman del plantel aunque no vengan
+            faltan_en_excel = [k for k, campo in MAPA_PERSONAL.items()
+                               if k not in columnas and campo not in CACHE_PLANTEL]
+
+            # 🔎 Sólo validar: no escribe nada, devuelve el Excel anotado
+            if request.form.get("dry_run") == "1":
+                imp = ImportadorPersonal(**alcance)
+                wb = libro_validacion(lector, imp.revisar, titulo, notas=lambda: [
+                    ("Altas nuevas", imp.insertados),
+                    ("Actualizaciones", imp.actualizados),
+                    ("Columnas no presentes (se ignorarían)", ", ".join(faltan_en_excel) or "—"),
+                ])
+                return respuesta_xlsx(wb, f"validacion_personal_{sufijo}.xlsx")
 
         # Debug útil para ver qué llegó
-        flash("Encabezados normalizados: " + ", ".join(list(df.columns)[:50]) + ("..." if len(df.columns) > 50 else ""), "info")
-
-        # --- Mapeo Excel -> campos de tu tabla
-        MAP = {
-            # Identificación
-            "num": "num",
-            "paterno": "apellido_paterno",
-            "materno": "apellido_materno",
-            "nombre": "nombre",
-            "genero": "genero",
-            "rfc": "rfc",
-            "curp": "curp",
-            "clave_presupuestal": "clave_presupuestal",
-            "funcion": "funcion",
-            "grado_maximo_estudios": "grado_estudios",
-            "titulado": "titulado",
-            "fecha_ingreso": "fecha_ingreso",
-            "fecha_baja_jubilacion": "fecha_baja_jubilacion",
-            "status_memb": "estatus_membresia",
-            "nombramiento": "nombramiento",
-
-            # Dirección persona
-            "dp_calle": "domicilio",
-            "dp_num_ext": "numero",
-            "dp_num_int": "dp_num_int",
-            "dp_cruce1": "dp_cruce1",
-            "dp_cruce2": "dp_cruce2",
-            "dp_localidad": "localidad",
-            "dp_colonia": "colonia",
-            "dp_mun_nom": "municipio",
-            "dp_cp": "cp",
-            "dp_tel1": "tel1",
-            "dp_tel2": "tel2",
-            "correo_electronico": "correo_electronico",
-
-            # Escuela / sindical
-            "escuela_nombre": "escuela_nombre",
-            "cct": "cct",   # se sobreescribe al de la URL
-            "turno": "turno",
-            "nivel": "nivel",
-            "subs_modalidad": "subs_modalidad",
-            "zona_escolar": "zona_escolar",
-            "sector": "sector",
-
-            # Domicilio escuela
-            "dom_esc_calle": "dom_esc_calle",
-            "dom_esc_num_ext": "dom_esc_num_ext",
-            "dom_esc_num_int": "dom_esc_num_int",
-            "dom_esc_cruce1": "dom_esc_cruce1",
-            "dom_esc_cruce2": "dom_esc_cruce2",
-            "dom_esc_localidad": "dom_esc_localidad",
-            "dom_esc_colonia": "dom_esc_colonia",
-            "dom_esc_mun_nom": "dom_esc_mun_nom",
-            "dom_esc_cp": "dom_esc_cp",
-            "dom_esc_coordenadas_gps": "dom_esc_coordenadas_gps",
-
-            # Otros
-            "estado": "estado",
-            "seccion_snte": "seccion_snte",
-            "del_o_ct": "del_o_ct",
-            "org": "org",
-            "coord_reg": "coord_reg",
-            "fun_sin": "fun_sin",
-        }
+        flash("Encabezados normalizados: " + ", ".join(columnas[:50]) + ("..." if len(columnas) > 50 else ""), "info")
 
-        # Validación mínima (base)
-        obligatorias = ["paterno","materno","nombre","genero","rfc","curp"]
-        faltantes = [h for h in obligatorias if h not in df.columns]
-        if faltantes:
-            ejemplo = ", ".join(original_cols[:10])
-            flash(f"Faltan columnas base: {', '.join(faltantes)}. Detectados (ejemplo): {ejemplo}", "danger")
-            return redirect(url_for('personal_bp.vista_personal',
-                                    delegacion=plantel.delegacion.nombre, cct=cct))
-
-        # Aviso de columnas del MAP que no vinieron (para entender qué no se cargará)
-        faltan_en_excel = [k for k in MAP.keys() if k not in df.columns]
+        # Aviso de columnas del MAPA que no vinieron (para entender qué no se cargará)
         if faltan_en_excel:
             flash("Columnas esperadas no presentes (se ignorarán): " + ", ".join(faltan_en_excel), "warning")
 
-        # Parseo de fechas robusto
-        for k in ("fecha_ingreso", "fecha_baja_jubilacion"):
-            if k in df.columns:
-                df[k] = pd.to_datetime(df[k], errors="coerce").dt.date
-
-        ok = bad = 0
-        errores = []
-
-        for i, row in df.iterrows():
-            curp_val = (row.get("curp") or "").strip().upper()
-            if not curp_val:
-                bad += 1; errores.append(f"Fila {i+2}: CURP vacío.")
-                continue
-
-            dest = {}
-            for src_norm, db_field in MAP.items():
-                if src_norm not in df.columns:
-                    continue
-                val = row[src_norm]
-                if pd.isna(val):
-                    val = None
-
-                # Normalizaciones puntuales
-                if db_field == "genero" and val:
-                    g = str(val).strip().upper()
-                    val = "H" if g in ("H","MASCULINO","HOMBRE") else ("M" if g in ("M","F","FEMENINO","MUJER") else None)
-
-                if db_field in ("cp","numero","tel1","tel2","cct","clave_presupuestal"):
-                    val = None if val is None else str(val).strip()
-
-                if db_field == "num":
-                    s = "" if val is None else str(val).strip()
-                    val = int(s) if s.isdigit() else None
-
-                if db_field in ("rfc","curp") and val:
-                    val = str(val).strip().upper()
-
-                dest[db_field] = val
-
-            # Fuerza adscripción al CCT de la URL
-            dest["cct"] = plantel.cct
-
-            # FK CCT
-            if not Plantel.query.filter_by(cct=dest["cct"]).first():
-                bad += 1; errores.append(f"Fila {i+2}: CCT {dest['cct']} no existe en plantel.")
-                continue
-
-            # UPSERT por CURP + CLAVE (multi-plaza)
-            clave_val = (dest.get("clave_presupuestal") or "").strip().upper()
-            dest["clave_presupuestal"] = clave_val  # normaliza también en el destino
-
-            q = Personal.query.filter_by(curp=curp_val)
-            if clave_val:
-                q = q.filter_by(clave_presupuestal=clave_val)
+        # ⏳ La importación corre en el worker; la vista muestra el avance con ?trabajo=<id>
+        t = encolar("importar_personal", alcance, usuario=current_user, entrada=ruta)
+        flash(f"Importación en cola (trabajo #{t.id}).", "info")
+        return redirect(url_for(vista, trabajo=t.id, **args))
+    except Exception as e:
+        db.session.rollback()
+        flash(f"❌ Error al procesar el archivo: {e}", "danger")
+        return redirect(volver)
+    finally:
+        borrar_entrada(ruta)
 
-            p = q.first()
-            if not p:
-                # Crea nuevo registro por combinación curp+clave
-                p = Personal(curp=curp_val, clave_presupuestal=clave_val)
-                db.session.add(p)
 
+@personal_bp.route('/subir_excel_personal/<cct>', methods=['POST'])
+@roles_required('admin', 'coordinador')
+def subir_excel_personal(cct):
+    plantel = _check_access_cct(cct)
+    return _subir_excel_personal(
+        {"cct": plantel.cct}, 'personal_bp.vista_personal',
+        {"delegacion": plantel.delegacion.nombre, "cct": plantel.cct},
+        f"Validación de personal — {plantel.cct}", plantel.cct)
 
-            # Asignar campos existentes
-            for k, v in dest.items():
-                if hasattr(Personal, k):
-                    setattr(p, k, v)
 
-            try:
-                db.session.commit()
-                ok += 1
-            except Exception as e:
-                db.session.rollback()
-                bad += 1
-                errores.append(f"Fila {i+2}: {e}")
-
-        msg = f"Importación v2: {ok} OK, {bad} con error."
-        if errores:
-            flash(msg + " " + " | ".join(errores[:5]), "warning")
-        else:
-            flash(msg, "success")
+@personal_bp.route('/delegacion/<int:delegacion_id>/subir_excel_personal', methods=['POST'])
+@roles_required('admin', 'coordinador')
+def subir_excel_personal_delegacion(delegacion_id):
+    """Personal de varios CCTs de una delegación: el CCT sale de cada fila."""
+    delegacion = Delegacion.query.get_or_404(delegacion_id)
+    if not is_global_viewer() and delegacion.id != getattr(current_user, "delegacion_id", None):
+        abort(403)
+    return _subir_excel_personal(
+        {"delegacion_id": delegacion.id}, 'delegaciones_bp.tabla_personal_delegacion',
+        {"delegacion_id": delegacion.id},
+        f"Validación de personal — {delegacion.nombre}", f"delegacion_{delegacion.id}")
 
-        registrar_notificacion(
-            f"{current_user.nombre} importó {ok} personas (errores: {bad}) desde Excel v2 en {cct}",
-            tipo="personal"
-        )
-    except Exception as e:
-        db.session.rollback()
-        flash(f"❌ Error al procesar el archivo: {e}", "danger")
 
-    return redirect(url_for('personal_bp.vista_personal',
-                            delegacion=plantel.delegacion.nombre, cct=cct))
+@personal_bp.route('/personal/subir_excel', methods=['POST'])
+@roles_required('admin')
+def subir_excel_personal_estatal():
+    """Recarga estatal: personal de cualquier CCT en un solo archivo."""
+    return _subir_excel_personal({}, 'delegaciones_bp.vista_delegaciones', {},
+                                 "Validación de personal — estatal", "estatal")
+
+
+@tarea("importar_personal")
+def importar_personal_trabajo(trabajo, progreso):
+    """UPSERT por CURP + CLAVE (multi-plaza), lote a lote, con el alcance que fijó la ruta."""
+    params = parametros_de(trabajo)
+    cct, delegacion_id = params.get("cct"), params.get("delegacion_id")
+    imp = ImportadorPersonal(cct=cct, delegacion_id=delegacion_id)
+    sufijo = cct or (f"delegacion_{delegacion_id}" if delegacion_id else "estatal")
+    archivo = importar_en_trabajo(trabajo, progreso, imp, f"errores_personal_{sufijo}.xlsx",
+                                  columnas=normalizar_encabezados)
+
+    progreso.mensaje(f"Importación v2: {imp.ok} OK ({imp.insertados} nuevos, "
+                     f"{imp.actualizados} actualizados), {imp.bad} con error.")
+    donde = f"en {cct}" if cct else (f"en la delegación {delegacion_id}" if delegacion_id else "(carga estatal)")
+    registrar_notificacion(
+        f"{trabajo.usuario or 'Sistema'} importó {imp.ok} personas (errores: {imp.bad}) desde Excel v2 {donde}",
+        tipo="personal", usuario=trabajo.usuario
+    )
+    return archivo
 
 
 
@@ -1013,87 +925,45 @@ def rechazar_baja(id):
 def reporte_personal_cct_excel(cct):
     data = _fetch_personal_detalle_por_cct(cct)
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Resumen"
-
-    bold = Font(bold=True)
-    center = Alignment(horizontal="center", vertical="center")
-    header_fill = PatternFill(start_color="ECECEC", end_color="ECECEC", fill_type="solid")
-    thin = Side(style="thin", color="AAAAAA")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-    # Cabecera
-    ws.merge_cells("A1:F1")
-    ws["A1"] = "REPORTE DETALLADO DE PERSONAL POR CCT"
-    ws["A1"].font = Font(size=14, bold=True); ws["A1"].alignment = center
-    ws.merge_cells("A2:F2")
-    ws["A2"] = f"Delegación: {data['delegacion']} — {data['nivel']}  |  Plantel: {data['plantel']['nombre']} ({data['plantel']['cct']})"
-    ws["A2"].alignment = center
-    ws.merge_cells("A3:F3")
-    ws["A3"] = f"Generado por: {data['generado_por']}  |  Fecha: {data['generado_en']}"
-    ws["A3"].alignment = center
-
-    ws.append([])
-    ws.append(["Hombres", "Mujeres", "Total"])
-    for c in ws[5]:
-        c.font = bold; c.fill = header_fill; c.alignment = center; c.border = border
-    ws.append([data["estadistica"]["H"], data["estadistica"]["M"], data["estadistica"]["T"]])
-    ws.append([])
+    wb = nuevo_workbook()
 
-    # Tabla de funciones
-    ws.append(["Función", "Cantidad"])
-    ws["A8"].font = bold; ws["B8"].font = bold
-    ws["A8"].fill = header_fill; ws["B8"].fill = header_fill
-    ws["A8"].alignment = center; ws["B8"].alignment = center
-    ws["A8"].border = ws["B8"].border = border
+    # Cabecera + estadística
+    ws = HojaStream(wb, "Resumen", muestra=None)
+    ws.titulo("REPORTE DETALLADO DE PERSONAL POR CCT", combinar=6)
+    ws.titulo(f"Delegación: {data['delegacion']} — {data['nivel']}  |  Plantel: {data['plantel']['nombre']} ({data['plantel']['cct']})", estilo="centrado", combinar=6)
+    ws.titulo(f"Generado por: {data['generado_por']}  |  Fecha: {data['generado_en']}", estilo="centrado", combinar=6)
+    ws.vacia()
+    ws.encabezado(["Hombres", "Mujeres", "Total"])
+    ws.fila([data["estadistica"]["H"], data["estadistica"]["M"], data["estadistica"]["T"]], estilo=None)
+    ws.vacia()
 
-    fila = 9
+    # Tabla de funciones
+    ws.encabezado(["Función", "Cantidad"])
     for f, cnt in data["estadistica"]["funciones"].items():
-        ws.cell(row=fila, column=1, value=f).border = border
-        ws.cell(row=fila, column=2, value=cnt).border = border
-        fila += 1
+        ws.fila([f, cnt])
+    ws.cerrar()
 
-    # Hoja detalle
-    ws_det = wb.create_sheet("Detalle")
-    headers = [
+    # Hoja detalle (bordes y anchos al escribir)
+    ws_det = HojaStream(wb, "Detalle", ancho_max=35, margen=3, muestra=None, freeze="A2")
+    ws_det.encabezado([
         "Apellido paterno","Apellido materno","Nombre","Género","RFC","CURP",
         "Clave presupuestal","Función","Grado estudios","Titulado",
         "Fecha ingreso","Fecha baja/jub","Estatus membresía","Nombramiento",
         "Domicilio","Número","Localidad","Colonia","Municipio","CP",
         "Tel 1","Tel 2","Correo"
-    ]
-    ws_det.append(headers)
-    for cell in ws_det[1]:
-        cell.font = bold; cell.fill = header_fill; cell.alignment = center; cell.border = border
-
+    ])
     for r in data["rows"]:
-        ws_det.append([
+        ws_det.fila([
             r["apellido_paterno"], r["apellido_materno"], r["nombre"], r["genero"], r["rfc"], r["curp"],
             r["clave_presupuestal"], r["funcion"], r["grado_estudios"], r["titulado"],
             r["fecha_ingreso"], r["fecha_baja_jubilacion"], r["estatus_membresia"], r["nombramiento"],
             r["domicilio"], r["numero"], r["localidad"], r["colonia"], r["municipio"], r["cp"],
             r["tel1"], r["tel2"], r["correo_electronico"]
         ])
+    ws_det.cerrar()
 
-    # Bordes y ancho aproximado
-    for row in ws_det.iter_rows(min_row=1, max_row=ws_det.max_row, min_col=1, max_col=len(headers)):
-        for c in row:
-            c.border = border
-    for col_idx in range(1, len(headers)+1):
-        max_len = 0
-        for rr in range(1, ws_det.max_row+1):
-            v = ws_det.cell(row=rr, column=col_idx).value
-            max_len = max(max_len, len(str(v)) if v else 0)
-        ws_det.column_dimensions[get_column_letter(col_idx)].width = min(max_len + 3, 35)
-
-    ws_det.freeze_panes = "A2"
-
-    output = BytesIO()
-    wb.save(output); output.seek(0)
     filename = f"personal_{data['plantel']['cct']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return send_file(output, as_attachment=True, download_name=filename,
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return respuesta_xlsx(wb, filename)
 
 @personal_bp.route("/personal/<string:cct>/reporte/pdf")
 @login_required
@@ -1205,110 +1075,23 @@ def ficha_persona_pdf(persona_id):
     d = _fetch_ficha_persona(persona_id)
     p = d["persona"]
 
-    buf = BytesIO()
-    doc = SimpleDocTemplate(
-        buf, pagesize=landscape(letter),
-        leftMargin=20, rightMargin=20, topMargin=22, bottomMargin=22
-    )
-
-    styles = getSampleStyleSheet()
-    small = ParagraphStyle("small", parent=styles["Normal"], fontName="Helvetica", fontSize=8.5, leading=10.2, wordWrap="CJK")
-    small_bold = ParagraphStyle("small_bold", parent=small, fontName="Helvetica-Bold")
-    title = ParagraphStyle("title", parent=styles["Title"], fontName="Helvetica-Bold", fontSize=18, leading=22)
-
-    def P(txt, bold=False):
-        return Paragraph("" if txt is None else str(txt), small_bold if bold else small)
-
-    story = []
-    # Encabezado
-    story.append(Paragraph("<b>FICHA INDIVIDUAL DE PERSONAL</b>", title))
-    story.append(P(f"Delegación: {d['delegacion']} — {d['nivel']}  |  Plantel: {d['plantel']['nombre']} ({d['plantel']['cct']})"))
-    story.append(P(f"Generado por: {d['generado_por']}  |  Fecha: {d['generado_en']}"))
-    story.append(Spacer(1, 8))
-
-    # Cabecera con nombre grande
-    nombre = f"{p.apellido_paterno or ''} {p.apellido_materno or ''} {p.nombre or ''}".strip()
-    head = Table([[P(nombre, True)]], colWidths=[doc.width], hAlign="LEFT")
-    head.setStyle(TableStyle([
-        ("BACKGROUND", (0,0), (-1,-1), colors.HexColor("#F0F0F0")),
-        ("BOX", (0,0), (-1,-1), 0.5, colors.black),
-        ("LEFTPADDING", (0,0), (-1,-1), 6),
-        ("RIGHTPADDING", (0,0), (-1,-1), 6),
-        ("TOPPADDING", (0,0), (-1,-1), 4),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 4),
-    ]))
-    story.append(head)
-    story.append(Spacer(1, 6))
-
-    # Info básica en filas (3 columnas)
-    col_w = doc.width / 3.0
-    filas = [
-        [P(f"Género: {p.genero or ''}"), P(f"RFC: {p.rfc or ''}"), P(f"CURP: {p.curp or ''}")],
-        [P(f"Clave presup.: {p.clave_presupuestal or ''}"), P(f"Estatus: {p.estatus_membresia or ''}"), P(f"Nombramiento: {p.nombramiento or ''}")],
-        [P(f"Función: {p.funcion or ''}"), P(f"Grado: {p.grado_estudios or ''}"), P(f"Titulado: {p.titulado or ''}")],
-        [P(f"Domicilio: {p.domicilio or ''} {p.numero or ''}"), P(f"Colonia: {p.colonia or ''}"), P(f"Municipio: {p.municipio or ''}")],
-        [P(f"CP: {p.cp or ''}"), P(f"Tel1: {p.tel1 or ''}"), P(f"Tel2: {p.tel2 or ''}")],
-        [P(f"Correo: {p.correo_electronico or ''}"), P(""), P("")],
-        [P(f"F. ingreso: {p.fecha_ingreso or ''}"), P(f"F. baja/jub: {p.fecha_baja_jubilacion or ''}"), P("")],
+    observaciones = [
+        (o.fecha.strftime("%Y-%m-%d %H:%M"), _nombre_usuario_por_id(getattr(o, "usuario_id", None)), o.texto or "")
+        for o in d["observaciones"]
     ]
-    card = Table(filas, colWidths=[col_w, col_w, col_w], hAlign="LEFT")
-    card.setStyle(TableStyle([
-        ("GRID", (0,0), (-1,-1), 0.25, colors.lightgrey),
-        ("VALIGN", (0,0), (-1,-1), "TOP"),
-        ("LEFTPADDING", (0,0), (-1,-1), 4),
-        ("RIGHTPADDING", (0,0), (-1,-1), 4),
-        ("TOPPADDING", (0,0), (-1,-1), 2),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 2),
-    ]))
-    story.append(card)
-    story.append(Spacer(1, 10))
-
-    # Observaciones
-    story.append(Paragraph("<b>Observaciones</b>", small_bold))
-    if d["observaciones"]:
-        obs_rows = [[P("Fecha", True), P("Usuario", True), P("Texto", True)]]
-        for o in d["observaciones"]:
-            fecha = o.fecha.strftime("%Y-%m-%d %H:%M")
-            usuario = _nombre_usuario_por_id(getattr(o, "usuario_id", None))
-            obs_rows.append([P(fecha), P(usuario), P(o.texto or "")])
-        obs_tbl = Table(obs_rows, colWidths=[3.0*cm, 5.0*cm, doc.width - 8.0*cm], hAlign="LEFT")
-        obs_tbl.setStyle(TableStyle([
-            ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#ECECEC")),
-            ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
-            ("VALIGN", (0,0), (-1,-1), "TOP"),
-        ]))
-        story.append(obs_tbl)
-    else:
-        story.append(P("Sin observaciones registradas."))
-    story.append(Spacer(1, 10))
-
-    # Historial de cambios
-    story.append(Paragraph("<b>Historial de movimientos</b>", small_bold))
-    if d["historial"]:
-        hist_rows = [[P("Fecha", True), P("Campo", True), P("Antes", True), P("Después", True), P("Usuario", True), P("Tipo", True)]]
-        for h in d["historial"]:
-            hist_rows.append([
-                P(h.fecha.strftime("%Y-%m-%d %H:%M")),
-                P(h.campo or ""),
-                P(h.valor_anterior or ""),
-                P(h.valor_nuevo or ""),
-                P(h.usuario or ""),
-                P(h.tipo or "")
-            ])
-        # ancho de columnas equilibrado
-        cw = [3.2*cm, 3.0*cm, (doc.width-3.2*cm-3.0*cm-3.0*cm-3.0*cm)/2, (doc.width-3.2*cm-3.0*cm-3.0*cm-3.0*cm)/2, 3.0*cm, 3.0*cm]
-        hist_tbl = Table(hist_rows, colWidths=cw, hAlign="LEFT", repeatRows=1)
-        hist_tbl.setStyle(TableStyle([
-            ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#ECECEC")),
-            ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
-            ("VALIGN", (0,0), (-1,-1), "TOP"),
-        ]))
-        story.append(hist_tbl)
-    else:
-        story.append(P("Sin movimientos en el historial."))
-
-    doc.build(story)
-    pdf = buf.getvalue(); buf.close()
+    historial = [
+        (h.fecha.strftime("%Y-%m-%d %H:%M"), h.campo or "", h.valor_anterior or "",
+         h.valor_nuevo or "", h.usuario or "", h.tipo or "")
+        for h in d["historial"]
+    ]
+    fila = fila_ficha(p, d["delegacion"], d["nivel"], d["plantel"])
+    cache = CacheFichas(current_app.config["FICHAS_CACHE_DIR"])
+    pdf = cache.obtener(
+        huella_ficha(fila, d["generado_por"], observaciones, historial),
+        lambda: render_ficha(fila, d["generado_por"], d["generado_en"],
+                             observaciones=observaciones, historial=historial),
+    )
+    cache.podar_cada(current_app.config["FICHAS_CACHE_MAX_MB"] * 1024 * 1024)
     filename = f"ficha_{p.apellido_paterno or ''}_{p.apellido_materno or ''}_{p.nombre or ''}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
     return send_file(BytesIO(pdf), as_attachment=True, download_name=filename, mimetype="application/pdf")
 
@@ -1320,30 +1103,18 @@ def ficha_persona_excel(persona_id):
     d = _fetch_ficha_persona(persona_id)
     p = d["persona"]
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Ficha"
-
-    bold = Font(bold=True)
-    header_fill = PatternFill(start_color="ECECEC", end_color="ECECEC", fill_type="solid")
-    center = Alignment(horizontal="center", vertical="center")
-    thin = Side(style="thin", color="AAAAAA")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    wb = nuevo_workbook()
+    ws = HojaStream(wb, "Ficha", anchos={"A": 24, "B": 80, "C": 30, "D": 30, "E": 30, "F": 30})
 
     def set_row(key, value):
-        r = ws.max_row + 1
-        ws.cell(r, 1, key).font = bold
-        ws.cell(r, 1).fill = header_fill
-        ws.cell(r, 2, value)
-        ws.cell(r, 1).border = border
-        ws.cell(r, 2).border = border
-
-    ws.merge_cells("A1:B1"); ws["A1"] = "FICHA INDIVIDUAL DE PERSONAL"; ws["A1"].font = Font(size=14, bold=True); ws["A1"].alignment = center
+        ws.celdas([(key, "etiqueta"), (value, "celda")])
+
+    ws.titulo("FICHA INDIVIDUAL DE PERSONAL", combinar=2)
     set_row("Delegación", f"{d['delegacion']} — {d['nivel']}")
     set_row("Plantel", f"{d['plantel']['nombre']} ({d['plantel']['cct']})")
     set_row("Generado por", d["generado_por"])
     set_row("Fecha", d["generado_en"])
-    ws.append([])
+    ws.vacia()
 
     nombre = f"{p.apellido_paterno or ''} {p.apellido_materno or ''} {p.nombre or ''}".strip()
     set_row("Nombre", nombre)
@@ -1365,64 +1136,39 @@ def ficha_persona_excel(persona_id):
     set_row("Correo", p.correo_electronico or "")
     set_row("Fecha ingreso", p.fecha_ingreso or "")
     set_row("Fecha baja/jub", p.fecha_baja_jubilacion or "")
-    ws.append([])
+    ws.vacia()
 
     # Observaciones
-    r0 = ws.max_row + 1
-    ws.merge_cells(start_row=r0, start_column=1, end_row=r0, end_column=2)
-    ws.cell(r0,1,"Observaciones").font = Font(bold=True); ws.cell(r0,1).fill = header_fill
+    ws.titulo("Observaciones", estilo="seccion", combinar=2)
     if d["observaciones"]:
-        ws.append(["Fecha", "Usuario", "Texto"])
-        for cell in ws[ws.max_row]:
-            cell.font = bold; cell.fill = header_fill; cell.border = border
+        ws.fila(["Fecha", "Usuario", "Texto"], estilo="etiqueta")
         for o in d["observaciones"]:
-            ws.append([
+            ws.fila([
                 o.fecha.strftime("%Y-%m-%d %H:%M"),
                 _nombre_usuario_por_id(getattr(o, "usuario_id", None)),
                 o.texto or ""
             ])
-            for cell in ws[ws.max_row]:
-                cell.border = border
     else:
-        ws.append(["", "Sin observaciones registradas."])
-
+        ws.fila(["", "Sin observaciones registradas."], estilo=None)
 
-    ws.append([])
+    ws.vacia()
     # Historial
-    r0 = ws.max_row + 1
-    ws.merge_cells(start_row=r0, start_column=1, end_row=r0, end_column=2)
-    ws.cell(r0,1,"Historial de movimientos").font = Font(bold=True); ws.cell(r0,1).fill = header_fill
+    ws.titulo("Historial de movimientos", estilo="seccion", combinar=2)
     if d["historial"]:
-        ws.append(["Fecha", "Campo", "Antes", "Después", "Usuario", "Tipo"])
-        for cell in ws[ws.max_row]:
-            cell.font = bold; cell.fill = header_fill; cell.border = border
+        ws.fila(["Fecha", "Campo", "Antes", "Después", "Usuario", "Tipo"], estilo="etiqueta")
         for h in d["historial"]:
-            ws.append([
+            ws.fila([
                 h.fecha.strftime("%Y-%m-%d %H:%M"),
                 h.campo or "", h.valor_anterior or "", h.valor_nuevo or "",
                 h.usuario or "", h.tipo or ""
             ])
-            for cell in ws[ws.max_row]:
-                cell.border = border
     else:
-        ws.append(["", "Sin movimientos en el historial."])
-
-    # Anchos
-    ws.column_dimensions["A"].width = 24
-    ws.column_dimensions["B"].width = 80
-    for col in ["C","D","E","F"]:
-        ws.column_dimensions[col].width = 30
+        ws.fila(["", "Sin movimientos en el historial."], estilo=None)
 
-    out = BytesIO(); wb.save(out); out.seek(0)
     filename = f"ficha_{p.apellido_paterno or ''}_{p.apellido_materno or ''}_{p.nombre or ''}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return send_file(out, as_attachment=True, download_name=filename,
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-
-@personal_bp.route("/api/personal")
-@requires("personal.view")
-def api_listar_personal():
-    return {"ok": False, "error": "No implementado"}, 501
+    return respuesta_xlsx(wb, filename)
 
+# GET /api/personal (lista estatal para Tabulator) vive en delegaciones_routes
 @personal_bp.route("/api/personal", methods=["POST"])
 @requires("personal.create")
 def api_crear_persona():
@@ -2,19 +2,27 @@
 from flask import Blueprint, jsonify, abort
 from flask_login import login_required
 from models import Plantel, Delegacion
+from cache_reportes import marca_datos
+from cache_http import etag_de, no_modificado, con_validadores
 
 planteles_api = Blueprint("planteles_api", __name__, url_prefix="/api/planteles")
 
 @planteles_api.get("/<string:cct>")
 @login_required
 def get_plantel_por_cct(cct):
+    # Contadores de plantel/delegacion: 304 sin consultar el plantel
+    etag = etag_de(marca_datos(("delegacion", "plantel")), cct)
+    r304 = no_modificado(etag)
+    if r304:
+        return r304
+
     p = Plantel.query.filter_by(cct=cct).first()
     if not p:
         abort(404, description="CCT no encontrado")
 
     delega = p.delegacion.nombre if p.delegacion else None
 
-    return jsonify({
+    return con_validadores(jsonify({
         # claves básicas
         "cct": p.cct,
         "plantel_nombre": p.nombre,
@@ -40,4 +48,4 @@ def get_plantel_por_cct(cct):
         "estado": p.estado,
         "delegacion_id": p.delegacion_id,
         "delegacion_nombre": delega,
-    })
+    }), etag)
@@ -0,0 +1,44 @@
+# routes/trabajos_routes.py
+import mimetypes
+
+from flask import Blueprint, jsonify, abort, Response, stream_with_context
+from flask_login import login_required, current_user
+
+from models import db, Trabajo
+from trabajos import a_dict, partes_archivo, tamano_archivo
+
+trabajos_bp = Blueprint("trabajos_bp", __name__, url_prefix="/trabajos")
+
+
+def _trabajo_visible(trabajo_id):
+    t = db.session.get(Trabajo, trabajo_id)
+    if t is None:
+        abort(404)
+    # Solo quien lo encoló (o un admin) puede verlo
+    if current_user.rol != "admin" and t.usuario_id != current_user.id:
+        abort(403)
+    return t
+
+
+@trabajos_bp.get("/<int:trabajo_id>")
+@login_required
+def estado_trabajo(trabajo_id):
+    return jsonify(a_dict(_trabajo_visible(trabajo_id)))
+
+
+@trabajos_bp.get("/<int:trabajo_id>/descargar")
+@login_required
+def descargar_trabajo(trabajo_id):
+    t = _trabajo_visible(trabajo_id)
+    if t.estado != "terminado" or not t.archivo:
+        abort(409, description="El trabajo aún no tiene resultado")
+    # El resultado está en la BD (trabajos_archivos): se envía parte por parte
+    tamano = tamano_archivo(t.id, "resultado")
+    if tamano is None:
+        abort(410, description="El archivo del trabajo ya no existe")
+    return Response(
+        stream_with_context(partes_archivo(t.id, "resultado")),
+        mimetype=mimetypes.guess_type(t.archivo)[0] or "application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{t.archivo}"',
+                 "Content-Length": str(tamano)},
+    )
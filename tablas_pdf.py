@@ -0,0 +1,106 @@
+# tablas_pdf.py
+"""
+Tablas largas para los reportes PDF (platypus) en tiempo lineal.
+
+Una sola `Table` de miles de filas se parte página por página, y en cada
+corte ReportLab vuelve a medir y a copiar todo lo que queda: el costo
+crece más que lineal con las filas. `TablaPaginada` mide cada fila UNA
+vez y, en cada salto de página, arma una `Table` sólo con las filas que
+caben (encabezado repetido), con las alturas ya medidas y el mismo
+TableStyle. Las páginas se generan conforme el documento avanza.
+
+Se ve igual que `Table(..., repeatRows=1, splitByRow=1)` con el padding
+por omisión: ROWBACKGROUNDS también reinicia en cada página allá.
+"""
+from bisect import bisect_right
+from itertools import accumulate
+
+from reportlab.platypus import Flowable, Table
+
+# Padding por omisión de las celdas de Table (el estilo de los reportes no lo cambia)
+PADDING_H = 6 + 6
+PADDING_V = 3 + 3
+_ALTO_MAX = 72000  # lo mismo que usa Table para medir celdas
+
+# Lo que cada pedazo hereda de la tabla original
+_COMPARTIDOS = ("encabezado", "filas", "anchos", "estilo", "hAlign", "width",
+                "alto_enc", "alturas", "acum")
+
+
+def alturas_filas(filas, anchos):
+    """Alto de cada fila como lo calcula Table: la celda más alta + padding."""
+    disponibles = [w - PADDING_H for w in anchos]
+    alto_celda = _ALTO_MAX - PADDING_V
+    alturas = []
+    for fila in filas:
+        h = 0
+        for celda, aw in zip(fila, disponibles):
+            ch = celda.wrap(aw, alto_celda)[1]
+            if ch > h:
+                h = ch
+        alturas.append(h + PADDING_V)
+    return alturas
+
+
+class TablaPaginada(Flowable):
+    """
+    `encabezado` y cada fila de `filas` son listas de Paragraph del mismo
+    largo que `anchos`. `estilo` (TableStyle) se comparte entre todos los
+    pedazos, así que se arma una sola vez por reporte.
+    """
+
+    def __init__(self, encabezado, filas, anchos, estilo, hAlign="LEFT"):
+        Flowable.__init__(self)
+        self.encabezado = encabezado
+        self.filas = filas
+        self.anchos = list(anchos)
+        self.estilo = estilo
+        self.hAlign = hAlign
+        self.width = sum(self.anchos)
+        self.alto_enc = alturas_filas([encabezado], self.anchos)[0]
+        self.alturas = alturas_filas(filas, self.anchos)
+        # acum[i] = alto de filas[:i]; el alto de cualquier tramo es O(1)
+        self.acum = [0, *accumulate(self.alturas)]
+        self.inicio = 0
+        self.height = 0
+
+    def _resto(self, inicio):
+        """Misma tabla desde la fila `inicio` (comparte listas ya medidas)."""
+        t = object.__new__(TablaPaginada)
+        Flowable.__init__(t)  # sin marcas del frame (_postponed, etc.)
+        for attr in _COMPARTIDOS:
+            setattr(t, attr, getattr(self, attr))
+        t.inicio = inicio
+        t.height = 0
+        return t
+
+    def _alto_hasta(self, fin):
+        return self.alto_enc + self.acum[fin] - self.acum[self.inicio]
+
+    def _tabla(self, fin):
+        return Table(
+            [self.encabezado] + self.filas[self.inicio:fin],
+            colWidths=self.anchos,
+            rowHeights=[self.alto_enc] + self.alturas[self.inicio:fin],
+            style=self.estilo,
+            hAlign=self.hAlign,
+        )
+
+    def wrap(self, availWidth, availHeight):
+        self.height = self._alto_hasta(len(self.filas))
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        # Última fila que cabe debajo del encabezado
+        limite = self.acum[self.inicio] + availHeight - self.alto_enc
+        fin = bisect_right(self.acum, limite, lo=self.inicio) - 1
+        if fin <= self.inicio:
+            return []  # ni una fila: el frame pasa a la siguiente página
+        if fin >= len(self.filas):
+            return [self._tabla(len(self.filas))]
+        return [self._tabla(fin), self._resto(fin)]
+
+    def draw(self):
+        t = self._tabla(len(self.filas))
+        t.wrapOn(self.canv, self.width, self.height)
+        t.drawOn(self.canv, 0, 0)
@@ -0,0 +1,336 @@
+# trabajos.py
+"""
+Trabajos en segundo plano respaldados por la tabla `trabajos`.
+
+- Las rutas encolan con `encolar(tipo, parametros)` y responden de inmediato.
+- Un proceso local (`flask --app wsgi:app trabajos worker`) toma los
+  pendientes, ejecuta el handler registrado con `@tarea(tipo)` y reporta
+  progreso en la misma fila.
+- El handler escribe su resultado (si hay archivo) en TRABAJOS_DIR, que es
+  sólo un área de trabajo LOCAL del worker; al terminar se copia por partes
+  a `trabajos_archivos` y de ahí lo sirve `trabajos_bp`: el proceso web y el
+  worker no comparten disco. Los archivos de entrada (p. ej. un Excel
+  subido) se encolan con `encolar(..., entrada=...)` en la misma
+  transacción que el trabajo, y el handler los lee con `entrada_local`.
+"""
+import json
+import os
+import time
+import traceback
+import tempfile
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from models import db, Trabajo, ArchivoTrabajo
+
+# tipo -> función(trabajo, progreso) que devuelve la ruta del archivo (o None)
+HANDLERS = {}
+
+PARTE_BYTES = 4 * 1024 * 1024  # tamaño de cada parte en trabajos_archivos
+
+
+def tarea(tipo):
+    """Registra un handler para un tipo de trabajo."""
+    def deco(fn):
+        HANDLERS[tipo] = fn
+        return fn
+    return deco
+
+
+def directorio_trabajos():
+    path = current_app.config["TRABAJOS_DIR"]
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def ruta_resultado(trabajo, nombre):
+    """Ruta local (del worker) donde el handler escribe su resultado."""
+    return os.path.join(directorio_trabajos(), f"{trabajo.id}_{nombre}")
+
+
+# ---- Archivos en la BD ----------------------------------------------------
+def guardar_archivo(trabajo_id, rol, origen):
+    """Copia `origen` (ruta o archivo abierto) a trabajos_archivos por partes; no hace commit."""
+    f = open(origen, "rb") if isinstance(origen, (str, os.PathLike)) else origen
+    try:
+        parte = 0
+        while True:
+            datos = f.read(PARTE_BYTES)
+            if not datos:
+                break
+            # Core insert: la parte no se queda en la sesión, hay una sola en memoria
+            db.session.execute(ArchivoTrabajo.__table__.insert()
+                               .values(trabajo_id=trabajo_id, rol=rol, parte=parte, datos=datos))
+            parte += 1
+    finally:
+        if f is not origen:
+            f.close()
+
+
+def partes_archivo(trabajo_id, rol):
+    """Genera el contenido parte por parte (una consulta por parte: memoria acotada)."""
+    ids = [i for (i,) in db.session.query(ArchivoTrabajo.id)
+           .filter_by(trabajo_id=trabajo_id, rol=rol)
+           .order_by(ArchivoTrabajo.parte)]
+    for i in ids:
+        yield db.session.query(ArchivoTrabajo.datos).filter_by(id=i).scalar()
+
+
+def tamano_archivo(trabajo_id, rol):
+    """Bytes guardados (None si no hay partes)."""
+    return (db.session.query(db.func.sum(db.func.length(ArchivoTrabajo.datos)))
+            .filter_by(trabajo_id=trabajo_id, rol=rol).scalar())
+
+
+def borrar_archivo(trabajo_id, rol):
+    ArchivoTrabajo.query.filter_by(trabajo_id=trabajo_id, rol=rol).delete(synchronize_session=False)
+
+
+def guardar_entrada(archivo, nombre):
+    """Copia local de un archivo subido (FileStorage) para revisarlo en la petición; no la ve el worker."""
+    ruta = os.path.join(directorio_trabajos(), f"entrada_{uuid.uuid4().hex}_{nombre}")
+    archivo.save(ruta)
+    return ruta
+
+
+def borrar_entrada(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+def encolar(tipo, parametros=None, usuario=None, entrada=None):
+    """`entrada` (ruta o archivo abierto) se guarda en la BD en el mismo commit que el trabajo."""
+    if tipo not in HANDLERS:
+        raise ValueError(f"Tipo de trabajo no registrado: {tipo}")
+    t = Trabajo(
+        tipo=tipo,
+        estado="pendiente",
+        parametros=json.dumps(parametros or {}),
+        progreso=0,
+        usuario_id=getattr(usuario, "id", None),
+        usuario=getattr(usuario, "nombre", None),
+    )
+    db.session.add(t)
+    if entrada is not None:
+        db.session.flush()  # id para las partes; el worker no ve el trabajo hasta el commit
+        guardar_archivo(t.id, "entrada", entrada)
+    db.session.commit()
+    return t
+
+
+@contextmanager
+def entrada_local(trabajo):
+    """Baja la entrada del trabajo a un archivo temporal del worker y lo borra al salir."""
+    fd, ruta = tempfile.mkstemp(prefix=f"entrada_{trabajo.id}_", suffix=".xlsx", dir=directorio_trabajos())
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for datos in partes_archivo(trabajo.id, "entrada"):
+                f.write(datos)
+            vacia = f.tell() == 0
+        if vacia:
+            raise RuntimeError(f"El archivo de entrada del trabajo #{trabajo.id} no está en la base de datos.")
+        yield ruta
+    finally:
+        borrar_entrada(ruta)
+
+
+def _json(texto):
+    try:
+        return json.loads(texto or "{}")
+    except ValueError:
+        return {}
+
+
+def parametros_de(trabajo):
+    return _json(trabajo.parametros)
+
+
+def a_dict(trabajo):
+    return {
+        "id": trabajo.id,
+        "tipo": trabajo.tipo,
+        "estado": trabajo.estado,
+        "progreso": trabajo.progreso or 0,
+        "total": trabajo.total,
+        "mensaje": trabajo.mensaje,
+        "detalle": _json(trabajo.detalle),
+        "creado_en": trabajo.creado_en.isoformat() if trabajo.creado_en else None,
+        "terminado_en": trabajo.terminado_en.isoformat() if trabajo.terminado_en else None,
+        "listo": trabajo.estado == "terminado" and bool(trabajo.archivo),
+    }
+
+
+class Progreso:
+    """
+    Reporta avance en la fila del trabajo. Usa una conexión aparte para no
+    interferir con la sesión (ni con cursores abiertos) del handler, y
+    escribe como máximo una vez por `cada_seg`.
+    """
+
+    def __init__(self, trabajo_id, cada_seg=1.0):
+        self.trabajo_id = trabajo_id
+        self.cada_seg = cada_seg
+        self.actual = 0
+        self.total = None
+        self.detalle = None
+        self._ultimo = 0.0
+
+    def _guardar(self, **extra):
+        valores = {"progreso": self.actual, "actualizado_en": datetime.utcnow(), **extra}
+        if self.detalle is not None:
+            valores["detalle"] = json.dumps(self.detalle, ensure_ascii=False)
+        if self.total is not None:
+            valores["total"] = self.total
+        with db.engine.begin() as conn:
+            conn.execute(Trabajo.__table__.update()
+                         .where(Trabajo.__table__.c.id == self.trabajo_id)
+                         .values(**valores))
+        self._ultimo = time.monotonic()
+
+    def fijar_total(self, total):
+        self.total = int(total)
+        self._guardar()
+
+    def avanzar(self, n=1, mensaje=None, detalle=None):
+        """`detalle` (dict) reemplaza los contadores publicados (se guarda con el mismo latido)."""
+        self.actual += n
+        if detalle is not None:
+            self.detalle = detalle
+        if mensaje is not None or time.monotonic() - self._ultimo >= self.cada_seg:
+            extra = {"mensaje": mensaje} if mensaje is not None else {}
+            self._guardar(**extra)
+
+    def mensaje(self, texto):
+        self._guardar(mensaje=texto)
+
+
+def reencolar_huerfanos():
+    """Trabajos 'en_proceso' sin latido reciente (worker muerto) vuelven a 'pendiente'."""
+    limite = datetime.utcnow() - timedelta(minutes=current_app.config["TRABAJOS_LATIDO_MAX_MIN"])
+    n = (Trabajo.query
+         .filter(Trabajo.estado == "en_proceso")
+         .filter(db.func.coalesce(Trabajo.actualizado_en, Trabajo.iniciado_en) < limite)
+         .update({"estado": "pendiente"}, synchronize_session=False))
+    db.session.commit()
+    return n
+
+
+def purgar_resultados():
+    """Borra de la BD los resultados de trabajos terminados hace más de TRABAJOS_RETENCION_DIAS."""
+    limite = datetime.utcnow() - timedelta(days=current_app.config["TRABAJOS_RETENCION_DIAS"])
+    viejos = (db.session.query(Trabajo.id)
+              .filter(Trabajo.estado.in_(["terminado", "error"]), Trabajo.terminado_en < limite)
+              .scalar_subquery())
+    n = (ArchivoTrabajo.query.filter(ArchivoTrabajo.trabajo_id.in_(viejos))
+         .delete(synchronize_session=False))
+    Trabajo.query.filter(Trabajo.id.in_(viejos), Trabajo.archivo.isnot(None)).update(
+        {"archivo": None}, synchronize_session=False)
+    db.session.commit()
+    return n
+
+
+def tomar_siguiente():
+    """Toma el pendiente más antiguo (SKIP LOCKED en PostgreSQL para varios workers)."""
+    t = (Trabajo.query
+         .filter(Trabajo.estado == "pendiente")
+         .order_by(Trabajo.id.asc())
+         .with_for_update(skip_locked=True)
+         .first())
+    if t is None:
+        db.session.rollback()
+        return None
+    ahora = datetime.utcnow()
+    t.estado = "en_proceso"
+    t.iniciado_en = ahora
+    t.actualizado_en = ahora
+    t.mensaje = None
+    db.session.commit()
+    return t
+
+
+def ejecutar(trabajo):
+    handler = HANDLERS.get(trabajo.tipo)
+    tid = trabajo.id
+    if handler is None:
+        trabajo.estado = "error"
+        trabajo.mensaje = f"Tipo de trabajo no registrado: {trabajo.tipo}"
+        trabajo.terminado_en = datetime.utcnow()
+        db.session.commit()
+        return
+
+    progreso = Progreso(tid)
+    try:
+        ruta = handler(trabajo, progreso)
+        archivo = None
+        if ruta:
+            # El resultado pasa a la BD: el proceso web no ve el disco del worker
+            borrar_archivo(tid, "resultado")  # un reintento no duplica partes
+            guardar_archivo(tid, "resultado", ruta)
+            archivo = os.path.basename(ruta).split("_", 1)[-1]  # "<id>_<nombre>" -> nombre de descarga
+            os.remove(ruta)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Trabajo {tid} ({trabajo.tipo}) falló:\n{traceback.format_exc()}")
+        t = db.session.get(Trabajo, tid)
+        borrar_archivo(tid, "entrada")
+        t.estado = "error"
+        t.mensaje = str(e)[:1000]
+        t.terminado_en = datetime.utcnow()
+        if progreso.detalle is not None:  # lo avanzado hasta el fallo
+            t.detalle = json.dumps(progreso.detalle, ensure_ascii=False)
+        db.session.commit()
+        return
+
+    t = db.session.get(Trabajo, tid)
+    db.session.refresh(t)
+    borrar_archivo(tid, "entrada")
+    t.estado = "terminado"
+    t.archivo = archivo
+    t.progreso = progreso.actual
+    if progreso.detalle is not None:  # el último avance pudo quedar sin guardar
+        t.detalle = json.dumps(progreso.detalle, ensure_ascii=False)
+    t.terminado_en = datetime.utcnow()
+    db.session.commit()
+
+
+def correr_worker(intervalo=None, una_vez=False):
+    intervalo = intervalo or current_app.config["TRABAJOS_INTERVALO_SEG"]
+    n = reencolar_huerfanos()
+    if n:
+        current_app.logger.warning(f"{n} trabajo(s) huérfano(s) reencolado(s)")
+    purgar_resultados()
+    while True:
+        t = tomar_siguiente()
+        if t is None:
+            if una_vez:
+                return
+            db.session.remove()
+            time.sleep(intervalo)
+            continue
+        tid, tipo = t.id, t.tipo
+        click.echo(f"▶ Trabajo {tid} ({tipo})")
+        ejecutar(t)
+        db.session.remove()
+        click.echo(f"■ Trabajo {tid} terminado")
+
+
+# ---- CLI -------------------------------------------------------------
+@click.group("trabajos")
+def trabajos_cli():
+    """Trabajos en segundo plano."""
+
+
+@trabajos_cli.command("worker")
+@click.option("--intervalo", type=float, default=None, help="Segundos entre sondeos de la cola.")
+@click.option("--una-vez", is_flag=True, help="Procesa lo pendiente y termina.")
+@with_appcontext
+def worker_cmd(intervalo, una_vez):
+    """Procesa la cola de trabajos."""
+    correr_worker(intervalo=intervalo, una_vez=una_vez)
@@ -6,9 +6,9 @@ from models import db, HistorialCambios, Notificacion
 def actor_nombre():
     return current_user.nombre if getattr(current_user, "is_authenticated", False) else "Sistema"
 
-def registrar_notificacion(descripcion, tipo=None):
+def registrar_notificacion(descripcion, tipo=None, usuario=None):
     noti = Notificacion(
-        usuario=actor_nombre(),
+        usuario=usuario or actor_nombre(),
         fecha=datetime.utcnow(),  # guarda notis en UTC (estable)
         descripcion=descripcion,
         tipo=tipo
@@ -16,6 +16,10 @@ def registrar_notificacion(descripcion, tipo=None):
     db.session.add(noti)
     db.session.commit()
 
+def es_postgres():
+    """True si la BD principal es PostgreSQL (GROUPING SETS, ON CONFLICT, etc.)."""
+    return db.engine.dialect.name == "postgresql"
+
 def limpiar(valor):
     if valor is None:
         return ""
@@ -0,0 +1,59 @@
+# zip_stream.py
+"""
+ZIP en streaming: cada entrada se emite en cuanto se agrega.
+
+`zipfile` escribe sobre un destino no posicionable (sin seek/tell), así que
+usa descriptores de datos en lugar de regresar a corregir los encabezados.
+En memoria sólo vive la entrada en curso, no el archivo completo.
+
+PDF y XLSX ya vienen comprimidos: por omisión se guardan con ZIP_STORED.
+"""
+import zipfile
+
+
+class _Salida:
+    """Destino de sólo escritura: acumula lo que zipfile escribe hasta que se vacía."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+def iter_zip(entradas):
+    """
+    Genera los bytes de un ZIP a partir de `entradas`, un iterable de
+    `(nombre, datos)` o `(nombre, datos, comprimir)`.
+    """
+    salida = _Salida()
+    with zipfile.ZipFile(salida, mode="w") as zf:
+        for entrada in entradas:
+            nombre, datos = entrada[0], entrada[1]
+            comprimir = entrada[2] if len(entrada) > 2 else False
+            zf.writestr(nombre, datos,
+                        compress_type=zipfile.ZIP_DEFLATED if comprimir else zipfile.ZIP_STORED)
+            bloque = salida.vaciar()
+            if bloque:
+                yield bloque
+    # directorio central
+    bloque = salida.vaciar()
+    if bloque:
+        yield bloque
+
+
+def escribir_zip(ruta, entradas):
+    """Escribe el mismo ZIP de `iter_zip` a un archivo en disco."""
+    with open(ruta, "wb") as fh:
+        for bloque in iter_zip(entradas):
+            fh.write(bloque)
+    return ruta